@@ -0,0 +1,41 @@
+import argparse
+
+from constants import OUT_DIR
+from src.animation import export_animation, route_positions
+from src.batch import load_positions, get_visibility_mask
+from src.icons import ICONS
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export an animation of the treasure map while the players travel "
+                                                 "along a route")
+
+    parser.add_argument("route", help="CSV file with (x, y) rows or JSON file with a list of [x, y] pairs, the corners "
+                                      "of the route or the positions of a recorded drag")
+    parser.add_argument("--absolute", action="store_true",
+                        help="positions are given in pixels on the map instead of relative to the map size")
+    parser.add_argument("--step", type=float, default=2.,
+                        help="distance in pixels on the map between two frames, or 0 to use every position of the "
+                             "route as a frame")
+    parser.add_argument("--out", default=OUT_DIR + "route.mp4",
+                        help="path of the animation, .gif for an animated GIF and .mp4 or .avi for a video")
+    parser.add_argument("--fps", type=float, default=25., help="frames per second")
+    parser.add_argument("--show-true-positions", default="", metavar="NAMES",
+                        help="comma separated names of the icons of which the true position is shown, or 'all'")
+    parser.add_argument("--hide-player-icon", action="store_true", help="do not draw the player icon")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="render at this scale of the source map resolution instead of the preview size")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--max-in-flight", type=int, default=None,
+                        help="maximum number of frames in memory (default: twice the number of processes)")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    waypoints = load_positions(args.route, absolute=args.absolute)
+    visibility = get_visibility_mask(ICONS, args.show_true_positions.split(","))
+
+    frames = export_animation(route_positions(waypoints, args.step), args.out, visibility, not args.hide_player_icon,
+                              args.fps, args.scale, args.processes, args.max_in_flight)
+    print(f"wrote {frames} frames to {args.out}")
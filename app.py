@@ -1,13 +1,28 @@
-from PyQt6.QtCore import QSize, Qt
-from PyQt6.QtGui import QPixmap, QImage, QIcon, QMouseEvent, QCursor
-from PyQt6.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QWidget
-import cv2
+from PyQt6.QtCore import QSize, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QImage, QIcon, QMouseEvent, QCursor, QCloseEvent, QWheelEvent, QPainter, QPaintEvent
+from PyQt6.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout, QHBoxLayout, QWidget, QToolTip, \
+    QComboBox
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional, Tuple
+import os
 import numpy as np
 
-from constants import INITIAL_PLAYER_POSITION, MAP_WIDTH, MAP_HEIGHT, MAP_PATH, OUT_DIR
+from constants import INITIAL_PLAYER_POSITION, MAP_WIDTH, OUT_DIR, MAX_FPS, MAX_ZOOM, ZOOM_STEP, PRINT_DPI, \
+    PROFILE_OVERLAY_INTERVAL, FRAME_CACHE_BYTES, FRAME_CACHE_GRID, PREWARM_FRAMES, EXPORT_FORMAT, EXPORT_QUALITY, \
+    SPATIAL_INDEX_CELL_SIZE, GUI_BACKEND, FRAME_BUFFERS
 from src.position import Position
-from src.generate_map import Map
-from src.icons import PlayerPositionDependentIcon, ICONS
+from src.catalogue import MapCatalogue, create_catalogue
+from src.profiling import PROFILER
+from src.export import export_full_resolution
+from src.export_queue import ExportQueue
+from src.frame_cache import FrameCache
+from src.frame_pool import FramePool
+from src.generate_map import FrameBuffer, Map, RenderState
+from src.icons import PlayerPositionDependentIcon
+from src.render_thread import RenderThread
+from src.scene import MapScene, MapView
+from src.spatial_index import IconIndex
+from src.viewport import Viewport, ViewportRenderer
 from src.utils import generate_filename
 
 class MainWindow(QMainWindow):
@@ -16,61 +31,210 @@ class MainWindow(QMainWindow):
     Args:
         treasure_map (Map): Map object that generates the images of the treasure map
         out_dir (str): directory where the exported images will be saved
+        catalogue (MapCatalogue, optional): maps that can be switched between. Defaults to None, which only shows 
+            treasure_map.
     """
-    def __init__(self, treasure_map: Map, out_dir: str) -> None:
+    def __init__(self, treasure_map: Map, out_dir: str, catalogue: Optional[MapCatalogue] = None) -> None:
         super().__init__()
         
+        self.out_dir = out_dir
+        self.catalogue = catalogue
+        os.makedirs(out_dir, exist_ok=True)
+
         # Window properties
         self.setWindowTitle("Treasure Map")
-        self.setFixedSize(QSize(int(MAP_WIDTH * 1.3) + 1, int(MAP_HEIGHT * 1.1)))
         
-        # Map widget
-        self.map_widget = MapWidget(treasure_map, self)
-
-        # Icon button widgets
-        self.icon_buttons = [IconButton(icon, self.map_widget)
-                             for icon
-                             in self.map_widget.treasure_map.player_position_dependent_icons]
+        # Map widget and icon button widgets, which are replaced when another map is shown, and the visibility of the
+        # true positions on every map that was shown before
+        self.map_widget = None
+        self.icon_buttons = []
+        self._visibility: Dict[Map, Tuple[bool, ...]] = {}
         
-        # Export button
-        export_button = ExportButton(self.map_widget, out_dir)
+        # Export buttons, the exports are written by a background thread
+        self.export_queue = ExportQueue()
+        self.export_buttons = [ExportButton(None, out_dir, self.export_queue),
+                               PrintExportButton(None, out_dir, self.export_queue)]
+        for button in self.export_buttons:
+            button.export_finished.connect(self.show_export_status)
         
         # Create button layout
-        button_layout = QVBoxLayout()
-        for button in self.icon_buttons:
-            button_layout.addWidget(button)
-        button_layout.addWidget(export_button)
+        self.button_layout = QVBoxLayout()
+        if catalogue is not None and len(catalogue) > 1:
+            map_selector = QComboBox()
+            map_selector.addItems(catalogue.names)
+            map_selector.textActivated.connect(lambda name: self.show_map(catalogue.get(name)))
+            self.button_layout.addWidget(map_selector)
+        for button in self.export_buttons:
+            self.button_layout.addWidget(button)
 
         button_sidebar = QWidget()
-        button_sidebar.setLayout(button_layout)
+        button_sidebar.setLayout(self.button_layout)
 
         # create main layout
-        main_layout = QHBoxLayout()
+        self.main_layout = QHBoxLayout()
         # this aligns the cursor position to the Position objects
-        main_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
-        main_layout.addWidget(self.map_widget)
-        main_layout.addWidget(button_sidebar)
+        self.main_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        self.main_layout.addWidget(button_sidebar)
         
         main_widget = QWidget()
-        main_widget.setLayout(main_layout)
+        main_widget.setLayout(self.main_layout)
         
         self.setCentralWidget(main_widget)
 
+        # status bar for the results of exports, created now so it does not resize the window on the first export
+        self.statusBar()
+
+        self.show_map(treasure_map)
+
+    def show_map(self, treasure_map: Map) -> None:
+        """show a map, replacing the map widget and the icon buttons of the previous map. The players keep their
+        position relative to the map
+
+        Args:
+            treasure_map (Map): Map object that generates the images of the treasure map
+        """
+        player_position = None
+        if self.map_widget is not None:
+            if self.map_widget.treasure_map is treasure_map:
+                return
+            old = self.map_widget
+            player_position = Position(round(old.player_position.x * treasure_map.width / old.treasure_map.width),
+                                       round(old.player_position.y * treasure_map.height / old.treasure_map.height),
+                                       mode="absolute")
+            self._visibility[old.treasure_map] = old.visibility
+            old.stop()
+            self.main_layout.removeWidget(old)
+            old.deleteLater()
+            for button in self.icon_buttons:
+                self.button_layout.removeWidget(button)
+                button.deleteLater()
+
+        self.setFixedSize(QSize(int(treasure_map.width * 1.3) + 1, int(treasure_map.height * 1.1)))
+
+        self.map_widget = MapWidget(treasure_map, self, player_position=player_position, 
+                                    visibility=self._visibility.get(treasure_map))
+        self.map_widget.icon_selected.connect(self.select_icon)
+        self.main_layout.insertWidget(0, self.map_widget)
+
+        # the icon buttons go between the map selector and the export buttons
+        first_button = self.button_layout.indexOf(self.export_buttons[0])
+        self.icon_buttons = [IconButton(icon, self.map_widget) for icon in treasure_map.player_position_dependent_icons]
+        for i, button in enumerate(self.icon_buttons):
+            self.button_layout.insertWidget(first_button + i, button)
+        for button in self.export_buttons:
+            button.map_widget = self.map_widget
+
+    def select_icon(self, icon: PlayerPositionDependentIcon) -> None:
+        """focus the button of an icon that was clicked on the map and show how far it is from its true position
+
+        Args:
+            icon (PlayerPositionDependentIcon): selected icon
+        """
+        for button in self.icon_buttons:
+            if button.icon is icon:
+                button.setFocus()
+
+        position = icon.position_on_map(self.map_widget.player_position)
+        distance = ((position.x - icon.true_position.x) ** 2 + (position.y - icon.true_position.y) ** 2) ** 0.5
+        self.statusBar().showMessage(f"{icon.name}: {distance:.0f} px from its true position", 5000)
+
+    def show_export_status(self, message: str) -> None:
+        """show the result of an export in the status bar
+
+        Args:
+            message (str): message to show
+        """
+        self.statusBar().showMessage(message, 5000)
+
+    def closeEvent(self, ev: QCloseEvent) -> None:
+        """Stop the render thread before the window closes, wait for the exports that are still queued and write the
+        recorded frame timings when profiling
+
+        Args:
+            ev (QCloseEvent): PyQt6 close event
+        """
+        self.map_widget.stop()
+        self.export_queue.join()
+        if PROFILER.enabled:
+            PROFILER.export_trace(generate_filename(self.out_dir + "trace.json", 0))
+        super().closeEvent(ev)
+
 
 class MapWidget(QLabel):
     """Widget that keeps track of the players' position, generates and shows a treasure map based on that position, and
-    contains all functionality to change the players' position.
+    contains all functionality to change the players' position. The map can be zoomed with the mouse wheel and panned 
+    by dragging the map when zoomed in.
+    
+    Hovering over a rune or the marker of its true position shows its name, and clicking it selects the rune.
+
+    With the "raster" backend every frame is composited with NumPy on a render thread into one of a few reused buffers,
+    which is painted without copying it. With the "scene" backend the map is a QGraphicsScene with a static background,
+    in which only the icons that moved are repositioned.
+
+    Every frame that is requested gets a number. frame_requested is emitted with the number when a frame is requested,
+    and frame_painted with the number of the newest request that the painted frame shows, so the latency from an 
+    event to its frame can be measured, see src/interaction.py.
     
     Args:
         treasure_map (Map): Map object that generates the images
+        window (QMainWindow): window of which the cursor is set
+        player_position (Position, optional): initial position of the players. Defaults to None, which is 
+            INITIAL_PLAYER_POSITION.
+        visibility (Iterable[bool], optional): initial visibility of the true position of each icon. Defaults to None,
+            which is the default visibility of the map.
+        backend (str, optional): "raster" or "scene". Defaults to GUI_BACKEND.
     """
-    def __init__(self, treasure_map: Map, window: QMainWindow) -> None:
+    icon_selected = pyqtSignal(object)
+    frame_requested = pyqtSignal(int)
+    frame_painted = pyqtSignal(int)
+
+    def __init__(self, 
+                 treasure_map: Map, 
+                 window: QMainWindow, 
+                 player_position: Optional[Position] = None, 
+                 visibility: Optional[Iterable[bool]] = None,
+                 backend: str = GUI_BACKEND) -> None:
         super().__init__()
         
-        self.player_position = Position.from_tuple(INITIAL_PLAYER_POSITION)
+        if player_position is None:
+            player_position = Position.from_tuple(INITIAL_PLAYER_POSITION)
+        self.player_position = player_position.clamp(0, treasure_map.width, 0, treasure_map.height)
+        self.visibility = tuple(treasure_map.default_visibility if visibility is None else visibility)
         self.treasure_map = treasure_map
         self._window = window
         self.setMouseTracking(True)
+
+        map_size = (treasure_map.width, treasure_map.height)
+        self.viewport = Viewport(treasure_map.map_path, map_size, MAX_ZOOM)
+        self.frame_cache = None
+        self.render_thread = None
+        self.scene = None
+        self.setFixedSize(*map_size)
+
+        # frame that is shown, the owner of its pixels and the number of the request it shows, see RenderThread
+        self._frame_image: Optional[QImage] = None
+        self._frame_owner = None
+        self._frame_request = 0
+
+        if backend == "scene":
+            # the scene is shown by a view on top of the widget, which passes the mouse events to the widget
+            self.scene = MapScene(treasure_map)
+            self.scene_view = MapView(self.scene, self)
+            self.scene_view.painted.connect(lambda: self.frame_painted.emit(self._frame_request))
+        elif backend == "raster":
+            # zoomed in views are rendered from a tile pyramid of the full resolution map
+            viewport_renderer = ViewportRenderer(treasure_map, map_size)
+
+            # frames are rendered on a separate thread into a pool of buffers, so the GUI stays responsive when 
+            # rendering is slow and dragging allocates no frames, and revisited positions are taken from a cache
+            self.frame_cache = FrameCache(treasure_map, FRAME_CACHE_BYTES, FRAME_CACHE_GRID)
+            self.frame_pool = FramePool(FRAME_BUFFERS)
+            self.render_thread = RenderThread(treasure_map, MAX_FPS, viewport_renderer, self.frame_cache, 
+                                              PREWARM_FRAMES, self.frame_pool)
+            self.render_thread.frame_ready.connect(self.show_frame)
+            self.render_thread.start()
+        else:
+            raise ValueError(f"backend should be 'raster' or 'scene', not '{backend}'")
         
         self.update_map()
         
@@ -78,23 +242,76 @@ class MapWidget(QLabel):
         self.player_icon_is_hovered = False
         self.mouse_offset_from_player_position = Position(0, 0)
 
+        self.is_panning = False
+        self.pan_start = None
+
+        # spatial index of the icons on the map for finding the icon under the cursor
+        self.icon_index = IconIndex(treasure_map, SPATIAL_INDEX_CELL_SIZE)
+        self.hovered_icon = None
+
+        # overlay with the frame timings, only shown when profiling is enabled
+        if PROFILER.enabled:
+            self.profile_overlay = QLabel(self)
+            self.profile_overlay.setStyleSheet("background-color: rgba(0, 0, 0, 160); color: white; padding: 4px;")
+            self.profile_overlay.move(4, 4)
+            self.profile_timer = QTimer(self)
+            self.profile_timer.timeout.connect(self.update_profile_overlay)
+            self.profile_timer.start(PROFILE_OVERLAY_INTERVAL)
+
+    def stop(self) -> None:
+        """stop rendering, before the widget is closed or replaced
+        """
+        if self.render_thread is not None:
+            self.render_thread.stop()
+
     def is_on_player_icon(self, pos: Position):
         return pos.is_in_bbox(self.player_position.x - self.treasure_map.player_icon.size[0] // 2, 
                               self.player_position.x + self.treasure_map.player_icon.size[0] // 2,
                               self.player_position.y - self.treasure_map.player_icon.size[1] // 2, 
                               self.player_position.y + self.treasure_map.player_icon.size[1] // 2)
 
+    def get_icon_at(self, pos: Position) -> Optional[PlayerPositionDependentIcon]:
+        """Find the rune of which the icon or the marker of its true position is at a position on the map
+
+        Args:
+            pos (Position): absolute position on the map
+
+        Returns:
+            Optional[PlayerPositionDependentIcon]: the rune, or None if there is none at the position
+        """
+        self.icon_index.refresh(self.get_render_state())
+        icon = self.icon_index.icon_at(pos)
+        return None if icon is None else self.icon_index.owner(icon)
+
+    def set_hovered_icon(self, icon: Optional[PlayerPositionDependentIcon], ev: QMouseEvent) -> None:
+        """Show the name of the hovered rune in a tooltip
+
+        Args:
+            icon (Optional[PlayerPositionDependentIcon]): hovered rune, or None
+            ev (QMouseEvent): PyQt6 mouse event
+        """
+        if icon is self.hovered_icon:
+            return
+        self.hovered_icon = icon
+
+        if icon is None:
+            QToolTip.hideText()
+        else:
+            QToolTip.showText(ev.globalPosition().toPoint(), icon.name, self)
+
     def get_cursor_shape(self):
         """Gets the cursor shape based on the state of MapWidget
 
         Returns:
             Qt.CursorShape
         """
-        if self.player_icon_is_selected:
+        if self.player_icon_is_selected or self.is_panning:
             return Qt.CursorShape.ClosedHandCursor
         else:
             if self.player_icon_is_hovered:
                 return Qt.CursorShape.OpenHandCursor
+            elif self.hovered_icon is not None:
+                return Qt.CursorShape.PointingHandCursor
             else:
                 return Qt.CursorShape.ArrowCursor
     
@@ -104,15 +321,91 @@ class MapWidget(QLabel):
         shape = self.get_cursor_shape()
         self._window.setCursor(QCursor(shape))
 
+    def get_render_state(self, show_player_icon: bool = True) -> RenderState:
+        """get the state of the map that is shown, with the current position of the players
+
+        Args:
+            show_player_icon (bool, optional): specifies whether to show the player icon. Defaults to True.
+
+        Returns:
+            RenderState: the render state
+        """
+        return RenderState(self.player_position, show_player_icon, self.visibility)
+
+    def is_true_position_visible(self, icon: PlayerPositionDependentIcon) -> bool:
+        return self.visibility[self.treasure_map.player_position_dependent_icons.index(icon)]
+
+    def set_true_position_visibility(self, icon: PlayerPositionDependentIcon, visible: bool) -> None:
+        """show or hide the true position of an icon and update the map
+
+        Args:
+            icon (PlayerPositionDependentIcon): icon of the hidden location
+            visible (bool): specifies whether the true position is shown
+        """
+        visibility = list(self.visibility)
+        visibility[self.treasure_map.player_position_dependent_icons.index(icon)] = visible
+        self.visibility = tuple(visibility)
+        self.update_map()
+
     def update_map(self) -> None:
-        """generate a new image for the Map widget and update the widget
+        """request a new image for the Map widget. The widget is updated when the render thread delivers the frame, or
+        right away when the scene backend is used
+        """
+        if self.scene is not None:
+            self.scene.update_icons(self.get_render_state())
+            self.scene_view.set_view(self.viewport)
+            self._frame_request += 1
+            self.frame_requested.emit(self._frame_request)
+            PROFILER.mark_frame()
+            return
+
+        view = None if self.viewport.is_fit else self.viewport.get_view()
+        self.frame_requested.emit(self.render_thread.request_render(self.get_render_state(), view=view))
+
+    def show_frame(self, image: QImage, owner, request: int) -> None:
+        """show a frame delivered by the render thread. The buffer of the previous frame is returned to the pool,
+        because it is no longer painted
+
+        Args:
+            image (QImage): rendered image of the treasure map, which refers to the pixels of its owner
+            owner: FrameBuffer or array that holds the pixels, or None if the image has its own copy
+            request (int): number of the request the frame was rendered for
+        """
+        if isinstance(self._frame_owner, FrameBuffer):
+            self.frame_pool.release(self._frame_owner)
+        self._frame_image = image
+        self._frame_owner = owner
+        self._frame_request = request
+        self.update()
+        PROFILER.mark_frame()
+
+    def paintEvent(self, ev: QPaintEvent) -> None:
+        """paint the part of the current frame that has to be repainted
+
+        Args:
+            ev (QPaintEvent): PyQt6 paint event
+        """
+        if self._frame_image is None:
+            return super().paintEvent(ev)
+
+        with PROFILER.stage("paint"):
+            painter = QPainter(self)
+            painter.drawImage(ev.rect(), self._frame_image, ev.rect())
+            painter.end()
+        self.frame_painted.emit(self._frame_request)
+
+    def update_profile_overlay(self) -> None:
+        """show the latest frame timings in the profiling overlay
         """
-        map_img = self.get_map_image()
-        self.setPixmap(QPixmap.fromImage(QImage(map_img, 
-                                                MAP_WIDTH,
-                                                MAP_HEIGHT, 
-                                                map_img.strides[0], 
-                                                QImage.Format.Format_RGB888)))
+        if self.frame_cache is None:
+            self.profile_overlay.setText(PROFILER.format_stats() + 
+                                         f"\nscene  {self.scene.moved_items} items moved")
+        else:
+            stats = self.frame_cache.get_stats()
+            self.profile_overlay.setText(PROFILER.format_stats() + 
+                                         f"\nframe cache  {stats['hit_rate']:.0%} hits, {stats['frames']} frames, "
+                                         f"{stats['bytes'] / 2**20:.0f} MB, {stats['evictions']} evicted")
+        self.profile_overlay.adjustSize()
 
     def get_map_image(self, show_player_icon=True) -> np.array:
         """return the image of the background map with all visible icons
@@ -123,28 +416,42 @@ class MapWidget(QLabel):
         Returns:
             np.array: np.array (W, H, C) with the pixelvalues of the image
         """
-        return self.treasure_map.render(self.player_position, show_player_icon)
+        return self.treasure_map.render(self.get_render_state(show_player_icon))
+
+    def get_map_position(self, ev: QMouseEvent) -> Position:
+        """Get the position on the map of a mouse event, taking the zoom and pan of the viewport into account
+
+        Args:
+            ev (QMouseEvent): PyQt6 mouse event
+
+        Returns:
+            Position: absolute position on the map
+        """
+        return self.viewport.to_map(ev.position().x(), ev.position().y())
 
     def mouseMoveEvent(self, ev: QMouseEvent) -> None:
         """Check if the player icon is selected and if so move it and update the map until it is no longer selected.
+        Pan the view when the map itself is dragged.
 
         Args:
             ev (QMouseEvent): PyQt6 mouse event
         """
         
-        pos = Position.from_QPointF(ev.position())
-        if self.player_icon_is_selected:
-            
-            # apply offset to prevent icon from snapping to the cursor
-            self.player_position = pos - self.mouse_offset_from_player_position
+        pos = self.get_map_position(ev)
+        if self.is_panning:
+            self.viewport.pan(ev.position().x() - self.pan_start.x(), ev.position().y() - self.pan_start.y())
+            self.pan_start = ev.position()
+            self.update_map()
+        elif self.player_icon_is_selected:
             
-            # ensure icon stays on map, when cursor leaves widget
-            self.player_position.x = min(max(self.player_position.x, 0), MAP_WIDTH)
-            self.player_position.y = min(max(self.player_position.y, 0), MAP_HEIGHT)
+            # apply offset to prevent icon from snapping to the cursor and ensure icon stays on map, when cursor leaves widget
+            self.player_position = (pos - self.mouse_offset_from_player_position).clamp(0, self.treasure_map.width, 
+                                                                                      0, self.treasure_map.height)
             
             self.update_map()
         else:
             self.player_icon_is_hovered = self.is_on_player_icon(pos)
+            self.set_hovered_icon(None if self.player_icon_is_hovered else self.get_icon_at(pos), ev)
         
         self.set_cursor_shape()
             
@@ -156,8 +463,9 @@ class MapWidget(QLabel):
         Args:
             ev (QMouseEvent): PyQt6 mouse event
         """
-        # get the position of the mouse
-        pos = Position.from_QPointF(ev.position())
+        # get the position of the mouse and the rune under it
+        pos = self.get_map_position(ev)
+        icon = self.get_icon_at(pos)
         
         # check if the mouse is on the player icon
         if self.is_on_player_icon(pos):
@@ -165,6 +473,15 @@ class MapWidget(QLabel):
             # set selected to True and store offset to center of image to prevent the icon from snapping to the cursor
             self.player_icon_is_selected = True
             self.mouse_offset_from_player_position = pos - self.player_position
+
+        # select a rune by clicking it or the marker of its true position
+        elif icon is not None:
+            self.icon_selected.emit(icon)
+
+        # otherwise drag the map itself when zoomed in
+        elif not self.viewport.is_fit:
+            self.is_panning = True
+            self.pan_start = ev.position()
         
         self.set_cursor_shape()
 
@@ -175,13 +492,26 @@ class MapWidget(QLabel):
             ev (QMouseEvent): PyQt6 mouse event
         """
         self.player_icon_is_selected = False
+        self.is_panning = False
         self.set_cursor_shape()
         
     def leaveEvent(self, ev: QMouseEvent) -> None:
         self.player_icon_is_selected = False
         self.player_icon_is_hovered = False
+        self.hovered_icon = None
+        self.is_panning = False
         self.set_cursor_shape()
 
+    def wheelEvent(self, ev: QWheelEvent) -> None:
+        """Zoom in or out around the cursor
+
+        Args:
+            ev (QWheelEvent): PyQt6 wheel event
+        """
+        steps = ev.angleDelta().y() / 120
+        self.viewport.zoom_at(ev.position().x(), ev.position().y(), ZOOM_STEP ** steps)
+        self.update_map()
+
 class IconButton(QPushButton):
     """Button widget that keeps track if the hidden location icon should be shown on the map
     
@@ -193,7 +523,7 @@ class IconButton(QPushButton):
         super().__init__(icon.name)
 
         self.setCheckable(True)
-        self.setChecked(False)
+        self.setChecked(map_widget.is_true_position_visible(icon))
         
         self.icon = icon
         self.map_widget = map_widget
@@ -202,7 +532,6 @@ class IconButton(QPushButton):
         self.setIconSize(QSize(MAP_WIDTH // 15, MAP_WIDTH // 15))
 
         self.clicked.connect(self.set_true_position_visibility)
-        self.clicked.connect(self.map_widget.update_map)
 
     def set_true_position_visibility(self, checked: bool) -> None:
         """sets the visibility of the icon on the map
@@ -210,20 +539,25 @@ class IconButton(QPushButton):
         Args:
             checked (bool): state of the isChecked field of the button AFTER it's clicked
         """
-        self.icon.show_true_position = checked
+        self.map_widget.set_true_position_visibility(self.icon, checked)
 
 class ExportButton(QPushButton):
-    """Button widget for exporting the treasure map
+    """Button widget for exporting the treasure map. The image is rendered on the GUI thread and encoded and written by
+    the export queue
     
     Args:
         map_widget (MapWidget): instance of the MapWidget that generates the image that will be exported
         out_dir (str): directory in which the image will be saved
+        export_queue (ExportQueue): queue that writes the exports in the background
     """
-    def __init__(self, map_widget: MapWidget, out_dir: str) -> None:
+    export_finished = pyqtSignal(str)
+
+    def __init__(self, map_widget: MapWidget, out_dir: str, export_queue: ExportQueue) -> None:
         super().__init__("Export")
         
         self.map_widget = map_widget
         self.out_dir = out_dir
+        self.export_queue = export_queue
         
         self.setIcon(QIcon("./images/export.png"))
         self.setIconSize(QSize(MAP_WIDTH // 40, MAP_WIDTH // 40))
@@ -234,15 +568,52 @@ class ExportButton(QPushButton):
         """Export the image of the map
         """
         map_img = self.map_widget.get_map_image(show_player_icon=False)
-        map_img = cv2.cvtColor(map_img, cv2.COLOR_RGB2BGR)
+        future = self.export_queue.submit_image(map_img, self.out_dir + "out", EXPORT_FORMAT, EXPORT_QUALITY)
+        future.add_done_callback(self.report_export)
+
+    def report_export(self, future: Future) -> None:
+        """report the result of an export, called by the thread of the export queue
+
+        Args:
+            future (Future): finished export
+        """
+        if future.exception() is None:
+            self.export_finished.emit(f"Exported {future.result()}")
+        else:
+            self.export_finished.emit(f"Export failed: {future.exception()}")
+
+class PrintExportButton(ExportButton):
+    """Button widget for exporting the treasure map at the full resolution of the source map. The export is rendered 
+    in strips by the export queue, so the GUI stays responsive
+    
+    Args:
+        map_widget (MapWidget): instance of the MapWidget that holds the position of the players
+        out_dir (str): directory in which the image will be saved
+        export_queue (ExportQueue): queue that writes the exports in the background
+    """
+    def __init__(self, map_widget: MapWidget, out_dir: str, export_queue: ExportQueue) -> None:
+        super().__init__(map_widget, out_dir, export_queue)
         
-        savepath = generate_filename(self.out_dir + "out.png", 0)
-        cv2.imwrite(savepath, map_img)
+        self.setText("Export (print)")
+
+    def export_map(self):
+        """Export the full resolution image of the map
+        """
+        treasure_map = self.map_widget.treasure_map
+        state = self.map_widget.get_render_state(show_player_icon=False)
+
+        future = self.export_queue.submit(self.out_dir + "print.png", lambda path:
+            export_full_resolution(treasure_map, state, path, dpi=PRINT_DPI))
+        future.add_done_callback(self.report_export)
 
 if __name__ == "__main__":
     app = QApplication([])
     
-    window = MainWindow(Map(MAP_PATH, ICONS), OUT_DIR)
+    # the other maps are loaded in the background, so switching to them is instant
+    catalogue = create_catalogue()
+    catalogue.preload()
+    
+    window = MainWindow(catalogue.get(catalogue.names[0]), OUT_DIR, catalogue)
     window.show()
 
     app.exec()
@@ -0,0 +1,42 @@
+import argparse
+
+from constants import OUT_DIR
+from src.batch import load_positions, grid_positions, get_visibility_mask, render_batch
+from src.icons import ICONS
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Render treasure maps for many player positions without the GUI")
+
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--positions", metavar="FILE",
+                        help="CSV file with (x, y) rows or JSON file with a list of [x, y] pairs")
+    source.add_argument("--grid", nargs=2, type=int, metavar=("COLUMNS", "ROWS"),
+                        help="render a regular grid of positions covering the whole map")
+
+    parser.add_argument("--absolute", action="store_true",
+                        help="positions are given in pixels on the map instead of relative to the map size")
+    parser.add_argument("--show-true-positions", default="", metavar="NAMES",
+                        help="comma separated names of the icons of which the true position is shown, or 'all'")
+    parser.add_argument("--show-player-icon", action="store_true", help="draw the player icon on the maps")
+    parser.add_argument("--out-dir", default=OUT_DIR + "batch/", help="directory where the maps are written")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="render at this scale of the source map resolution instead of the preview size, e.g. 1 "
+                             "for print quality")
+    parser.add_argument("--dpi", type=float, default=None, help="resolution stored in the images, used for printing")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    if args.positions:
+        positions = load_positions(args.positions, absolute=args.absolute)
+    else:
+        positions = grid_positions(*args.grid)
+
+    visibility = get_visibility_mask(ICONS, args.show_true_positions.split(","))
+
+    paths = render_batch(positions, args.out_dir, visibility, args.show_player_icon, args.processes, 
+                         scale=args.scale, dpi=args.dpi)
+    print(f"rendered {len(paths)} maps to {args.out_dir}")
@@ -0,0 +1,428 @@
+"""Benchmark suite for rendering, compositing, positioning, startup and export.
+
+The benchmarks run headless on a synthetic source map and synthetic icon sets, so they do not depend on the map image
+of the campaign. Run them from the root of the repository:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --save-baseline
+    python -m benchmarks.run --baseline benchmarks/baseline.json
+
+Results are written as JSON. When a baseline is given, every benchmark is compared against it and the run fails when
+a benchmark is slower than the baseline by more than the tolerance.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(REPO_DIR, "benchmarks", "baseline.json")
+
+# size of the synthetic source map, the preview is rendered at MAP_SCALE of this size
+SOURCE_SIZE = (4000, 3000)
+BACKGROUND_SIZES = [(800, 600), (2000, 1500), (4000, 3000), (8000, 6000)]
+ICON_COUNTS = [12, 100, 1000, 5000]
+QUICK_BACKGROUND_SIZES = BACKGROUND_SIZES[:2]
+QUICK_ICON_COUNTS = ICON_COUNTS[:2]
+ICON_PATHS = ["images/icons/brass.png", "images/icons/iron.png", "images/icons/gold.png", "images/icons/tin.png",
+              "images/icons/zinc.png", "images/icons/cadmium.png", "images/icons/platinum.png"]
+
+
+def measure(func: Callable[[], object], min_time: float, repeats: int = 5) -> Dict[str, float]:
+    """time a function, calling it in batches that take at least min_time / repeats seconds
+
+    Args:
+        func (Callable[[], object]): function to time
+        min_time (float): minimal total time in seconds spent on the measurement
+        repeats (int, optional): number of batches. Defaults to 5.
+
+    Returns:
+        Dict[str, float]: median and minimum time per call in milliseconds and the number of calls per batch
+    """
+    func()
+
+    # calibrate the number of calls per batch
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / repeats:
+            break
+        number *= 2 if elapsed == 0 else max(2, int(min_time / repeats / elapsed) + 1)
+
+    times = [elapsed / number]
+    for _ in range(repeats - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start) / number)
+
+    return {"median_ms": statistics.median(times) * 1e3, "min_ms": min(times) * 1e3, "iterations": number}
+
+
+class Suite(object):
+    """Collects the results of the benchmarks
+
+    Args:
+        min_time (float): minimal time in seconds spent on every benchmark
+        pattern (str, optional): only run benchmarks of which the name contains this pattern. Defaults to None.
+    """
+    def __init__(self, min_time: float, pattern: Optional[str] = None) -> None:
+        super().__init__()
+
+        self.min_time = min_time
+        self.pattern = pattern
+        self.results: List[Dict] = []
+
+    def wants(self, name: str) -> bool:
+        return self.pattern is None or self.pattern in name
+
+    def run(self, name: str, func: Callable[[], object], repeats: int = 5) -> None:
+        if not self.wants(name):
+            return
+        result = measure(func, self.min_time, repeats)
+        self.add(name, result)
+
+    def add(self, name: str, result: Dict[str, float]) -> None:
+        self.results.append({"name": name, **result})
+        print(f"{name:<60} {result['median_ms']:>10.3f} ms", flush=True)
+
+
+def synthetic_background(size: Tuple[int, int], seed: int = 0) -> np.array:
+    """generate a smooth synthetic RGB background
+
+    Args:
+        size (Tuple[int, int]): (width, height)
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        np.array: background with shape (height, width, 3)
+    """
+    w, h = size
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(1, h // 32), max(1, w // 32), 3), dtype=np.uint8)
+    return cv2.resize(small, (w, h), interpolation=cv2.INTER_LINEAR)
+
+
+def synthetic_icons(count: int, seed: int = 0) -> list:
+    """generate a set of PlayerPositionDependentIcons with random trajectories, of which half show their true position
+
+    Args:
+        count (int): number of icons
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list: icons
+    """
+    from src.icons import PlayerPositionDependentIcon
+    from src.position import Position
+    from src.trajectory import Trajectory
+
+    rng = np.random.default_rng(seed)
+    icons = []
+    for i in range(count):
+        icon = PlayerPositionDependentIcon(f"icon {i}",
+                                           Position(rng.uniform(0.1, 0.9), rng.uniform(0.1, 0.9)),
+                                           Trajectory(rng.uniform(0.05, 0.3), rng.uniform(-15, 15), rng.uniform(-15, 15),
+                                                      rng.uniform(0, 6.3)),
+                                           img_path=ICON_PATHS[i % len(ICON_PATHS)],
+                                           show_true_position=bool(i % 2))
+        icons.append(icon)
+    return icons
+
+
+def drag_path(steps: int, start: Tuple[int, int], seed: int = 0) -> list:
+    """generate the positions of a drag of the player icon in small random steps
+
+    Args:
+        steps (int): number of positions
+        start (Tuple[int, int]): first position
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        list: Position objects
+    """
+    from constants import MAP_WIDTH, MAP_HEIGHT
+    from src.position import Position
+
+    rng = np.random.default_rng(seed)
+    xy = np.cumsum(rng.integers(-4, 5, (steps, 2)), axis=0) + start
+    xy = np.clip(xy, 0, (MAP_WIDTH, MAP_HEIGHT))
+    return [Position(x, y, mode="absolute") for x, y in xy.tolist()]
+
+
+def bench_render(suite: Suite, sizes: List[Tuple[int, int]], counts: List[int]) -> None:
+    from constants import MAP_PATH, INITIAL_PLAYER_POSITION
+    from src.generate_map import Map, RenderState
+    from src.position import Position
+
+    start = Position.from_tuple(INITIAL_PLAYER_POSITION)
+    path = drag_path(64, (start.x, start.y))
+
+    for count in counts:
+        icons = synthetic_icons(count)
+        for size in sizes:
+            treasure_map = Map(MAP_PATH, icons, background=synthetic_background(size))
+            states = [RenderState(position, True, treasure_map.default_visibility) for position in path]
+            for incremental in (False, True):
+                name = f"render/{'incremental' if incremental else 'full'}/{size[0]}x{size[1]}/{count}icons"
+                positions = itertools.cycle(states)
+                suite.run(name, lambda: treasure_map.render(next(positions), incremental))
+
+
+def bench_render_threads(suite: Suite, size: Tuple[int, int], count: int) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+    from constants import MAP_PATH, INITIAL_PLAYER_POSITION
+    from src.generate_map import Map, RenderState
+    from src.position import Position
+
+    start = Position.from_tuple(INITIAL_PLAYER_POSITION)
+    treasure_map = Map(MAP_PATH, synthetic_icons(count), background=synthetic_background(size))
+    path = drag_path(32, (start.x, start.y))
+    states = [RenderState(position, True, treasure_map.default_visibility) for position in path]
+
+    # a batch of full renders of different states by a pool of threads that share the map
+    for threads in sorted({1, os.cpu_count() or 1}):
+        with ThreadPoolExecutor(threads) as pool:
+            suite.run(f"render/threads/{threads}/{size[0]}x{size[1]}/{count}icons/batch{len(states)}",
+                      lambda: list(pool.map(treasure_map.render, states)))
+
+
+def bench_draw_icon(suite: Suite) -> None:
+    from src.generate_map import Map
+    from src.icons import Icon, ICONS
+    from src.position import Position
+    from constants import MAP_PATH
+
+    treasure_map = Map(MAP_PATH, ICONS)
+    frame = treasure_map.background.copy()
+    icons = {"mask": Icon("mask", ICON_PATHS[0], binarize_alpha=True), 
+             "blend": Icon("blend", ICON_PATHS[0], binarize_alpha=False)}
+    size = icons["mask"].size[0]
+
+    cases = {"inside": Position(100, 100, mode="absolute"),
+             "edge": Position(-size // 2, -size // 3, mode="absolute"),
+             "outside": Position(-2 * size, 100, mode="absolute")}
+
+    for strategy, icon in icons.items():
+        for case, position in cases.items():
+            suite.run(f"draw_icon_on_map/{strategy}/{case}", lambda: treasure_map.draw_icon_on_map(frame, icon, position))
+
+
+def bench_compositors(suite: Suite, counts: List[int]) -> None:
+    from constants import MAP_PATH, INITIAL_PLAYER_POSITION
+    from src.compositing import COMPOSITORS, get_test_icons, render_golden, NumpyCompositor
+    from src.generate_map import Map, RenderState
+    from src.icons import ICONS
+    from src.position import Position
+
+    # every backend has to render the golden image of the reference exactly before it is timed
+    background = Map(MAP_PATH, ICONS).background
+    icons = get_test_icons(ICONS)
+    golden = render_golden(NumpyCompositor(), background, icons)
+    for name, compositor in COMPOSITORS.items():
+        if not np.array_equal(render_golden(compositor(), background, icons), golden):
+            raise AssertionError(f"the {name} compositor does not match the golden image")
+
+    start = Position.from_tuple(INITIAL_PLAYER_POSITION)
+    path = drag_path(64, (start.x, start.y))
+    for count in counts:
+        icons = synthetic_icons(count)
+        for name, compositor in COMPOSITORS.items():
+            treasure_map = Map(MAP_PATH, icons, background=background, compositor=compositor())
+            states = itertools.cycle([RenderState(position, True, treasure_map.default_visibility) for position in path])
+            suite.run(f"compositor/{name}/{count}icons", lambda: treasure_map.render(next(states)))
+
+
+def bench_positioning(suite: Suite, counts: List[int]) -> None:
+    from src.icons import ICONS
+    from src.position import Position
+    from src.trajectory import TrajectoryTable
+
+    position = Position(300, 400, mode="absolute")
+    icon = ICONS[0]
+    suite.run("position_on_map/single_icon", lambda: icon.position_on_map(position))
+    suite.run(f"position_on_map/all_icons/{len(ICONS)}icons", lambda: [i.position_on_map(position) for i in ICONS])
+
+    for count in counts:
+        table = TrajectoryTable(synthetic_icons(count))
+        suite.run(f"trajectory_table/single_position/{count}icons", lambda: table.positions_on_map((300, 400)))
+
+    table = TrajectoryTable(ICONS)
+    grid = np.random.default_rng(0).uniform(0, 600, (10000, 2))
+    suite.run(f"trajectory_table/10000_positions/{len(ICONS)}icons", lambda: table.positions_on_map(grid))
+
+
+def time_subprocess(code: str, env: Dict[str, str], repeats: int) -> Dict[str, float]:
+    """time a fresh interpreter that runs a piece of code
+
+    Args:
+        code (str): python code
+        env (Dict[str, str]): environment of the interpreter
+        repeats (int): number of runs
+
+    Returns:
+        Dict[str, float]: median and minimum wall time in milliseconds
+    """
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, env=env, check=True)
+        times.append(time.perf_counter() - start)
+    return {"median_ms": statistics.median(times) * 1e3, "min_ms": min(times) * 1e3, "iterations": 1}
+
+
+def bench_startup(suite: Suite, repeats: int) -> None:
+    env = dict(os.environ)
+
+    for name, code in (("python", "pass"), ("constants", "import constants"), ("icons", "import src.icons")):
+        if suite.wants(f"startup/warm/{name}"):
+            # make sure the cache is warm
+            subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, env=env, check=True)
+            suite.add(f"startup/warm/{name}", time_subprocess(code, env, repeats))
+
+    if suite.wants("startup/cold/icons"):
+        times = []
+        for _ in range(repeats):
+            cold_env = dict(env, TREASURE_MAP_CACHE_DIR=tempfile.mkdtemp(prefix="cache_", dir=env["TREASURE_MAP_WORK_DIR"]))
+            times.append(time_subprocess("import src.icons", cold_env, 1)["median_ms"])
+        suite.add("startup/cold/icons", {"median_ms": statistics.median(times), "min_ms": min(times), "iterations": 1})
+
+
+def bench_export(suite: Suite, work_dir: str) -> None:
+    from constants import MAP_PATH, INITIAL_PLAYER_POSITION
+    from src.export import PNGStreamWriter, export_full_resolution
+    from src.generate_map import Map, RenderState
+    from src.icons import ICONS
+    from src.position import Position
+
+    treasure_map = Map(MAP_PATH, ICONS)
+    player_position = Position.from_tuple(INITIAL_PLAYER_POSITION)
+    path = os.path.join(work_dir, "export.png")
+
+    state = RenderState(player_position, False, treasure_map.default_visibility)
+    preview = cv2.cvtColor(treasure_map.render(state), cv2.COLOR_RGB2BGR)
+    suite.run("export/imwrite_png/preview", lambda: cv2.imwrite(path, preview), repeats=3)
+
+    large = synthetic_background(SOURCE_SIZE)
+    suite.run(f"export/imwrite_png/{SOURCE_SIZE[0]}x{SOURCE_SIZE[1]}", lambda: cv2.imwrite(path, large), repeats=3)
+
+    def stream() -> None:
+        with PNGStreamWriter(path, SOURCE_SIZE[0], SOURCE_SIZE[1]) as writer:
+            for top in range(0, SOURCE_SIZE[1], 512):
+                writer.write_rows(large[top:top + 512])
+    suite.run(f"export/png_stream_writer/{SOURCE_SIZE[0]}x{SOURCE_SIZE[1]}", stream, repeats=3)
+
+    suite.run(f"export/full_resolution/{SOURCE_SIZE[0]}x{SOURCE_SIZE[1]}",
+              lambda: export_full_resolution(treasure_map, state, path), repeats=3)
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """compare results against a baseline and print the ratios
+
+    Args:
+        results (List[Dict]): results of this run
+        baseline (List[Dict]): results of the baseline run
+        tolerance (float): allowed relative slowdown
+
+    Returns:
+        List[str]: names of the benchmarks that regressed
+    """
+    baseline = {result["name"]: result for result in baseline}
+    regressions = []
+
+    print(f"\n{'benchmark':<60} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for result in results:
+        reference = baseline.get(result["name"])
+        if reference is None:
+            print(f"{result['name']:<60} {'-':>10} {result['median_ms']:>10.3f}")
+            continue
+
+        ratio = result["median_ms"] / reference["median_ms"]
+        flag = ""
+        if ratio > 1 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append(result["name"])
+        print(f"{result['name']:<60} {reference['median_ms']:>10.3f} {result['median_ms']:>10.3f} {ratio:>7.2f}{flag}")
+
+    return regressions
+
+
+def setup_environment(work_dir: str) -> None:
+    """write the synthetic source map and point the program at it and at an empty cache, before constants is imported
+
+    Args:
+        work_dir (str): temporary directory for the map, cache and exports
+    """
+    map_path = os.path.join(work_dir, "synthetic_map.jpg")
+    cv2.imwrite(map_path, synthetic_background(SOURCE_SIZE))
+
+    os.environ["TREASURE_MAP_PATH"] = map_path
+    os.environ["TREASURE_MAP_CACHE_DIR"] = os.path.join(work_dir, "cache")
+    os.environ["TREASURE_MAP_WORK_DIR"] = work_dir
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--quick", action="store_true", help="run fewer and shorter benchmarks")
+    parser.add_argument("--filter", default=None, help="only run benchmarks of which the name contains this text")
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="compare the results against this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write the results to {DEFAULT_BASELINE}")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default: 0.15)")
+    args = parser.parse_args()
+
+    os.chdir(REPO_DIR)
+    work_dir = tempfile.mkdtemp(prefix="treasure_map_benchmarks_")
+    try:
+        setup_environment(work_dir)
+
+        suite = Suite(min_time=0.2 if args.quick else 1., pattern=args.filter)
+        bench_render(suite,
+                     QUICK_BACKGROUND_SIZES if args.quick else BACKGROUND_SIZES,
+                     QUICK_ICON_COUNTS if args.quick else ICON_COUNTS)
+        bench_render_threads(suite, BACKGROUND_SIZES[1], ICON_COUNTS[1])
+        bench_draw_icon(suite)
+        bench_compositors(suite, QUICK_ICON_COUNTS if args.quick else ICON_COUNTS)
+        bench_positioning(suite, QUICK_ICON_COUNTS if args.quick else ICON_COUNTS)
+        bench_startup(suite, 3 if args.quick else 7)
+        bench_export(suite, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"meta": {"python": platform.python_version(),
+                       "numpy": np.__version__,
+                       "opencv": cv2.__version__,
+                       "platform": platform.platform(),
+                       "cpu_count": os.cpu_count(),
+                       "quick": args.quick},
+              "results": suite.results}
+
+    for path in filter(None, (args.output, DEFAULT_BASELINE if args.save_baseline else None)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(suite.results, json.load(f)["results"], args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,18 +1,53 @@
-import cv2
+import os
+from PIL import Image
+
+# EXIF orientations that rotate the image by 90 degrees when it is decoded
+ROTATED_ORIENTATIONS = (5, 6, 7, 8)
 
 def get_map_size(path, scale):
-    h, w, _ = cv2.imread(path).shape
+    # only the header of the image is read, the pixels are not decoded
+    with Image.open(path) as img:
+        w, h = img.size
+        if img.getexif().get(0x0112) in ROTATED_ORIENTATIONS:
+            w, h = h, w
     
     h *= scale
     w *= scale
     
     return int(w), int(h)
 
-MAP_PATH = "images/dessarin_valley.jpg"
+# the map and cache can be overridden with environment variables, e.g. to run the benchmarks on synthetic maps
+MAP_PATH = os.environ.get("TREASURE_MAP_PATH", "images/dessarin_valley.jpg")
 OUT_DIR = "images/output/"
+CACHE_DIR = os.environ.get("TREASURE_MAP_CACHE_DIR", ".cache/")
+MAP_CATALOGUE = os.environ.get("TREASURE_MAP_CATALOGUE", "maps.json") # optional JSON file with the other maps, see README
 MAP_SCALE = 0.2
 MAP_SIZE = get_map_size(MAP_PATH, MAP_SCALE)
 MAP_WIDTH = MAP_SIZE[0]
 MAP_HEIGHT = MAP_SIZE[1]
-INITIAL_PLAYER_POSITION = (0.2905, 0.6288)
 
+def get_preview_size(path):
+    # every map is previewed at the width of the main map, so the trajectories and icons have the same size on all maps
+    w, h = get_map_size(path, 1)
+    
+    return MAP_WIDTH, int(h * MAP_WIDTH / w)
+
+INITIAL_PLAYER_POSITION = (0.2905, 0.6288)
+MAX_FPS = None # maximum frame rate of the map while dragging, None for uncapped
+MAX_ZOOM = 2.0 # maximal number of pixels on the screen per pixel of the source map
+ZOOM_STEP = 1.25 # zoom factor of a single step of the mouse wheel
+PRINT_DPI = 300 # resolution stored in full resolution exports
+PROFILE_OVERLAY_INTERVAL = 500 # milliseconds between updates of the profiling overlay
+FRAME_CACHE_BYTES = 256 * 2**20 # maximum memory used by cached frames of the map
+FRAME_CACHE_GRID = 1 # size in pixels of the cells of player positions that share a cached frame
+PREWARM_FRAMES = 4 # number of frames ahead of a drag that are rendered while idle
+EXPORT_FORMAT = "png" # format of exported maps: png, jpg or webp
+EXPORT_QUALITY = None # PNG compression level (0-9) or JPEG/WebP quality (0-100) of exports, None for the default
+SUBPIXEL_PHASES = 4 # positions per pixel in each direction at which runes are drawn, 1 draws them on whole pixels with binary alpha
+SPATIAL_INDEX_CELL_SIZE = 32 # size in pixels of the cells of the spatial index used for finding icons under the cursor
+GUI_BACKEND = os.environ.get("TREASURE_MAP_BACKEND", "raster") # "raster" composites frames with NumPy, "scene" moves retained QGraphicsScene items
+SERVER_HOST = "127.0.0.1" # address of the render server, "0.0.0.0" serves the local network
+SERVER_PORT = 8000 # port of the render server
+SERVER_CACHE_BYTES = 64 * 2**20 # maximum memory used by the encoded maps cached by the render server
+FRAME_BUFFERS = 3 # number of frame buffers the map is rendered into in turn, 2 for double and 3 for triple buffering
+COMPOSITOR = os.environ.get("TREASURE_MAP_COMPOSITOR", "auto") # "numpy" or "opencv", "auto" benchmarks them at startup and picks the fastest
@@ -0,0 +1,84 @@
+import argparse
+import json
+import os
+import sys
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Record drag sessions in the GUI and replay them headlessly to "
+                                                 "measure the latency from mouse events to painted frames")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="open the GUI and record the mouse events on the map until it closes")
+    record.add_argument("trace", help="JSON file the session is written to")
+
+    replay = commands.add_parser("replay", help="replay a session on the offscreen platform and report the latency")
+    replay.add_argument("trace", nargs="?", default=None,
+                        help="JSON file with a recorded session (default: a synthetic drag of the player icon)")
+    replay.add_argument("--speed", type=float, default=1., help="playback speed (default: 1)")
+    replay.add_argument("--repeat", type=int, default=1, help="number of times the session is replayed, the report "
+                                                              "of every replay is printed (default: 1)")
+    replay.add_argument("--output", default=None, help="write the report of the last replay to this JSON file")
+    replay.add_argument("--max-p95", type=float, default=None, metavar="MS",
+                        help="fail when the 95th percentile of the latency is above this number of milliseconds")
+
+    return parser.parse_args()
+
+def format_report(report: dict) -> str:
+    latency = report["latency_ms"]
+    lines = [f"event to frame latency  p50 {latency['p50']:.1f} / p95 {latency['p95']:.1f} / p99 "
+             f"{latency['p99']:.1f} / max {latency['max']:.1f} ms" if latency else "no frames were requested",
+             f"{report['events']} events ({report['dropped_events']} dropped), {report['requested_frames']} frames "
+             f"requested, {report['painted_frames']} painted, {report['coalesced_frames']} coalesced, "
+             f"{report['unserved_frames']} never painted",
+             f"{report['events_per_s']:.0f} events/s, {report['fps']:.1f} fps over {report['duration_s']:.2f} s"]
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # the session is replayed without a screen, unless another platform is chosen explicitly
+    if args.command == "replay":
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+    from PyQt6.QtWidgets import QApplication
+
+    from constants import OUT_DIR
+    from app import MainWindow
+    from src.catalogue import create_catalogue
+    from src.interaction import InteractionRecorder, Trace, replay, synthetic_drag
+
+    app = QApplication([])
+    catalogue = create_catalogue()
+
+    if args.command == "record":
+        catalogue.preload()
+        window = MainWindow(catalogue.get(catalogue.names[0]), OUT_DIR, catalogue)
+        recorder = InteractionRecorder(window)
+        window.show()
+        app.exec()
+
+        recorder.trace.save(args.trace)
+        print(f"recorded {len(recorder.trace.events)} events in {recorder.trace.duration:.1f} s to {args.trace}")
+        sys.exit(0)
+
+    window = MainWindow(catalogue.get(catalogue.names[0]), OUT_DIR)
+    window.show()
+    map_widget = window.map_widget
+    if args.trace is None:
+        trace = synthetic_drag((map_widget.width(), map_widget.height()),
+                               (map_widget.player_position.x, map_widget.player_position.y))
+    else:
+        trace = Trace.load(args.trace)
+
+    for i in range(args.repeat):
+        report = replay(window, trace, args.speed)
+        print(f"replay {i + 1}/{args.repeat}\n{format_report(report)}", flush=True)
+    window.close()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.max_p95 is not None and report["latency_ms"].get("p95", 0.) > args.max_p95:
+        print(f"the 95th percentile of the latency is above {args.max_p95} ms")
+        sys.exit(1)
@@ -0,0 +1,37 @@
+import argparse
+import asyncio
+
+from constants import MAP_PATH, SERVER_HOST, SERVER_PORT, SERVER_CACHE_BYTES
+from src.generate_map import Map
+from src.icons import ICONS
+from src.server import RenderServer
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the treasure map over HTTP, e.g. GET /map.png?x=0.3&y=0.6")
+
+    parser.add_argument("--host", default=SERVER_HOST,
+                        help="address to listen on, use 0.0.0.0 to serve the devices on the local network")
+    parser.add_argument("--port", type=int, default=SERVER_PORT, help="port to listen on")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--cache-bytes", type=int, default=SERVER_CACHE_BYTES,
+                        help="maximum memory used by cached maps in bytes")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="maximum number of queued renders before requests are refused (default: four per "
+                             "process)")
+
+    return parser.parse_args()
+
+async def main(args: argparse.Namespace) -> None:
+    server = RenderServer(Map(MAP_PATH, ICONS), args.processes, args.cache_bytes, args.max_pending)
+    host, port = await server.start(args.host, args.port)
+    print(f"serving the treasure map on http://{host}:{port}/map.png?x=0.5&y=0.5, metrics on /metrics")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parse_args()))
+    except KeyboardInterrupt:
+        pass
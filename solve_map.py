@@ -0,0 +1,74 @@
+import argparse
+import csv
+import os
+import time
+import cv2
+import numpy as np
+
+from constants import MAP_PATH, MAP_WIDTH, MAP_HEIGHT, OUT_DIR
+from src.batch import get_visibility_mask
+from src.generate_map import Map
+from src.icons import ICONS
+from src.solver import solve, colorize, overlay
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Find the positions of the players at which the icons are close to "
+                                                 "their true positions")
+
+    parser.add_argument("--grid", nargs=2, type=int, default=(MAP_WIDTH, MAP_HEIGHT), metavar=("COLUMNS", "ROWS"),
+                        help="number of evaluated positions of the players (default: one per pixel of the map)")
+    parser.add_argument("--icons", default="all", metavar="NAMES",
+                        help="comma separated names of the icons that are combined, or 'all'")
+    parser.add_argument("--top", type=int, default=5, help="number of best positions that are reported")
+    parser.add_argument("--max-distance", type=float, default=0.1 * MAP_WIDTH,
+                        help="distance in pixels at which the colour scale of the heatmaps saturates")
+    parser.add_argument("--out-dir", default=OUT_DIR + "solver/", help="directory where the heatmaps are written")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (default: all cores for large grids)")
+    parser.add_argument("--no-cache", action="store_true", help="recompute the distances even when they are cached")
+
+    return parser.parse_args()
+
+def write_image(path: str, image: np.array) -> None:
+    cv2.imwrite(path, cv2.cvtColor(image, cv2.COLOR_RGB2BGR))
+
+if __name__ == "__main__":
+    args = parse_args()
+    selection = get_visibility_mask(ICONS, args.icons.split(","))
+
+    start = time.perf_counter()
+    solution = solve(ICONS, *args.grid, processes=args.processes, use_cache=not args.no_cache)
+    combined = solution.combined(selection)
+    sensitivity = solution.sensitivity(combined)
+    best = solution.best_positions(combined, args.top)
+    print(f"evaluated {args.grid[0]}x{args.grid[1]} positions in {time.perf_counter() - start:.2f} s")
+
+    os.makedirs(args.out_dir, exist_ok=True)
+
+    # names of the icons are not unique (there are several doors), so files and columns are qualified by their index
+    names = [f"{i:02d}_{icon.name}" for i, icon in enumerate(ICONS)]
+
+    # heatmaps of the individual icons and the combination of the selected icons
+    for name, icon in zip(names, ICONS):
+        write_image(os.path.join(args.out_dir, f"{name}.png"), colorize(solution.heatmap(icon), args.max_distance))
+    write_image(os.path.join(args.out_dir, "combined.png"), colorize(combined, args.max_distance))
+
+    background = Map(MAP_PATH, ICONS).background
+    write_image(os.path.join(args.out_dir, "overlay.png"), overlay(background, combined, args.max_distance, best))
+
+    # best positions with their distances and how fast these change when the players move
+    with open(os.path.join(args.out_dir, "best_positions.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["rank", "x", "y", "relative_x", "relative_y", "distance", "sensitivity"] +
+                        names)
+        for rank, (position, distance) in enumerate(best, 1):
+            relative_x, relative_y = position.to_relative()
+            writer.writerow([rank, position.x, position.y, f"{relative_x:.4f}", f"{relative_y:.4f}", f"{distance:.2f}",
+                             f"{solution.sample(sensitivity, position):.3f}"] +
+                            [f"{solution.sample(solution.heatmap(icon), position):.2f}" for icon in ICONS])
+
+    for rank, (position, distance) in enumerate(best, 1):
+        relative_x, relative_y = position.to_relative()
+        print(f"{rank}. ({relative_x:.4f}, {relative_y:.4f}) at {distance:.1f} px from the true positions, "
+              f"{solution.sample(sensitivity, position):.2f} px per px moved")
+    print(f"wrote the heatmaps to {args.out_dir}")
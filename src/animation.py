@@ -0,0 +1,336 @@
+import os
+from collections import deque
+from math import hypot
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+from constants import MAP_PATH, MAP_WIDTH, get_map_size
+from . import batch
+from .generate_map import Map, RenderState
+from .icons import ICONS
+from .position import Position
+from .tiles import TilePyramid
+from .viewport import ViewportRenderer
+
+# video codecs by file extension, other extensions use mp4v
+VIDEO_CODECS = {".avi": "MJPG", ".mp4": "mp4v", ".mov": "mp4v", ".mkv": "mp4v"}
+
+# state of a worker process, set by init_worker
+_worker_frames: Optional[SharedMemory] = None
+_worker_frame_shape: Optional[Tuple[int]] = None
+_worker_renderer: Optional[ViewportRenderer] = None
+_worker_scale: Optional[float] = None
+_worker_palette: Optional[Image.Image] = None
+
+
+def route_positions(waypoints: Sequence[Tuple[int, int]], step: float) -> Iterator[Position]:
+    """walk along a route at a constant speed. Positions are generated lazily, so routes can be arbitrarily long
+
+    Args:
+        waypoints (Sequence[Tuple[int, int]]): absolute (x, y) corners of the route, a single waypoint is a route of
+            a single position
+        step (float): distance in pixels between two positions, or 0 to use the waypoints themselves as positions, such
+            as the positions of a recorded drag
+
+    Returns:
+        Iterator[Position]: absolute positions along the route, including the first and last waypoint
+
+    Raises:
+        ValueError: if the route has no waypoints
+    """
+    # checked here instead of in the generator, so an empty route is reported before any frame is rendered
+    if len(waypoints) == 0:
+        raise ValueError("the route has no waypoints, give at least one (x, y) position")
+
+    return _walk_route(waypoints, step)
+
+
+def _walk_route(waypoints: Sequence[Tuple[int, int]], step: float) -> Iterator[Position]:
+    if step <= 0:
+        for x, y in waypoints:
+            yield Position(int(x), int(y), mode="absolute")
+        return
+
+    # distance along the route that is left over from the previous segment
+    travelled = 0.
+    for (x0, y0), (x1, y1) in zip(waypoints[:-1], waypoints[1:]):
+        length = hypot(x1 - x0, y1 - y0)
+        while travelled < length:
+            t = travelled / length
+            yield Position(round(x0 + t * (x1 - x0)), round(y0 + t * (y1 - y0)), mode="absolute")
+            travelled += step
+        travelled -= length
+
+    x, y = waypoints[-1]
+    yield Position(int(x), int(y), mode="absolute")
+
+
+class VideoStreamWriter(object):
+    """Writes RGB frames to a video file with OpenCV, one frame at a time
+
+    Args:
+        path (str): path of the video file, the extension determines the codec
+        width (int): width of the frames
+        height (int): height of the frames
+        fps (float): frames per second
+    """
+    def __init__(self, path: str, width: int, height: int, fps: float) -> None:
+        super().__init__()
+
+        codec = VIDEO_CODECS.get(os.path.splitext(path)[1].lower(), "mp4v")
+        self._writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+        if not self._writer.isOpened():
+            raise ValueError(f"cannot write a video with codec {codec} to {path}")
+
+    def __enter__(self) -> "VideoStreamWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write_frame(self, frame: np.array) -> None:
+        """encode and write the next frame
+
+        Args:
+            frame (np.array): BGR frame with shape (height, width, 3)
+        """
+        self._writer.write(frame)
+
+    def close(self) -> None:
+        """finish and close the file"""
+        self._writer.release()
+
+
+class GIFStreamWriter(object):
+    """Writes frames with a shared palette to an animated GIF, one frame at a time, so the animation never has to be in
+    memory
+
+    Args:
+        path (str): path of the GIF file
+        width (int): width of the frames
+        height (int): height of the frames
+        fps (float): frames per second, GIF stores the frame duration in hundredths of a second
+        palette (Image.Image): palette image that all frames are quantized to, see get_palette
+    """
+    def __init__(self, path: str, width: int, height: int, fps: float, palette: Image.Image) -> None:
+        super().__init__()
+
+        self.size = (width, height)
+        self.palette = palette
+        self.duration = 1000 / fps
+        self.frames_written = 0
+
+        self._file = open(path, "wb")
+
+    def __enter__(self) -> "GIFStreamWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def _to_image(self, frame: np.array) -> Image.Image:
+        image = Image.frombuffer("P", self.size, np.ascontiguousarray(frame), "raw", "P", 0, 1)
+        image.putpalette(self.palette.getpalette())
+        return image
+
+    def write_frame(self, frame: np.array) -> None:
+        """encode and write the next frame
+
+        Args:
+            frame (np.array): palette indices with shape (height, width)
+        """
+        image = self._to_image(frame)
+
+        if self.frames_written == 0:
+            header, _ = GifImagePlugin.getheader(image, info={"loop": 0, "duration": self.duration, "optimize": False})
+            for block in header:
+                self._file.write(block)
+
+        for block in GifImagePlugin.getdata(image, duration=self.duration):
+            self._file.write(block)
+        self.frames_written += 1
+
+    def close(self) -> None:
+        """finish and close the file"""
+        # trailer
+        self._file.write(b";")
+        self._file.close()
+
+
+def get_palette(treasure_map: Map, player_position: Position) -> Image.Image:
+    """determine a palette for a GIF animation from a frame with all icons, which all frames are quantized to
+
+    Args:
+        treasure_map (Map): Map object that renders the frame
+        player_position (Position): position of the players in the frame
+
+    Returns:
+        Image.Image: palette image with 256 colours
+    """
+    visibility = (True,) * len(treasure_map.player_position_dependent_icons)
+    frame = treasure_map.render(RenderState(player_position, True, visibility))
+
+    return Image.fromarray(frame).quantize(256, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+
+def init_worker(memory_name: str,
+                shape: Tuple[int],
+                dtype: str,
+                compositor: str,
+                visibility: Tuple[bool],
+                frames_name: str,
+                frame_shape: Tuple[int],
+                scale: Optional[float],
+                palette: Optional[Image.Image]) -> None:
+    """initialize a worker process with a Map that uses the background in shared memory, see batch.init_worker, and the
+    ring of frame slots in shared memory that frames are rendered into
+
+    Args:
+        memory_name (str): name of the shared memory block holding the background
+        shape (Tuple[int]): shape of the background
+        dtype (str): dtype of the background
+        compositor (str): name of the compositing backend of the parent process, see COMPOSITORS
+        visibility (Tuple[bool]): visibility of the true position of each icon
+        frames_name (str): name of the shared memory block holding the frame slots
+        frame_shape (Tuple[int]): shape of a frame, (height, width, 3) for BGR frames or (height, width) for palette
+            indices
+        scale (float, optional): scale relative to the resolution of the source map, None for the scale of Map
+        palette (Image.Image, optional): palette that frames are quantized to, None for BGR frames
+    """
+    global _worker_frames, _worker_frame_shape, _worker_renderer, _worker_scale, _worker_palette
+
+    batch.init_worker(memory_name, shape, dtype, compositor, visibility)
+
+    _worker_frames = SharedMemory(name=frames_name)
+    _worker_frame_shape = frame_shape
+    _worker_scale = scale
+    _worker_palette = palette
+    if scale is not None:
+        _worker_renderer = ViewportRenderer(batch._worker_map, (frame_shape[1], frame_shape[0]))
+
+
+def render_frame(task: Tuple[int, int, int, bool]) -> int:
+    """render a frame in a worker process and convert it into a slot in shared memory
+
+    Args:
+        task (Tuple[int, int, int, bool]): slot, x, y and whether to show the player icon
+
+    Returns:
+        int: slot that holds the frame
+    """
+    slot, x, y, show_player_icon = task
+    state = RenderState(Position(x, y, mode="absolute"), show_player_icon, batch._worker_visibility)
+
+    if _worker_scale is None:
+        frame = batch._worker_map.render(state)
+    else:
+        frame = _worker_renderer.render((_worker_scale, 0., 0.), state)
+
+    size = int(np.prod(_worker_frame_shape))
+    out = np.ndarray(_worker_frame_shape, np.uint8, buffer=_worker_frames.buf, offset=slot * size)
+    if _worker_palette is None:
+        cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=out)
+    else:
+        quantized = Image.fromarray(frame).quantize(palette=_worker_palette, dither=Image.Dither.NONE)
+        out[:] = np.asarray(quantized)
+
+    return slot
+
+
+def export_animation(positions: Iterable[Position],
+                     path: str,
+                     visibility: Tuple[bool],
+                     show_player_icon: bool = True,
+                     fps: float = 25.,
+                     scale: Optional[float] = None,
+                     processes: Optional[int] = None,
+                     max_in_flight: Optional[int] = None) -> int:
+    """export an animation of the map while the players travel along a route, as a video or an animated GIF.
+
+    The frames are rendered by a pool of worker processes into a ring of slots in shared memory and encoded in order by
+    the calling process. At most max_in_flight frames are rendered or waiting to be encoded at any time, so memory use
+    does not depend on the length of the route.
+
+    Args:
+        positions (Iterable[Position]): absolute positions of the players, one per frame, e.g. from route_positions
+        path (str): path of the animation, a .gif extension writes an animated GIF and other extensions a video
+        visibility (Tuple[bool]): visibility of the true position of each icon in ICONS
+        show_player_icon (bool, optional): specifies whether to show the player icon. Defaults to True.
+        fps (float, optional): frames per second. Defaults to 25.
+        scale (float, optional): scale relative to the resolution of the source map. Defaults to None, which renders at
+            the scale of Map.
+        processes (int, optional): number of worker processes. Defaults to None, which uses all cores.
+        max_in_flight (int, optional): maximum number of frames that are rendered or waiting to be encoded. Defaults to
+            None, which uses twice the number of processes.
+
+    Returns:
+        int: number of frames written
+    """
+    positions = iter(positions)
+    first_position = next(positions, None)
+    if first_position is None:
+        raise ValueError("the route has no positions")
+
+    processes = processes or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * processes
+
+    treasure_map = Map(MAP_PATH, ICONS)
+    if scale is None:
+        height, width = treasure_map.background.shape[:2]
+    else:
+        source_width, source_height = get_map_size(MAP_PATH, 1)
+        width, height = round(source_width * scale), round(source_height * scale)
+
+        # build the tile pyramid once before the workers all try to build it
+        TilePyramid(MAP_PATH, MAP_WIDTH / source_width)
+
+    if path.lower().endswith(".gif"):
+        palette = get_palette(treasure_map, first_position)
+        writer = GIFStreamWriter(path, width, height, fps, palette)
+        frame_shape = (height, width)
+    else:
+        palette = None
+        writer = VideoStreamWriter(path, width, height, fps)
+        frame_shape = (height, width, 3)
+
+    frame_size = int(np.prod(frame_shape))
+    frames = SharedMemory(create=True, size=frame_size * max_in_flight)
+    frames_written = 0
+
+    try:
+        with writer, batch.SharedBackground(treasure_map) as shared:
+            initargs = shared.initargs + (visibility, frames.name, frame_shape, scale, palette)
+            with Pool(processes, initializer=init_worker, initargs=initargs) as pool:
+                free_slots = list(range(max_in_flight))
+                in_flight = deque()
+
+                def write_oldest() -> None:
+                    slot = in_flight.popleft().get()
+                    writer.write_frame(np.ndarray(frame_shape, np.uint8, buffer=frames.buf, offset=slot * frame_size))
+                    free_slots.append(slot)
+
+                for position in _prepend(first_position, positions):
+                    if not free_slots:
+                        write_oldest()
+                        frames_written += 1
+
+                    task = (free_slots.pop(), position.x, position.y, show_player_icon)
+                    in_flight.append(pool.apply_async(render_frame, (task,)))
+
+                while in_flight:
+                    write_oldest()
+                    frames_written += 1
+    finally:
+        frames.close()
+        frames.unlink()
+
+    return frames_written
+
+
+def _prepend(first: Position, rest: Iterator[Position]) -> Iterator[Position]:
+    yield first
+    yield from rest
@@ -0,0 +1,210 @@
+import csv
+import json
+import os
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+
+from constants import MAP_PATH, MAP_WIDTH, get_map_size
+from .compositing import COMPOSITORS
+from .export import export_full_resolution
+from .position import Position, PositionArray
+from .generate_map import Map, RenderState
+from .icons import PlayerPositionDependentIcon, ICONS
+from .tiles import TilePyramid
+
+# state of a worker process, set by init_worker
+_worker_map: Optional[Map] = None
+_worker_memory: Optional[SharedMemory] = None
+_worker_visibility: Tuple[bool] = ()
+
+
+def load_positions(path: str, absolute: bool = False) -> List[Tuple[int, int]]:
+    """load a list of player positions from a CSV file with (x, y) rows or a JSON file with a list of [x, y] pairs or
+    {"x": x, "y": y} objects
+
+    Args:
+        path (str): path to the .csv or .json file
+        absolute (bool, optional): specifies whether the coordinates are in pixels on the map instead of relative to the
+            map size. Defaults to False.
+
+    Returns:
+        List[Tuple[int, int]]: absolute (x, y) positions on the map
+    """
+    if path.lower().endswith(".json"):
+        with open(path) as f:
+            items = json.load(f)
+        pairs = [(item["x"], item["y"]) if isinstance(item, dict) else (item[0], item[1]) for item in items]
+    else:
+        pairs = []
+        with open(path, newline="") as f:
+            for row in csv.reader(f):
+                if len(row) < 2:
+                    continue
+                try:
+                    pairs.append((float(row[0]), float(row[1])))
+                except ValueError:
+                    # header row
+                    continue
+
+    positions = PositionArray(np.array(pairs, dtype=np.float64).reshape(-1, 2), "absolute" if absolute else "relative")
+    return [(int(x), int(y)) for x, y in positions.xy.tolist()]
+
+
+def grid_positions(columns: int, rows: int) -> List[Tuple[int, int]]:
+    """generate a regular grid of player positions covering the whole map
+
+    Args:
+        columns (int): number of positions in the horizontal direction
+        rows (int): number of positions in the vertical direction
+
+    Returns:
+        List[Tuple[int, int]]: absolute (x, y) positions on the map, row by row
+    """
+    x, y = np.meshgrid(np.linspace(0, 1, columns), np.linspace(0, 1, rows))
+    positions = PositionArray(np.stack((x.ravel(), y.ravel()), axis=1))
+    return [(x, y) for x, y in positions.xy.tolist()]
+
+
+def get_visibility_mask(icons: Sequence[PlayerPositionDependentIcon], names: Iterable[str]) -> Tuple[bool]:
+    """determine for each icon whether its true position is shown
+
+    Args:
+        icons (Sequence[PlayerPositionDependentIcon]): icons on the map
+        names (Iterable[str]): case insensitive names of the icons of which the true position is shown, or "all"
+
+    Returns:
+        Tuple[bool]: visibility of the true position of each icon
+    """
+    names = {name.strip().lower() for name in names if name.strip()}
+    unknown = names - {icon.name.lower() for icon in icons} - {"all"}
+    if unknown:
+        raise ValueError("unknown icon name(s): " + ", ".join(sorted(unknown)))
+
+    return tuple("all" in names or icon.name.lower() in names for icon in icons)
+
+
+def init_worker(memory_name: str, shape: Tuple[int], dtype: str, compositor: str, visibility: Tuple[bool]) -> None:
+    """initialize a worker process with a Map that uses the background in shared memory and the compositing backend
+    selected by the parent process, so the workers do not all benchmark the backends again
+
+    Args:
+        memory_name (str): name of the shared memory block holding the background
+        shape (Tuple[int]): shape of the background
+        dtype (str): dtype of the background
+        compositor (str): name of the compositing backend, see COMPOSITORS
+        visibility (Tuple[bool]): visibility of the true position of each icon
+    """
+    global _worker_map, _worker_memory, _worker_visibility
+
+    # the pool already uses all cores, so OpenCV should not start threads of its own
+    cv2.setNumThreads(1)
+
+    _worker_memory = SharedMemory(name=memory_name)
+    background = np.ndarray(shape, dtype=dtype, buffer=_worker_memory.buf)
+    background.flags.writeable = False
+
+    _worker_visibility = tuple(visibility)
+    _worker_map = Map(MAP_PATH, ICONS, background=background, compositor=COMPOSITORS[compositor]())
+
+
+def render_to_file(task: Tuple[int, int, str, bool, Optional[float], Optional[float]]) -> str:
+    """render the treasure map for a single player position in a worker process and write it to disk
+
+    Args:
+        task (Tuple[int, int, str, bool, Optional[float], Optional[float]]): x, y, output path, whether to show the 
+            player icon, scale relative to the source map (None for the scale of Map) and dpi
+
+    Returns:
+        str: output path
+    """
+    x, y, out_path, show_player_icon, scale, dpi = task
+    state = RenderState(Position(x, y, mode="absolute"), show_player_icon, _worker_visibility)
+
+    if scale is None:
+        map_img = _worker_map.render(state)
+        cv2.imwrite(out_path, cv2.cvtColor(map_img, cv2.COLOR_RGB2BGR))
+    else:
+        export_full_resolution(_worker_map, state, out_path, scale, dpi)
+
+    return out_path
+
+
+class SharedBackground(object):
+    """Context manager that copies the background of a Map into a block of shared memory, so worker processes can use it
+    without decoding the map image again. The workers also get the compositing backend of the map.
+
+    Args:
+        treasure_map (Map): map of which the background and compositing backend are shared
+    """
+    def __init__(self, treasure_map: Map) -> None:
+        super().__init__()
+
+        self.background = treasure_map.background
+        self.compositor = treasure_map.compositor.name
+        self.memory = None
+
+    def __enter__(self) -> "SharedBackground":
+        self.memory = SharedMemory(create=True, size=self.background.nbytes)
+        np.ndarray(self.background.shape, self.background.dtype, buffer=self.memory.buf)[:] = self.background
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+    @property
+    def initargs(self) -> Tuple[str, Tuple[int], str, str]:
+        return self.memory.name, self.background.shape, self.background.dtype.str, self.compositor
+
+
+def render_batch(positions: Sequence[Tuple[int, int]],
+                 out_dir: str,
+                 visibility: Tuple[bool],
+                 show_player_icon: bool = False,
+                 processes: Optional[int] = None,
+                 filename: str = "map_{index:05d}.png",
+                 scale: Optional[float] = None,
+                 dpi: Optional[float] = None) -> List[str]:
+    """render the treasure map for every player position and write the images to disk using a pool of worker processes
+
+    Args:
+        positions (Sequence[Tuple[int, int]]): absolute (x, y) positions of the players
+        out_dir (str): directory where the images are written
+        visibility (Tuple[bool]): visibility of the true position of each icon in ICONS
+        show_player_icon (bool, optional): specifies whether to show the player icon. Defaults to False.
+        processes (int, optional): number of worker processes. Defaults to None, which uses all cores.
+        filename (str, optional): format of the file names, with the index of the position as argument.
+            Defaults to "map_{index:05d}.png".
+        scale (float, optional): scale relative to the resolution of the source map, rendered in strips. Defaults to 
+            None, which renders at the scale of Map.
+        dpi (float, optional): resolution stored in the files when a scale is given. Defaults to None.
+
+    Returns:
+        List[str]: paths of the written images, in the order of the positions
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(x, y, os.path.join(out_dir, filename.format(index=i)), show_player_icon, scale, dpi)
+             for i, (x, y) in enumerate(positions)]
+
+    # build the tile pyramid once before the workers all try to build it
+    if scale is not None:
+        TilePyramid(MAP_PATH, MAP_WIDTH / get_map_size(MAP_PATH, 1)[0])
+
+    processes = processes or os.cpu_count()
+    chunksize = max(1, len(tasks) // (processes * 4))
+
+    with SharedBackground(Map(MAP_PATH, ICONS)) as shared:
+        with Pool(processes, initializer=init_worker, initargs=shared.initargs + (visibility,)) as pool:
+            for _ in pool.imap_unordered(render_to_file, tasks, chunksize):
+                pass
+
+    # write an index that links every image to its position
+    with open(os.path.join(out_dir, "index.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(("file", "x", "y"))
+        writer.writerows((os.path.basename(task[2]), task[0], task[1]) for task in tasks)
+
+    return [task[2] for task in tasks]
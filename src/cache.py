@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+from typing import BinaryIO, Callable, Iterable, Optional, Tuple
+import numpy as np
+
+from constants import CACHE_DIR
+
+# increment when the content of cached arrays changes for the same source and parameters
+CACHE_VERSION = 2
+
+
+def get_cache_path(source_path: Optional[str], params: Tuple) -> str:
+    """get the path of the cache file of an array derived from a source file
+
+    Args:
+        source_path (Optional[str]): path to the file the array is derived from, or None for an array that only depends 
+            on the parameters, in which case the first parameter names the cache file
+        params (Tuple): parameters that, together with the source file, determine the content of the array
+
+    Returns:
+        str: path to the .npy cache file
+    """
+    if source_path is None:
+        key = repr((CACHE_VERSION, params))
+        stem = str(params[0])
+    else:
+        stat = os.stat(source_path)
+        key = repr((CACHE_VERSION, os.path.abspath(source_path), stat.st_mtime_ns, stat.st_size, params))
+        stem = os.path.splitext(os.path.basename(source_path))[0]
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    return os.path.join(CACHE_DIR, f"{stem}-{digest}.npy")
+
+
+def _load(cache_path: str) -> Optional[np.array]:
+    if os.path.exists(cache_path):
+        try:
+            return np.load(cache_path, mmap_mode="r")
+        except (OSError, ValueError):
+            # corrupt cache file, rebuild it
+            pass
+    return None
+
+
+def _write(cache_path: str, write: Callable[[BinaryIO], None]) -> bool:
+    # write to a temporary file first, so other processes and threads never load a partially written file
+    tmp_path = f"{cache_path}.{os.getpid()}-{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "wb") as f:
+            write(f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # caching is an optimization, a read-only disk should not stop the program
+        return False
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def load_cached_array(source_path: Optional[str], params: Tuple, build: Callable[[], np.array]) -> np.array:
+    """load an array derived from a source file from the on-disk cache, or build and cache it when it is missing.
+    Cached arrays are memory-mapped read-only, also right after they are built, so they are loaded lazily and shared
+    between processes by the OS.
+
+    Args:
+        source_path (Optional[str]): path to the file the array is derived from, see get_cache_path
+        params (Tuple): parameters that, together with the source file, determine the content of the array
+        build (Callable[[], np.array]): function that builds the array when it is not cached
+
+    Returns:
+        np.array: the (read-only) array
+    """
+    cache_path = get_cache_path(source_path, params)
+    array = _load(cache_path)
+    if array is not None:
+        return array
+
+    array = build()
+    if not _write(cache_path, lambda f: np.save(f, array)):
+        return array
+
+    # the built array is dropped for the memory-mapped file, which does not count towards the memory of the process
+    return np.load(cache_path, mmap_mode="r")
+
+
+def load_cached_chunks(source_path: Optional[str],
+                       params: Tuple,
+                       shape: Tuple[int, ...],
+                       dtype: np.dtype,
+                       build: Callable[[], Iterable[np.array]]) -> np.array:
+    """load an array derived from a source file from the on-disk cache, or build and cache it when it is missing, see
+    load_cached_array. The array is built in chunks along its first axis, which are written to the cache file as soon
+    as they are built, so the array never has to fit in memory.
+
+    Args:
+        source_path (Optional[str]): path to the file the array is derived from, see get_cache_path
+        params (Tuple): parameters that, together with the source file, determine the content of the array
+        shape (Tuple[int, ...]): shape of the array
+        dtype (np.dtype): data type of the array
+        build (Callable[[], Iterable[np.array]]): function that returns the chunks of the array in order
+
+    Returns:
+        np.array: the (read-only) array
+    """
+    cache_path = get_cache_path(source_path, params)
+    array = _load(cache_path)
+    if array is not None:
+        return array
+
+    dtype = np.dtype(dtype)
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False, "shape": tuple(shape)}
+
+    def write(f: BinaryIO) -> None:
+        np.lib.format.write_array_header_1_0(f, header)
+        for chunk in build():
+            np.ascontiguousarray(chunk, dtype=dtype).tofile(f)
+
+    if not _write(cache_path, write):
+        # without a cache the array has to be held in memory after all
+        return np.concatenate(list(build())).reshape(shape)
+
+    return np.load(cache_path, mmap_mode="r")
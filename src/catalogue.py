@@ -0,0 +1,146 @@
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from constants import MAP_PATH, MAP_SIZE, MAP_CATALOGUE, get_preview_size
+from .generate_map import Map
+from .icons import PlayerPositionDependentIcon, ICONS
+from .position import Position
+from .trajectory import Trajectory
+
+class MapEntry(object):
+    """Map of the catalogue with its own icons. Maps are previewed at the width of the main map, so their height
+    follows from the aspect ratio of the image.
+
+    Args:
+        name (str): name of the map shown in the GUI
+        map_path (str): path to the map image
+        icons (Sequence[PlayerPositionDependentIcon]): icons of the hidden locations on this map
+        size (Tuple[int, int], optional): (width, height) of the preview. Defaults to None, which derives it from the
+            image.
+    """
+    def __init__(self,
+                 name: str,
+                 map_path: str,
+                 icons: Sequence[PlayerPositionDependentIcon],
+                 size: Optional[Tuple[int, int]] = None) -> None:
+        super().__init__()
+
+        self.name = name
+        self.map_path = map_path
+        self.icons = tuple(icons)
+        self.size = get_preview_size(map_path) if size is None else size
+
+
+def get_map_name(map_path: str) -> str:
+    return os.path.splitext(os.path.basename(map_path))[0].replace("_", " ").title()
+
+
+def load_map_entries(path: str) -> List[MapEntry]:
+    """load maps and their icons from a JSON file. Positions and offsets are relative to the size of the map:
+
+        {"maps": [{"name": "Neverwinter Wood", "map": "images/neverwinter_wood.jpg", "treasure": [0.6, 0.5],
+                   "icons": [{"name": "brass", "image": "images/icons/brass.png", "true_position": [0.5, 0.2],
+                              "trajectory": {"radius": 0.1, "angle_y": -3}, "offset": [-0.02, -0.02]}]}]}
+
+    Args:
+        path (str): path to the JSON file
+
+    Returns:
+        List[MapEntry]: the maps
+    """
+    with open(path) as f:
+        catalogue = json.load(f)
+
+    entries = []
+    for item in catalogue["maps"]:
+        size = get_preview_size(item["map"])
+
+        def to_position(xy: Sequence[float]) -> Position:
+            return Position(round(xy[0] * size[0]), round(xy[1] * size[1]), mode="absolute")
+
+        treasure_position = to_position(item["treasure"])
+        icons = [PlayerPositionDependentIcon(icon["name"],
+                                             to_position(icon["true_position"]),
+                                             Trajectory(**icon["trajectory"]),
+                                             img_path=icon.get("image", "images/icons/brass.png"),
+                                             img_offset=to_position(icon.get("offset", (-0.02, -0.02))),
+                                             treasure_position=treasure_position)
+                 for icon in item["icons"]]
+        entries.append(MapEntry(item.get("name", get_map_name(item["map"])), item["map"], icons, size))
+
+    return entries
+
+
+class MapCatalogue(object):
+    """Catalogue of the maps of a campaign, of which the Map objects are created once and kept, so switching between
+    maps is instant. The backgrounds are memory-mapped from the on-disk cache, so the maps that are not shown take
+    next to no memory. preload creates all maps on a background thread.
+
+    Args:
+        entries (Sequence[MapEntry]): maps of the catalogue, the first is the default map
+    """
+    def __init__(self, entries: Sequence[MapEntry]) -> None:
+        super().__init__()
+
+        self.entries: Dict[str, MapEntry] = {entry.name: entry for entry in entries}
+        if len(self.entries) != len(entries):
+            raise ValueError("the names of the maps in the catalogue are not unique")
+
+        self._maps: Dict[str, Map] = {}
+        self._locks = {name: threading.Lock() for name in self.entries}
+        self._preload_thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def names(self) -> List[str]:
+        """List[str]: names of the maps, the default map first"""
+        return list(self.entries)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._maps
+
+    def get(self, name: str) -> Map:
+        """get the Map object of a map, which is created the first time it is requested. Waits when the map is being
+        preloaded
+
+        Args:
+            name (str): name of the map
+
+        Returns:
+            Map: the map
+        """
+        treasure_map = self._maps.get(name)
+        if treasure_map is None:
+            with self._locks[name]:
+                treasure_map = self._maps.get(name)
+                if treasure_map is None:
+                    entry = self.entries[name]
+                    treasure_map = self._maps[name] = Map(entry.map_path, entry.icons, size=entry.size)
+        return treasure_map
+
+    def preload(self) -> None:
+        """create all maps on a background thread, decoding and caching the backgrounds that are not cached yet"""
+        if self._preload_thread is None:
+            self._preload_thread = threading.Thread(target=lambda: [self.get(name) for name in self.entries],
+                                                    name="preload", daemon=True)
+            self._preload_thread.start()
+
+
+def create_catalogue(path: str = MAP_CATALOGUE) -> MapCatalogue:
+    """create the catalogue of the main map and the maps in the catalogue file, if it exists
+
+    Args:
+        path (str, optional): path to the JSON file with the other maps. Defaults to MAP_CATALOGUE.
+
+    Returns:
+        MapCatalogue: the catalogue
+    """
+    entries = [MapEntry(get_map_name(MAP_PATH), MAP_PATH, ICONS, MAP_SIZE)]
+    if os.path.exists(path):
+        entries += load_map_entries(path)
+
+    return MapCatalogue(entries)
@@ -0,0 +1,260 @@
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+
+from constants import COMPOSITOR
+from .icons import Icon
+from .sprites import SCRATCH
+
+class Compositor(object):
+    """Backend that composites a part of an icon in place onto a region of the treasure map. All backends produce the
+    exact same pixels as the NumPy backend, which is the reference, so they only differ in speed. Use get_compositor to
+    obtain the backend that is fastest on this machine.
+    """
+    name = None
+
+    def draw(self, region: np.array, icon: Icon, top: int, bottom: int, left: int, right: int) -> None:
+        """composite a part of an icon in place onto a region of the treasure map with the same shape
+
+        Args:
+            region (np.array): view on the treasure map where the icon is drawn
+            icon (Icon): Icon object that holds the icon image
+            top (int): top bound on the icon
+            bottom (int): bottom bound on the icon
+            left (int): left bound on the icon
+            right (int): right bound on the icon
+        """
+        raise NotImplementedError
+
+
+class NumpyCompositor(Compositor):
+    """Reference backend: the compositing strategy of the icon in NumPy, see Icon.draw"""
+    name = "numpy"
+
+    def draw(self, region: np.array, icon: Icon, top: int, bottom: int, left: int, right: int) -> None:
+        icon.draw(region, top, bottom, left, right)
+
+
+class OpenCVCompositor(Compositor):
+    """Backend that composites with OpenCV: a masked copyTo for icons with a binary alpha channel, and a multiply, add
+    and scaled conversion for blended icons. The conversion rounds to the nearest integer, so an offset of just under
+    half a step turns it into the shift of the reference.
+    """
+    name = "opencv"
+
+    def __init__(self) -> None:
+        super().__init__()
+
+        # arrays of every sprite in the layout OpenCV needs, and views on them per part of the sprite
+        self._arrays: Dict[int, tuple] = {}
+        self._views: Dict[Tuple[int, int, int, int, int], tuple] = {}
+
+    def get_views(self, icon: Icon, top: int, bottom: int, left: int, right: int) -> tuple:
+        """get the (cached) views on the arrays of a part of the sprite of an icon
+
+        Args:
+            icon (Icon): Icon object that holds the icon image
+            top (int): top bound on the icon
+            bottom (int): bottom bound on the icon
+            left (int): left bound on the icon
+            right (int): right bound on the icon
+
+        Returns:
+            tuple: (image, mask) for the mask strategy, (premultiplied image, inverse weights) for blending
+        """
+        sprite = icon.sprite
+        key = (id(sprite), top, bottom, left, right)
+        views = self._views.get(key)
+        if views is None:
+            arrays = self._arrays.get(id(sprite))
+            if arrays is None:
+                if sprite.compositing == "mask":
+                    arrays = (sprite.image, sprite.mask.astype(np.uint8))
+                else:
+                    arrays = (sprite.premultiplied, np.repeat(sprite.inverse_weight, 3, axis=2))
+                self._arrays[id(sprite)] = arrays
+            views = self._views[key] = tuple(array[top:bottom, left:right] for array in arrays)
+        return views
+
+    def draw(self, region: np.array, icon: Icon, top: int, bottom: int, left: int, right: int) -> None:
+        if icon.compositing == "mask":
+            foreground, mask = self.get_views(icon, top, bottom, left, right)
+            cv2.copyTo(foreground, mask, region)
+        else:
+            premultiplied, inverse_weight = self.get_views(icon, top, bottom, left, right)
+            scratch = SCRATCH.get(region.shape)
+            cv2.multiply(region, inverse_weight, dst=scratch, dtype=cv2.CV_16U)
+            cv2.add(scratch, premultiplied, dst=scratch)
+            cv2.convertScaleAbs(scratch, region, 1 / 256, -127.5 / 256)
+
+
+COMPOSITORS = {compositor.name: compositor for compositor in (NumpyCompositor, OpenCVCompositor)}
+
+
+def get_test_positions(shape: Tuple[int, ...], icon: Icon, index: int) -> List[Tuple[int, int]]:
+    """positions of the top-left of an icon in the golden image: inside the map, and cut off by each of its edges
+
+    Args:
+        shape (Tuple[int, ...]): shape of the map
+        icon (Icon): the icon
+        index (int): index of the icon, which spreads the icons over the map
+
+    Returns:
+        List[Tuple[int, int]]: (x, y) positions
+    """
+    height, width = shape[:2]
+    icon_height, icon_width = icon.size
+    x = (37 * index) % max(1, width - icon_width)
+    y = (53 * index) % max(1, height - icon_height)
+
+    return [(x, y), (-icon_width // 3, y), (x, -icon_height // 2),
+            (width - icon_width // 2, y), (x, height - icon_height // 3)]
+
+
+def render_golden(compositor: Compositor, background: np.array, icons: Sequence[Icon]) -> np.array:
+    """draw every icon at its test positions on a copy of the background
+
+    Args:
+        compositor (Compositor): backend that draws the icons
+        background (np.array): RGB background
+        icons (Sequence[Icon]): icons to draw
+
+    Returns:
+        np.array: the image
+    """
+    image = np.array(background)
+    height, width = image.shape[:2]
+    for i, icon in enumerate(icons):
+        for x, y in get_test_positions(image.shape, icon, i):
+            left, top = max(0, x), max(0, y)
+            right, bottom = min(width, x + icon.size[1]), min(height, y + icon.size[0])
+            if left < right and top < bottom:
+                compositor.draw(image[top:bottom, left:right], icon, top - y, bottom - y, left - x, right - x)
+
+    return image
+
+
+def get_test_icons(icons: Sequence[Icon]) -> List[Icon]:
+    """icons of the golden image: the given icons and a variant of the first with the other compositing strategy, so
+    both strategies are verified whatever the icons of the map are
+
+    Args:
+        icons (Sequence[Icon]): icons of the map
+
+    Returns:
+        List[Icon]: the icons
+    """
+    icons = list(icons)
+    strategies = {icon.compositing for icon in icons}
+    if len(strategies) == 1:
+        icons.append(Icon("variant", icons[0].image_path, binarize_alpha="blend" in strategies, size=icons[0].size[0]))
+    return icons
+
+
+def verify_compositor(compositor: Compositor, background: np.array, icons: Sequence[Icon],
+                      golden: Optional[np.array] = None) -> bool:
+    """check that a backend renders the golden image pixel-identical to the NumPy reference
+
+    Args:
+        compositor (Compositor): backend to verify
+        background (np.array): RGB background
+        icons (Sequence[Icon]): icons to draw
+        golden (np.array, optional): golden image rendered by the reference. Defaults to None, which renders it.
+
+    Returns:
+        bool: True if the images are identical
+    """
+    if golden is None:
+        golden = render_golden(NumpyCompositor(), background, icons)
+    return np.array_equal(render_golden(compositor, background, icons), golden)
+
+
+def benchmark_compositor(compositor: Compositor,
+                         background: np.array,
+                         icons: Sequence[Icon],
+                         min_time: float = 0.002,
+                         repeats: int = 3) -> float:
+    """time drawing all icons once, the same way Map.render does
+
+    Args:
+        compositor (Compositor): backend to time
+        background (np.array): RGB background
+        icons (Sequence[Icon]): icons to draw
+        min_time (float, optional): minimal time in seconds of a batch of passes. Defaults to 0.002.
+        repeats (int, optional): number of batches. Defaults to 3.
+
+    Returns:
+        float: fastest time of a pass in seconds
+    """
+    image = np.array(background)
+    draws = []
+    for i, icon in enumerate(icons):
+        x, y = get_test_positions(image.shape, icon, i)[0]
+        height, width = icon.size
+        draws.append((image[y:y + height, x:x + width], icon, 0, min(height, image.shape[0] - y),
+                      0, min(width, image.shape[1] - x)))
+
+    def run(number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            for draw in draws:
+                compositor.draw(*draw)
+        return time.perf_counter() - start
+
+    number = 1
+    while (elapsed := run(number)) < min_time:
+        number *= 2
+    return min([elapsed] + [run(number) for _ in range(repeats - 1)]) / number
+
+
+def select_compositor(background: np.array, icons: Sequence[Icon], names: Optional[Sequence[str]] = None) -> Compositor:
+    """verify the backends against the golden image and pick the fastest one for a map and its icons
+
+    Args:
+        background (np.array): RGB background of the map
+        icons (Sequence[Icon]): icons of the map
+        names (Sequence[str], optional): names of the candidate backends. Defaults to None, which tries all.
+
+    Returns:
+        Compositor: the fastest backend that renders the golden image correctly, NumPy if none does
+    """
+    icons = get_test_icons(icons)
+    golden = render_golden(NumpyCompositor(), background, icons)
+
+    timings = {}
+    for name in names or COMPOSITORS:
+        compositor = COMPOSITORS[name]()
+        if verify_compositor(compositor, background, icons, golden):
+            timings[name] = (benchmark_compositor(compositor, background, icons), compositor)
+
+    if not timings:
+        return NumpyCompositor()
+    return min(timings.values(), key=lambda timing: timing[0])[1]
+
+
+# backend used by all maps of this process, selected once
+_compositor: Optional[Compositor] = None
+_lock = threading.Lock()
+
+
+def get_compositor(background: np.array, icons: Sequence[Icon]) -> Compositor:
+    """get the backend of this process: the one named by COMPOSITOR, or with "auto" the fastest one for the first map
+    that asks for it
+
+    Args:
+        background (np.array): RGB background of the map
+        icons (Sequence[Icon]): icons of the map
+
+    Returns:
+        Compositor: the backend
+    """
+    global _compositor
+    with _lock:
+        if _compositor is None:
+            if COMPOSITOR == "auto":
+                _compositor = select_compositor(background, icons)
+            else:
+                _compositor = COMPOSITORS[COMPOSITOR]()
+        return _compositor
@@ -0,0 +1,116 @@
+import struct
+import zlib
+from math import ceil
+from typing import Optional
+import numpy as np
+
+from constants import get_map_size
+from .generate_map import Map, RenderState
+from .viewport import ViewportRenderer
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class PNGStreamWriter(object):
+    """Writes an RGB PNG image in strips of rows, so the full image never has to be in memory
+
+    Args:
+        path (str): path of the PNG file
+        width (int): width of the image
+        height (int): height of the image
+        compression (int, optional): zlib compression level from 0 to 9. Defaults to 6.
+        dpi (float, optional): resolution stored in the file, used for printing. Defaults to None.
+    """
+    def __init__(self, path: str, width: int, height: int, compression: int = 6, dpi: Optional[float] = None) -> None:
+        super().__init__()
+
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+
+        self._file = open(path, "wb")
+        self._compressor = zlib.compressobj(compression)
+
+        self._file.write(PNG_SIGNATURE)
+        # 8 bit RGB, no interlacing
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+        if dpi is not None:
+            pixels_per_meter = round(dpi / 0.0254)
+            self._write_chunk(b"pHYs", struct.pack(">IIB", pixels_per_meter, pixels_per_meter, 1))
+
+    def __enter__(self) -> "PNGStreamWriter":
+        return self
+
+    def __exit__(self, exc_type, *args) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(chunk_type + data)))
+
+    def write_rows(self, rows: np.array) -> None:
+        """compress and write the next rows of the image
+
+        Args:
+            rows (np.array): RGB rows with shape (N, width, 3)
+        """
+        rows = rows.reshape(rows.shape[0], self.width * 3)
+
+        # every row starts with its filter type, the Sub filter stores the difference with the pixel to the left
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._write_chunk(b"IDAT", data)
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        """finish and close the file"""
+        if self.rows_written != self.height:
+            raise ValueError(f"{self.rows_written} rows were written to a PNG image of {self.height} rows")
+
+        self._write_chunk(b"IDAT", self._compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self._file.close()
+
+
+def export_full_resolution(treasure_map: Map,
+                           state: RenderState,
+                           path: str,
+                           scale: float = 1.,
+                           dpi: Optional[float] = None,
+                           strip_height: int = 512,
+                           compression: int = 6) -> None:
+    """Export the treasure map at the resolution of the source map (or any scale of it) as a PNG image. The map is
+    rendered in horizontal strips that are streamed to the file, so memory use is bounded by the size of a strip. The
+    first export of a map also builds the tile pyramid, which decodes the map image as a whole once, see TilePyramid
+
+    Args:
+        treasure_map (Map): Map object that determines which icons are drawn where
+        state (RenderState): position of the players on the map that Map renders and visibility of the icons, of
+            which the scale is replaced by the scale of the export
+        path (str): path of the PNG file
+        scale (float, optional): scale relative to the resolution of the source map. Defaults to 1.
+        dpi (float, optional): resolution stored in the file, used for printing. Defaults to None.
+        strip_height (int, optional): number of rows that are rendered at once. Defaults to 512.
+        compression (int, optional): zlib compression level from 0 to 9. Defaults to 6.
+    """
+    source_width, source_height = get_map_size(treasure_map.map_path, 1)
+    width = round(source_width * scale)
+    height = round(source_height * scale)
+
+    # every strip is a view of the full width of the map
+    renderer = ViewportRenderer(treasure_map, (width, strip_height))
+
+    with PNGStreamWriter(path, width, height, compression, dpi) as writer:
+        for strip in range(ceil(height / strip_height)):
+            top = strip * strip_height
+            rows = renderer.render((scale, 0., top / scale), state)
+            writer.write_rows(rows[:min(strip_height, height - top)])
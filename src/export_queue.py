@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+import cv2
+import numpy as np
+
+from .utils import reserve_filename
+
+# file extension and OpenCV parameter of the compression level or quality of every export format
+EXPORT_FORMATS = {"png": (".png", cv2.IMWRITE_PNG_COMPRESSION),
+                  "jpg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+                  "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY),
+                  "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY)}
+
+# range of the compression level or quality that the encoder of every export format accepts
+QUALITY_RANGES = {"png": (0, 9), "jpg": (0, 100), "jpeg": (0, 100), "webp": (1, 100)}
+
+
+def encode_image(image: np.array, format: str = "png", quality: Optional[int] = None) -> bytes:
+    """encode an RGB image in a file format
+
+    Args:
+        image (np.array): RGB image
+        format (str, optional): "png", "jpg" or "webp". Defaults to "png".
+        quality (int, optional): compression level from 0 to 9 for PNG, or quality from 0 to 100 for JPEG and WebP.
+            Defaults to None, which uses the default of the encoder.
+
+    Returns:
+        bytes: the encoded file
+    """
+    extension, parameter = EXPORT_FORMATS[format]
+    params = [] if quality is None else [parameter, int(quality)]
+
+    success, data = cv2.imencode(extension, cv2.cvtColor(image, cv2.COLOR_RGB2BGR), params)
+    if not success:
+        raise ValueError(f"could not encode the image as {format}")
+
+    return data.tobytes()
+
+
+class ExportQueue(object):
+    """Queue of exports that are encoded and written by a background thread, so exporting never blocks the GUI. Every
+    export gets a unique file name that is reserved when the export is written
+
+    Args:
+        name (str, optional): name of the writer thread. Defaults to "export".
+    """
+    def __init__(self, name: str = "export") -> None:
+        super().__init__()
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, write: Callable[[str], None]) -> Future:
+        """queue an export
+
+        Args:
+            path (str): path of the file, a suffix is added if it exists
+            write (Callable[[str], None]): function that writes the file to the reserved path
+
+        Returns:
+            Future: future with the path of the written file as result
+        """
+        future = Future()
+        self._queue.put((future, path, write))
+        return future
+
+    def submit_image(self,
+                     image: np.array,
+                     path: str,
+                     format: str = "png",
+                     quality: Optional[int] = None) -> Future:
+        """queue the export of an image
+
+        Args:
+            image (np.array): RGB image, which should not be changed afterwards
+            path (str): path of the file without extension, a suffix is added if it exists
+            format (str, optional): "png", "jpg" or "webp". Defaults to "png".
+            quality (int, optional): compression level or quality, see encode_image. Defaults to None.
+
+        Returns:
+            Future: future with the path of the written file as result
+        """
+        if format not in EXPORT_FORMATS:
+            raise ValueError(f"unknown export format '{format}', use one of {', '.join(EXPORT_FORMATS)}")
+
+        def write(reserved_path: str) -> None:
+            data = encode_image(image, format, quality)
+            with open(reserved_path, "wb") as f:
+                f.write(data)
+
+        return self.submit(path + EXPORT_FORMATS[format][0], write)
+
+    def join(self) -> None:
+        """wait until all queued exports are written"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            future, path, write = self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    reserved_path = None
+                    try:
+                        reserved_path = reserve_filename(path)
+                        write(reserved_path)
+                    except Exception as e:
+                        # the reserved file is empty or truncated, so it is removed
+                        if reserved_path is not None and os.path.exists(reserved_path):
+                            os.remove(reserved_path)
+                        future.set_exception(e)
+                    else:
+                        future.set_result(reserved_path)
+            finally:
+                self._queue.task_done()
@@ -0,0 +1,246 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+
+from .generate_map import FrameBuffer, Map, RenderState
+from .position import Position
+
+class FrameCache(object):
+    """Memory bounded least-recently-used cache of rendered frames in front of Map.render.
+
+    Frames are keyed by the position of the players quantized to a grid of `grid` pixels and the rest of the render
+    state: the visibility of the true positions of the icons, whether the player icon is shown and the scale. A frame is
+    rendered for the quantized position, so all positions in a cell of the grid show the same frame. Least recently
+    used frames are evicted when the frames would take more than max_bytes.
+
+    Copying a frame into the cache costs as much as rendering the whole map, so only frames that are likely to be shown
+    again are cached: prewarmed frames, and frames of positions that were rendered before. The keys of the positions
+    that were rendered once are remembered, up to max_candidates of them. A cached frame remembers which icons it shows
+    where, so a hit only copies the regions in which it differs from the frame in the output buffer, and the buffer
+    stays incremental.
+
+    When frames are rendered into output buffers, the cached frames are never handed out, so evicted frames are reused
+    for new frames and a full cache allocates nothing.
+
+    Args:
+        treasure_map (Map): Map object that renders the frames
+        max_bytes (int): maximum total size of the cached frames in bytes
+        grid (int, optional): size in pixels of the cells that positions are quantized to. Defaults to 1.
+        max_candidates (int, optional): number of keys of frames that were rendered once that are remembered. Defaults
+            to 4096.
+    """
+    def __init__(self, treasure_map: Map, max_bytes: int, grid: int = 1, max_candidates: int = 4096) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.max_bytes = max_bytes
+        self.grid = grid
+        self.max_candidates = max_candidates
+
+        self._frames: "OrderedDict[Hashable, FrameBuffer]" = OrderedDict()
+        self._candidates: "OrderedDict[Hashable, None]" = OrderedDict()
+        self._background = treasure_map.background
+        self.bytes = 0
+
+        # buffer that frames are rendered into when there is no output buffer
+        self._buffer = FrameBuffer()
+
+        # whether cached frames have been returned, in which case evicted frames may still be in use
+        self._handed_out = False
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prewarmed = 0
+        self.stored = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._frames
+
+    def quantize(self, player_position: Position) -> Position:
+        """snap a position of the players to the center of its cell of the grid
+
+        Args:
+            player_position (Position): position of the players
+
+        Returns:
+            Position: position that the frame of the cell is rendered for
+        """
+        if self.grid == 1:
+            return player_position
+        return Position(player_position.x // self.grid * self.grid + self.grid // 2,
+                        player_position.y // self.grid * self.grid + self.grid // 2,
+                        mode="absolute")
+
+    def get_key(self, state: RenderState) -> Hashable:
+        """get the key of the frame of a render state
+
+        Args:
+            state (RenderState): position of the players and visibility of the icons
+
+        Returns:
+            Hashable: key of the frame
+        """
+        player_position = state.player_position
+        return (player_position.x // self.grid, player_position.y // self.grid, state.visibility,
+                state.show_player_icon, state.scale)
+
+    def clear(self) -> None:
+        """remove all frames from the cache"""
+        self._frames.clear()
+        self._candidates.clear()
+        self.bytes = 0
+
+    def _admit(self, key: Hashable) -> bool:
+        # a frame is cached the second time it is rendered, the first time only its key is remembered
+        if key in self._candidates:
+            del self._candidates[key]
+            return True
+
+        self._candidates[key] = None
+        if len(self._candidates) > self.max_candidates:
+            self._candidates.popitem(last=False)
+        return False
+
+    def _store(self, key: Hashable, buffer: FrameBuffer) -> Optional[FrameBuffer]:
+        # a frame that does not fit at all is not cached
+        frame = buffer.image
+        if frame.nbytes > self.max_bytes:
+            return None
+
+        spare = None
+        while self.bytes + frame.nbytes > self.max_bytes:
+            _, evicted = self._frames.popitem(last=False)
+            self.bytes -= evicted.image.nbytes
+            self.evictions += 1
+            if not self._handed_out and evicted.image.shape == frame.shape and evicted.image.dtype == frame.dtype:
+                spare = evicted
+
+        if spare is None:
+            stored = FrameBuffer()
+        else:
+            stored = spare
+            stored.image.flags.writeable = True
+        stored.copy_from(buffer)
+        stored.image.flags.writeable = False
+
+        self._frames[key] = stored
+        self.bytes += frame.nbytes
+        self.stored += 1
+        return stored
+
+    def _check_background(self) -> None:
+        # frames of another background are never shown again
+        if self.treasure_map.background is not self._background:
+            self._background = self.treasure_map.background
+            self.clear()
+
+    def _render(self, state: RenderState, out: Optional[FrameBuffer]) -> FrameBuffer:
+        buffer = self._buffer if out is None else out
+        self.treasure_map.render(state.replace(player_position=self.quantize(state.player_position)),
+                                 incremental=True, out=buffer)
+        return buffer
+
+    def render(self, state: RenderState, out: Optional[FrameBuffer] = None) -> np.array:
+        """get the frame of a render state from the cache, or render it and cache it if it was rendered before
+
+        Args:
+            state (RenderState): position of the players and visibility of the icons
+            out (FrameBuffer, optional): buffer that the frame is copied or rendered into. Defaults to None, which
+                returns the cached frame itself.
+
+        Returns:
+            np.array: read-only image of the treasure map, which is the cached frame itself if it is cached, or the
+                image of the buffer
+        """
+        self._check_background()
+        key = self.get_key(state)
+
+        cached = self._frames.get(key)
+        if cached is not None:
+            self._frames.move_to_end(key)
+            self.hits += 1
+            if out is None:
+                self._handed_out = True
+                return cached.image
+
+            out.copy_from(cached)
+            return out.image
+
+        self.misses += 1
+        buffer = self._render(state, out)
+        stored = self._store(key, buffer) if self._admit(key) else None
+        if out is not None:
+            return out.image
+
+        # the buffer of the cache is rewritten by the next render, so a frame that is not cached is copied
+        self._handed_out = True
+        if stored is not None:
+            return stored.image
+        frame = buffer.image.copy()
+        frame.flags.writeable = False
+        return frame
+
+    def prewarm(self, state: RenderState) -> bool:
+        """render and cache the frame of a render state that is likely to be requested soon, if it is not cached yet.
+        Prewarmed frames do not count as hits or misses
+
+        Args:
+            state (RenderState): position of the players and visibility of the icons
+
+        Returns:
+            bool: True if a frame was rendered
+        """
+        self._check_background()
+        key = self.get_key(state)
+        if key in self._frames:
+            return False
+
+        self._store(key, self._render(state, None))
+        self.prewarmed += 1
+        return True
+
+    def predict_positions(self, previous: Position, current: Position, count: int) -> List[Position]:
+        """extrapolate the positions of the players along the direction of a drag
+
+        Args:
+            previous (Position): previous position of the players
+            current (Position): current position of the players
+            count (int): number of positions
+
+        Returns:
+            List[Position]: the next positions at the same speed that are on the map, nearest first
+        """
+        step = current - previous
+        if abs(step.x) < self.grid and abs(step.y) < self.grid:
+            return []
+
+        positions = []
+        for i in range(1, count + 1):
+            position = Position(current.x + i * step.x, current.y + i * step.y, mode="absolute")
+            if not position.is_in_bbox(0, self.treasure_map.width, 0, self.treasure_map.height):
+                break
+            positions.append(position)
+
+        return positions
+
+    def get_stats(self) -> Dict[str, float]:
+        """get the statistics of the cache
+
+        Returns:
+            Dict[str, float]: number of cached frames, their size in bytes, hits, misses, hit rate, evictions,
+                prewarmed frames and frames that were copied into the cache
+        """
+        requests = self.hits + self.misses
+        return {"frames": len(self._frames),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.,
+                "evictions": self.evictions,
+                "prewarmed": self.prewarmed,
+                "stored": self.stored}
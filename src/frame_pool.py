@@ -0,0 +1,54 @@
+import threading
+from typing import List, Optional
+
+from .generate_map import FrameBuffer
+
+class FramePool(object):
+    """Small pool of frame buffers that are rendered into in turn, for double or triple buffering without allocating a
+    frame per render. A buffer is acquired by the renderer and released by the consumer when it no longer reads it, so
+    a buffer that is shown is never rewritten. acquire blocks while all buffers are in use, which also keeps the
+    renderer from running ahead of the consumer.
+
+    Args:
+        count (int, optional): number of buffers, 2 for double and 3 for triple buffering. Defaults to 3.
+    """
+    def __init__(self, count: int = 3) -> None:
+        super().__init__()
+
+        self.buffers = [FrameBuffer() for _ in range(count)]
+
+        # buffers that are not in use, the most recently released last, which holds the most recent frame
+        self._free: List[FrameBuffer] = list(self.buffers)
+        self._condition = threading.Condition()
+        self._closed = False
+
+    def acquire(self, timeout: Optional[float] = None) -> Optional[FrameBuffer]:
+        """take a buffer to render into, waiting until one is released if all are in use
+
+        Args:
+            timeout (float, optional): maximum time to wait in seconds. Defaults to None, which waits until a buffer is
+                released or the pool is closed.
+
+        Returns:
+            Optional[FrameBuffer]: the buffer, or None if the pool was closed or the timeout expired
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._free or self._closed, timeout) or self._closed:
+                return None
+            return self._free.pop()
+
+    def release(self, buffer: FrameBuffer) -> None:
+        """return a buffer that is no longer read
+
+        Args:
+            buffer (FrameBuffer): buffer taken with acquire
+        """
+        with self._condition:
+            self._free.append(buffer)
+            self._condition.notify()
+
+    def close(self) -> None:
+        """wake up and fail all waiting and future acquires, e.g. when the renderer stops"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
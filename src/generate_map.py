@@ -1,84 +1,437 @@
-from typing import Tuple
+from typing import Iterable, List, Optional, Tuple
 import cv2
 import numpy as np
 
-from constants import MAP_SIZE, MAP_WIDTH, MAP_HEIGHT
+from constants import MAP_SIZE, SUBPIXEL_PHASES
+from .cache import load_cached_array
+from .compositing import Compositor, get_compositor
 from .position import Position
+from .profiling import PROFILER
 from .icons import PlayerPositionDependentIcon, Icon
+from .trajectory import TrajectoryTable
+
+BBox = Tuple[int, int, int, int]
+
+# above this number of dirty regions a single region around all of them is redrawn instead
+MAX_DIRTY_REGIONS = 16
+
+class RenderState(object):
+    """Immutable snapshot of everything that a render depends on besides the map itself. Map.render only reads the
+    state it is given, so renders of different states can run at the same time, e.g. in a thread pool
+
+    Args:
+        player_position (Position): position of the players
+        show_player_icon (bool, optional): specifies whether to show the player icon. Defaults to True.
+        visibility (Iterable[bool], optional): visibility of the true position of each position dependent icon of the 
+            map, icons beyond its length are hidden. Defaults to (), which hides all true positions.
+        scale (float, optional): scale of the rendered image relative to the map. Defaults to 1.
+    """
+    __slots__ = ("player_position", "show_player_icon", "visibility", "scale")
+
+    def __init__(self, 
+                 player_position: Position, 
+                 show_player_icon: bool = True, 
+                 visibility: Iterable[bool] = (), 
+                 scale: float = 1.) -> None:
+        object.__setattr__(self, "player_position", player_position)
+        object.__setattr__(self, "show_player_icon", bool(show_player_icon))
+        object.__setattr__(self, "visibility", tuple(bool(visible) for visible in visibility))
+        object.__setattr__(self, "scale", scale)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("RenderState objects are immutable")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, RenderState):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (f"RenderState({self.player_position!r}, show_player_icon={self.show_player_icon}, "
+                f"visibility={self.visibility}, scale={self.scale})")
+
+    def _key(self) -> tuple:
+        return self.player_position, self.show_player_icon, self.visibility, self.scale
+
+    def replace(self, **changes) -> "RenderState":
+        """get a copy of the state with some of its fields changed
+
+        Args:
+            **changes: new values of the fields, by name
+
+        Returns:
+            RenderState: the new state
+        """
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return RenderState(**fields)
+
+
+class FrameBuffer(object):
+    """Image that Map.render draws into, together with what was drawn in it, so the next render into the same buffer
+    only has to redraw the regions of the icons that moved since the buffer was drawn. Every buffer keeps its own state,
+    so rendering into several buffers in turn (double or triple buffering) stays incremental.
+
+    Args:
+        shape (Tuple[int, ...], optional): shape of the image. Defaults to None, which allocates the image on the first
+            render.
+        dtype (optional): dtype of the image. Defaults to np.uint8.
+    """
+    def __init__(self, shape: Optional[Tuple[int, ...]] = None, dtype=np.uint8) -> None:
+        super().__init__()
+
+        self.image = None if shape is None else np.empty(shape, dtype=dtype)
+
+        # what the image holds: the background and the icons with their positions and bounding boxes, None if unknown
+        self.background = None
+        self.icons = ()
+        self.positions = []
+        self.boxes = []
+
+    def invalidate(self) -> None:
+        """Mark the image as unknown, e.g. after something else was drawn in it, so the next render redraws it fully
+        """
+        self.background = None
+
+    def reserve(self, shape: Tuple[int, ...], dtype) -> None:
+        """Make sure the image has a shape and dtype, reallocating it only if it differs
+
+        Args:
+            shape (Tuple[int, ...]): shape of the image
+            dtype: dtype of the image
+        """
+        if self.image is None or self.image.shape != shape or self.image.dtype != dtype:
+            self.image = np.empty(shape, dtype=dtype)
+            self.invalidate()
+
+    def copy_from(self, other: "FrameBuffer") -> None:
+        """make the image equal to that of another buffer. When both hold frames of the same icons on the same
+        background, only the regions of the icons that differ between the frames are copied, and the next incremental
+        render into this buffer stays incremental
+
+        Args:
+            other (FrameBuffer): buffer of which the image and what was drawn in it are copied
+        """
+        self.reserve(other.image.shape, other.image.dtype)
+        if self.background is not None and self.background is other.background and self.icons == other.icons:
+            regions = get_dirty_regions(self.boxes, other.boxes, self.positions, other.positions)
+        else:
+            regions = [(0, 0, other.image.shape[1], other.image.shape[0])]
+
+        for left, top, right, bottom in regions:
+            self.image[top:bottom, left:right] = other.image[top:bottom, left:right]
+
+        self.background = other.background
+        self.icons = other.icons
+        self.positions = list(other.positions)
+        self.boxes = list(other.boxes)
+
 
 class Map(object):
     """Map object with all functionality to render a treasure map based on the state of the GUI
+
+    Everything that changes between renders is passed in a RenderState, so a Map can render many states at the same
+    time from several threads. Only incremental renders without an output buffer share a frame, that of the map.
     
     Args:
         map_path (str): path to the default treasure map image
         player_position_dependent_icons (Tuple[PlayerPositionDependentIcon]): tuple of Icon objects that belong to hidden locations
+        background (np.array, optional): already decoded RGB background of size MAP_SIZE, used instead of reading 
+            map_path. Defaults to None.
+        size (Tuple[int, int], optional): (width, height) of the rendered map. Defaults to None, which is MAP_SIZE.
+        compositor (Compositor, optional): backend that draws the icons. Defaults to None, which uses the backend of
+            this process, see get_compositor.
     """
     def __init__(self, 
                  map_path: str,
-                 player_position_dependent_icons: Tuple[PlayerPositionDependentIcon]) -> None:
+                 player_position_dependent_icons: Tuple[PlayerPositionDependentIcon],
+                 background: Optional[np.array] = None,
+                 size: Optional[Tuple[int, int]] = None,
+                 compositor: Optional[Compositor] = None) -> None:
         super().__init__()
 
-        self.background = cv2.cvtColor(cv2.resize(cv2.imread(map_path), MAP_SIZE, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2BGR)
+        self.map_path = map_path
+        if background is None:
+            size = MAP_SIZE if size is None else tuple(size)
+            background = load_cached_array(map_path, ("background", size), lambda: 
+                cv2.cvtColor(cv2.resize(cv2.imread(map_path), size, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2BGR))
+        self.background = background
+        self.height, self.width = background.shape[:2]
         self.player_position_dependent_icons = player_position_dependent_icons
+        self.trajectories = TrajectoryTable(player_position_dependent_icons)
         self.player_icon = Icon("player", img_path="images/icons/aluminium.png")
 
-    def draw_icon_on_map(self, treasure_map: np.array, icon: Icon, position: Position):
-        """Draw an icon on the treasure map using a back-to-front compositing technique
+        if compositor is None:
+            compositor = get_compositor(background, self.get_icons())
+        self.compositor = compositor
+
+        # buffer of incremental renders without an output buffer
+        self._buffer = FrameBuffer()
+
+    def invalidate(self) -> None:
+        """Discard the frame kept by incremental rendering, so the next render redraws the full map
+        """
+        self._buffer.invalidate()
+
+    @property
+    def default_visibility(self) -> Tuple[bool, ...]:
+        """Tuple[bool, ...]: visibility of the true positions that the position dependent icons were created with"""
+        return tuple(icon.show_true_position for icon in self.player_position_dependent_icons)
+
+    def get_icons(self) -> List[Icon]:
+        """List all icons that can be drawn on the map
+
+        Returns:
+            List[Icon]: the icons of the hidden locations, their true position icons and the player icon
+        """
+        icons = list(self.player_position_dependent_icons)
+        icons += [icon.true_position_icon for icon in self.player_position_dependent_icons]
+        icons.append(self.player_icon)
+
+        return icons
+
+    def icon_bbox(self, icon: Icon, position: Position) -> Optional[BBox]:
+        """Calculate the bounding box of the part of an icon that is on the map
+
+        Args:
+            icon (Icon): Icon object that holds the icon image
+            position (Position): position on the treasure map of the top-left of the icon
+
+        Returns:
+            Optional[BBox]: (left, top, right, bottom) on the map, or None if the icon is not on the map
+        """
+        icon, position = icon.snap(position)
+        left   = max(0, position.x)
+        right  = min(self.width, position.x + icon.size[1])
+        top    = max(0, position.y)
+        bottom = min(self.height, position.y + icon.size[0])
+
+        if left >= right or top >= bottom:
+            return None
+
+        return left, top, right, bottom
+
+    def draw_icon_on_map(self, treasure_map: np.array, icon: Icon, position: Position, clip: Optional[BBox] = None):
+        """Draw an icon on the treasure map using a back-to-front compositing technique. The blending itself is done in
+        place by the compositing backend of the map, using the compositing strategy of the icon. At a sub-pixel position
+        the precomputed variant of the icon for that position is drawn
 
         Args:
             treasure_map (np.array): current image of the treasure map
             icon (Icon): Icon object that holds the icon image.
             position (Position): position on the treasure map of the top-left of the icon
+            clip (BBox, optional): (left, top, right, bottom) region of the map outside of which nothing is drawn.
+                Defaults to None, which draws on the whole map.
         """
-        # check if the icon is on the map, 
-        if not position.is_in_bbox(-icon.size[1], MAP_WIDTH, -icon.size[0], MAP_HEIGHT):
+        icon, position = icon.snap(position)
+
+        # boundaries on the map of the parts of the icon that are on the map
+        left   = max(0, position.x)
+        right  = min(treasure_map.shape[1], position.x + icon.size[1])
+        top    = max(0, position.y)
+        bottom = min(treasure_map.shape[0], position.y + icon.size[0])
+
+        if clip is not None:
+            left   = max(left, clip[0])
+            top    = max(top, clip[1])
+            right  = min(right, clip[2])
+            bottom = min(bottom, clip[3])
+
+        # check if the icon is on the (clipped) map
+        if left >= right or top >= bottom:
             return
 
         # boundaries on the icon of the parts of the icon that are on the map
-        icon_left   = max(-1 * position.x, 0)
-        icon_right  = min(icon.size[1], MAP_WIDTH - position.x)
-        icon_top    = max(-1 * position.y, 0)
-        icon_bottom = min(icon.size[0], MAP_HEIGHT - position.y)
+        icon_left   = left - position.x
+        icon_right  = right - position.x
+        icon_top    = top - position.y
+        icon_bottom = bottom - position.y
 
-        alpha      = icon.alpha[icon_top:icon_bottom, icon_left:icon_right]
-        foreground = icon.image[icon_top:icon_bottom, icon_left:icon_right]
+        self.compositor.draw(treasure_map[top:bottom, left:right], icon, icon_top, icon_bottom, icon_left, icon_right)
 
-        # boundaries on the map of the parts of the icon that are on the map
-        left   = max(0, position.x)
-        right  = min(MAP_WIDTH, position.x + icon.size[1])
-        top    = max(0, position.y)
-        bottom = min(MAP_HEIGHT, position.y + icon.size[0])
+    def get_draw_list(self, state: RenderState) -> List[Tuple[Icon, Position]]:
+        """List all icons that should be drawn in a state, together with the position of their top-left corner. The
+        order specifies which icons are drawn on top of others.
+
+        Args:
+            state (RenderState): position of the players and visibility of the icons
+
+        Returns:
+            List[Tuple[Icon, Position]]: icons and their positions on the map, from back to front. Position dependent
+                icons are positioned on the grid of 1 / SUBPIXEL_PHASES of a pixel, see Icon.snap
+        """
+        draw_list = []
+
+        # true position icons of hidden locations
+        for icon, visible in zip(self.player_position_dependent_icons, state.visibility):
+            if visible:
+                draw_list.append((icon.true_position_icon, icon.true_position))
+
+        # position dependent icons, of which the positions are evaluated in a single pass
+        player_position = state.player_position
+        positions = self.trajectories.positions_on_map((player_position.x, player_position.y), SUBPIXEL_PHASES).tolist()
+        for icon, (u, v) in zip(self.trajectories.icons, positions):
+            draw_list.append((icon, Position(u, v, mode="absolute")))
+
+        # player icon
+        if state.show_player_icon:
+            draw_list.append((self.player_icon, self.player_icon.position_on_map(player_position)))
+
+        return draw_list
+
+    def render(self, 
+               state: RenderState, 
+               incremental: bool = False, 
+               out: Optional[FrameBuffer] = None) -> np.array:
+        """Generate an image of the treasure map in a state. Renders only read the map and the state, so they can run
+        concurrently as long as they draw into different images.
 
-        treasure_map[top:bottom, left:right] = (1 - alpha) * treasure_map[top:bottom, left:right] + alpha * foreground
+        In incremental mode the previous frame is kept and only the regions covered by icons that moved since the
+        previous incremental render are restored and redrawn. The full map is redrawn when the set of visible icons or
+        the background changes. The returned image is reused by the next incremental render, so copy it if it has to
+        be kept.
 
-    def render(self, player_position: Position, show_player_icon: bool) -> np.array:
-        """Generate an image of the treasure map based on the current position of the players.
-        The order specifies which icons are drawn on top of others.
+        With an output buffer the image is drawn into the buffer instead of a new array, and an incremental render only
+        redraws what moved since the previous render into that same buffer.
+
+        A state with a scale other than 1 is rendered fully at the size of the map and then resized, into the buffer if
+        one is given.
 
         Args:
-            player_position (Position): current position of the players
-            show_player_icon (bool): specifies whether to show the player icon
+            state (RenderState): position of the players, visibility of the icons and scale of the image
+            incremental (bool, optional): specifies whether to update the previous frame. Defaults to False.
+            out (FrameBuffer, optional): buffer that the image is drawn into. Defaults to None, which uses a new array,
+                or the buffer of the map in incremental mode.
 
         Returns:
             np.array: image of the treasure map
         """
+        if state.scale != 1:
+            return self.render_scaled(state, out)
+
+        with PROFILER.stage("positioning"):
+            draw_list = self.get_draw_list(state)
+
+        if not incremental and out is None:
+            # create a new image with only the background and add the necessary icons
+            with PROFILER.stage("background"):
+                treasure_map = self.background.copy()
+            with PROFILER.stage("compositing"):
+                for icon, position in draw_list:
+                    self.draw_icon_on_map(treasure_map, icon, position)
+            return treasure_map
+
+        if out is None:
+            out = self._buffer
+
+        with PROFILER.stage("dirty_regions"):
+            icons = tuple(id(icon) for icon, _ in draw_list)
+            positions = [position for _, position in draw_list]
+            boxes = [self.icon_bbox(icon, position) for icon, position in draw_list]
+
+            out.reserve(self.background.shape, self.background.dtype)
+            if not incremental or out.background is not self.background or out.icons != icons:
+                dirty = [(0, 0, self.width, self.height)]
+            else:
+                dirty = get_dirty_regions(out.boxes, boxes, out.positions, positions)
+
+            out.background = self.background
+            out.icons = icons
+            out.positions = positions
+            out.boxes = boxes
+            box_array = np.array([box or (0, 0, 0, 0) for box in boxes], dtype=np.int64).reshape(-1, 4)
+
+        # restore the background of every dirty region and redraw all icons that overlap it
+        frame = out.image
+        with PROFILER.stage("background"):
+            for left, top, right, bottom in dirty:
+                frame[top:bottom, left:right] = self.background[top:bottom, left:right]
+
+        with PROFILER.stage("compositing"):
+            for clip in dirty:
+                left, top, right, bottom = clip
+                overlapping = np.flatnonzero((box_array[:, 0] < right) & (box_array[:, 2] > left) & 
+                                             (box_array[:, 1] < bottom) & (box_array[:, 3] > top))
+                for i in overlapping.tolist():
+                    icon, position = draw_list[i]
+                    self.draw_icon_on_map(frame, icon, position, clip)
+
+        return frame
+
+    def render_scaled(self, state: RenderState, out: Optional[FrameBuffer] = None) -> np.array:
+        """Render a state at the size of the map and resize the image to the scale of the state
+
+        Args:
+            state (RenderState): position of the players, visibility of the icons and scale of the image
+            out (FrameBuffer, optional): buffer that the resized image is written into. Defaults to None, which uses a
+                new array.
+
+        Returns:
+            np.array: resized image of the treasure map
+        """
+        frame = self.render(state.replace(scale=1.))
+        size = (max(1, round(self.width * state.scale)), max(1, round(self.height * state.scale)))
+        interpolation = cv2.INTER_AREA if state.scale < 1 else cv2.INTER_LINEAR
+
+        dst = None
+        if out is not None:
+            # the buffer no longer holds a frame at the size of the map, so the next incremental render redraws it
+            out.reserve((size[1], size[0], frame.shape[2]), frame.dtype)
+            out.invalidate()
+            dst = out.image
+        with PROFILER.stage("resize"):
+            return cv2.resize(frame, size, dst=dst, interpolation=interpolation)
+
+
+def get_dirty_regions(old_boxes: List[Optional[BBox]], 
+                      new_boxes: List[Optional[BBox]],
+                      old_positions: Optional[List[Position]] = None,
+                      new_positions: Optional[List[Position]] = None) -> List[BBox]:
+    """Determine the regions of the map that have to be redrawn when icons move from their old to their new bounding boxes
+
+    Args:
+        old_boxes (List[Optional[BBox]]): bounding boxes of the icons in the previous frame
+        new_boxes (List[Optional[BBox]]): bounding boxes of the same icons in the new frame
+        old_positions (List[Position], optional): positions of the icons in the previous frame. Defaults to None.
+        new_positions (List[Position], optional): positions of the icons in the new frame, of which icons that moved
+            by a fraction of a pixel within the same bounding box are redrawn as well. Defaults to None.
+
+    Returns:
+        List[BBox]: non-overlapping list of (left, top, right, bottom) regions that have to be redrawn
+    """
+    if old_positions is None or new_positions is None:
+        old_positions = new_positions = [None] * len(new_boxes)
+
+    regions = []
+    for old, new, old_position, new_position in zip(old_boxes, new_boxes, old_positions, new_positions):
+        if old == new:
+            if old is not None and old_position != new_position:
+                regions.append(old)
+            continue
+        if old is None or new is None:
+            regions.append(old or new)
+        else:
+            regions.append((min(old[0], new[0]), min(old[1], new[1]), max(old[2], new[2]), max(old[3], new[3])))
+
+    # with many moving icons, merging would cost more than redrawing a single region around all of them
+    if len(regions) > MAX_DIRTY_REGIONS:
+        return [(min(region[0] for region in regions), min(region[1] for region in regions),
+                 max(region[2] for region in regions), max(region[3] for region in regions))]
+
+    # merge overlapping regions so no pixel is redrawn twice
+    merged = []
+    while regions:
+        region = regions.pop()
+        for i, other in enumerate(merged):
+            if region[0] < other[2] and other[0] < region[2] and region[1] < other[3] and other[1] < region[3]:
+                del merged[i]
+                regions.append((min(region[0], other[0]), min(region[1], other[1]),
+                                max(region[2], other[2]), max(region[3], other[3])))
+                break
+        else:
+            merged.append(region)
 
-        # create a new image with only the background and add the necessary icons
-        treasure_map = self.background.copy()
-        
-        # draw true position icons of hidden locations
-        for icon in self.player_position_dependent_icons:
-            if icon.show_true_position:
-                self.draw_icon_on_map(treasure_map, icon.true_position_icon, icon.true_position)   
-        
-        # draw position dependent icons
-        for icon in self.player_position_dependent_icons:
-            icon_position = icon.position_on_map(player_position)
-            self.draw_icon_on_map(treasure_map, icon, icon_position)
-            
-        # draw player icon
-        if show_player_icon:
-            icon_position = self.player_icon.position_on_map(player_position)
-            self.draw_icon_on_map(treasure_map, self.player_icon, icon_position)
-
-        return treasure_map
+    return merged
@@ -1,9 +1,12 @@
 from ctypes.wintypes import PBOOLEAN
-import cv2
-from math import sin, cos
+from typing import Dict, Optional, Tuple
+import numpy as np
+from math import sin, cos, floor
 
-from constants import MAP_WIDTH, MAP_HEIGHT
+from constants import MAP_WIDTH, MAP_HEIGHT, SUBPIXEL_PHASES
 from .position import Position
+from .sprites import SCRATCH, SPRITES
+from .trajectory import Trajectory
 
 TREASURE_POSITION = Position(0.6558, 0.5755)
 
@@ -15,26 +18,116 @@ class Icon(object):
           img_path (str): path to the image
           img_offset (Position): offset used to center the icon on a given position
           use_negative_image (bool): specifies whether to use a negative image for the icon
+          binarize_alpha (bool): specifies whether partially transparent pixels are made fully transparent. Defaults to
+               None, which only binarizes when runes are drawn on whole pixels (SUBPIXEL_PHASES is 1)
+          size (int): width and height of the icon in pixels. Defaults to None, which scales the icon with the map
+          phases (int): number of positions per pixel in each direction at which the icon can be drawn. A variant of 
+               the icon is precomputed for every sub-pixel position. Defaults to 1, which only draws on whole pixels
+          shift (Tuple[float, float]): (x, y) fraction of a pixel by which the image is shifted, used for the variants
      """
      def __init__(self, 
                  name: str,
                  img_path: str = "images/icons/brass.png",
                  img_offset: Position = Position(-0.02, -0.02),
-                 use_negative_image: bool = False) -> None:
+                 use_negative_image: bool = False,
+                 binarize_alpha: Optional[bool] = None,
+                 size: Optional[int] = None,
+                 phases: int = 1,
+                 shift: Tuple[float, float] = (0., 0.)) -> None:
           super().__init__()
 
           self.name = name
           self.image_path = img_path
           self.img_offset = img_offset
+          self.use_negative_image = use_negative_image
+          if binarize_alpha is None:
+               binarize_alpha = SUBPIXEL_PHASES == 1
+          self.binarize_alpha = binarize_alpha
 
-          img = cv2.resize(cv2.imread(img_path, cv2.IMREAD_UNCHANGED), (int(0.04 * MAP_HEIGHT), int(0.04 * MAP_HEIGHT)), interpolation=cv2.INTER_AREA)
-          self.alpha = img[:, :, 3:4] // 255
-          self.image = img[:, :, 0:3]
+          if size is None:
+               size = int(0.04 * MAP_HEIGHT)
+
+          # the image is decoded once and shared by all icons that use it
+          self.sprite = SPRITES.get(img_path, (size, size), use_negative_image, binarize_alpha, shift)
+          self.image = self.sprite.image
+          self.alpha = self.sprite.alpha
+          self.size = self.image.shape[0:2]
+          self.compositing = self.sprite.compositing
+          if self.compositing == "mask":
+               self._mask = self.sprite.mask
+          else:
+               self._inverse_weight = self.sprite.inverse_weight
+               self._premultiplied = self.sprite.premultiplied
+
+          self._views: Dict[Tuple[int, int, int, int], tuple] = {}
+
+          # variants[y][x] is shifted by (x / phases, y / phases) of a pixel, the unshifted variant is the icon itself
+          self.phases = phases
+          self.variants = [[self if x == y == 0 else 
+                            Icon(name, img_path, img_offset, use_negative_image, binarize_alpha, size, 
+                                 shift=(x / phases, y / phases)) 
+                            for x in range(phases)] for y in range(phases)]
+
+     def snap(self, position: Position) -> Tuple["Icon", Position]:
+          """get the variant of the icon and the whole pixel position that draw the icon at a sub-pixel position
+
+          Args:
+              position (Position): position of the top-left of the icon, on the grid of 1 / phases of a pixel
+
+          Returns:
+              Tuple[Icon, Position]: the variant and the position of its top-left
+          """
+          if self.phases == 1:
+               return self, position
+
+          x, phase_x = divmod(round(position.x * self.phases), self.phases)
+          y, phase_y = divmod(round(position.y * self.phases), self.phases)
+          return self.variants[phase_y][phase_x], Position(x, y, mode="absolute")
+
+     def get_views(self, top: int, bottom: int, left: int, right: int) -> tuple:
+          """get the (cached) views on the compositing arrays of a part of the icon
+
+          Args:
+              top (int): top bound on the icon
+              bottom (int): bottom bound on the icon
+              left (int): left bound on the icon
+              right (int): right bound on the icon
+
+          Returns:
+              tuple: views used by the compositing strategy of the icon
+          """
+          key = (top, bottom, left, right)
+          views = self._views.get(key)
+          if views is None:
+               if self.compositing == "mask":
+                    views = (self.image[top:bottom, left:right], self._mask[top:bottom, left:right])
+               else:
+                    views = (self._premultiplied[top:bottom, left:right], 
+                             self._inverse_weight[top:bottom, left:right])
+               self._views[key] = views
           
-          if use_negative_image:
-               self.image = (255 - self.image)
+          return views
+
+     def draw(self, region: np.array, top: int, bottom: int, left: int, right: int) -> None:
+          """composite a part of the icon in place onto a region of the treasure map with the same shape
 
-          self.size = self.image.shape[0:2]      
+          Args:
+              region (np.array): view on the treasure map where the icon is drawn
+              top (int): top bound on the icon
+              bottom (int): bottom bound on the icon
+              left (int): left bound on the icon
+              right (int): right bound on the icon
+          """
+          if self.compositing == "mask":
+               foreground, mask = self.get_views(top, bottom, left, right)
+               np.copyto(region, foreground, where=mask)
+          else:
+               premultiplied, inverse_weight = self.get_views(top, bottom, left, right)
+               scratch = SCRATCH.get(region.shape)
+               np.multiply(region, inverse_weight, out=scratch)
+               np.add(scratch, premultiplied, out=scratch)
+               np.right_shift(scratch, 8, out=scratch)
+               np.copyto(region, scratch, casting="unsafe")
      
      def position_on_map(self, position: Position) -> Position:
           """calculate the position of the icon on the map. An offset is applied to center the icon on the position
@@ -53,126 +146,115 @@ class PlayerPositionDependentIcon(Icon):
      position of the icon on the map, as well as keep track of the true (hidden) position of the location.
      
      The position of the players is used to calculate a radius and angle that together specify a the position of the icon in circular coordinates along a closed path
-          - In practice it's a good idea to keep the radius constant, otherwise it becomes too difficult to solve the map
+          - The radius is constant, otherwise it becomes too difficult to solve the map
 
      Args:
           name (str): name of the icon
           true_position (Position): the true position on the map of the hidden location
-          radius_func (function: Position -> float): function that returns the radius of the displacement circle of the icon
-          angle_func (function: Position -> float): function that returns the angle along the displacement circle of the icon
+          trajectory (Trajectory): specification of the displacement circle of the icon
           img_path (str): path to the icon image
           img_offset (Position): offset used to center the icon on a given position
-          show_true_position (bool): specifies whether the true position icon is drawn on the map
+          show_true_position (bool): specifies whether the true position icon is drawn on the map by default, see
+               Map.default_visibility
+          treasure_position (Position): position of the players at which the icon is at its true position
           
      """
      def __init__(self, 
                   name: str, 
                   true_position: Position, 
-                  radius_func: object, 
-                  angle_func: object, 
+                  trajectory: Trajectory, 
                   img_path: str = "images/icons/brass.png", 
                   img_offset: Position = Position(-0.02, -0.02), 
-                  show_true_position: bool = False) -> None:
+                  show_true_position: bool = False,
+                  treasure_position: Position = TREASURE_POSITION) -> None:
           
-          super().__init__(name, img_path, img_offset)
+          super().__init__(name, img_path, img_offset, phases=SUBPIXEL_PHASES)
           
           self.show_true_position = show_true_position
           self.true_position = true_position + img_offset
           self.true_position_icon = Icon(name + " (true position)", img_path, img_offset, use_negative_image=True)
 
-          self.radius_func = radius_func
-          self.angle_func  = angle_func
-          
-          center_x = true_position.x - radius_func(TREASURE_POSITION) * cos(angle_func(TREASURE_POSITION))
-          center_y = true_position.y - radius_func(TREASURE_POSITION) * sin(angle_func(TREASURE_POSITION))
-          self.center_position = Position(center_x, center_y, mode="absolute")
+          self.trajectory = trajectory
+          self.center_position = trajectory.get_center(true_position, treasure_position)
           
      def position_on_map(self, position: Position) -> Position:
-          """calculate the position of the icon on the map, using the radius and angle functions and image offset
+          """calculate the position of the icon on the map, using the trajectory and image offset.
+          Use a TrajectoryTable to calculate the positions of many icons at once
 
           Args:
               position (Position): position object defined on the treasure map
 
           Returns:
-              position (Position): position on the treasure map where the icon should be drawn.
+              position (Position): position on the treasure map where the icon should be drawn, on the grid of 
+                   1 / phases of a pixel
           """
-          radius = self.radius_func(position)
-          angle  = self.angle_func(position)
+          radius = self.trajectory.get_radius(position)
+          angle  = self.trajectory.get_angle(position)
 
-          u = int(radius * cos(angle) + self.center_position.x)
-          v = int(radius * sin(angle) + self.center_position.y)
+          u = floor((radius * cos(angle) + self.center_position.x) * self.phases)
+          v = floor((radius * sin(angle) + self.center_position.y) * self.phases)
+          if self.phases > 1:
+               u, v = u / self.phases, v / self.phases
 
           return Position(u, v, mode="absolute") + self.img_offset
 
 ICONS = (
      PlayerPositionDependentIcon("brass",
           Position(0.5, 0.2),
-          lambda pos: MAP_WIDTH * 0.1,
-          lambda pos: -3 * (pos.y) / MAP_WIDTH,
+          Trajectory(0.1, angle_y=-3),
           img_path = "images/icons/brass.png"),
      PlayerPositionDependentIcon("iron",
           Position(0.65, 0.35),
-          lambda pos: MAP_WIDTH * 0.05,
-          lambda pos: -7 * (pos.x) / MAP_WIDTH + 2,
+          Trajectory(0.05, angle_x=-7, phase=2),
           img_path = "images/icons/iron.png"),
      PlayerPositionDependentIcon("gold",
           Position(0.3813, 0.5535),
-          lambda pos: MAP_WIDTH * 0.08,
-          lambda pos: -14 * (pos.x) / MAP_WIDTH + .5,
+          Trajectory(0.08, angle_x=-14, phase=.5),
           img_path = "images/icons/gold.png",
           img_offset=Position(-0.02538, -0.02)),
      PlayerPositionDependentIcon("silver",
           Position(0.5555, 0.54925),
-          lambda pos: MAP_WIDTH * 0.17,
-          lambda pos: -5 * (pos.y) / MAP_WIDTH + 3.5,
+          Trajectory(0.17, angle_y=-5, phase=3.5),
           img_path = "images/icons/electrum.png",
           img_offset=Position(-0.02538, -0.02)),
      PlayerPositionDependentIcon("platinum",
           Position(0.622222, 0.57125),
-          lambda pos: MAP_WIDTH * 0.07,
-          lambda pos: -12 * (pos.x) / MAP_WIDTH + 1.5,
+          Trajectory(0.07, angle_x=-12, phase=1.5),
           img_path = "images/icons/platinum.png",
           img_offset=Position(-0.02538, -0.02)),
      PlayerPositionDependentIcon("Bridge",
           Position(0.5359, 0.48725),
-          lambda pos: MAP_WIDTH * 0.15,
-          lambda pos: -13 * (pos.y) / MAP_WIDTH,
+          Trajectory(0.15, angle_y=-13),
           img_path = "images/icons/cadmium.png",
           img_offset=Position(-0.02538, -0.02)),
      PlayerPositionDependentIcon("Shield",
           Position(0.47777, 0.52825),
-          lambda pos: MAP_WIDTH * 0.22,
-          lambda pos: 6 * (pos.x) / MAP_WIDTH + 2.5,
+          Trajectory(0.22, angle_x=6, phase=2.5),
           img_path = "images/icons/zinc.png",
           img_offset=Position(-0.03014, -0.00125)),
      PlayerPositionDependentIcon("Hammer",
           Position(0.50794, 0.58375),
-          lambda pos: MAP_WIDTH * 0.22,
-          lambda pos: 8 * (pos.y) / MAP_WIDTH + 2.5,
+          Trajectory(0.22, angle_y=8, phase=2.5),
           img_path = "images/icons/allomancy_2.png",
           img_offset=Position(-0.03014, -0.00125)),
      PlayerPositionDependentIcon("door",
           Position(.49701, .64014),
-          lambda pos: MAP_WIDTH * 0.13,
-          lambda pos: 11 * (pos.x) / MAP_WIDTH + 3.5,
+          Trajectory(0.13, angle_x=11, phase=3.5),
           img_path = "images/icons/tin.png",
           img_offset=Position(-.02538, -0.02625)),
      PlayerPositionDependentIcon("door",
           Position(0.37985, 0.6225),
-          lambda pos: MAP_WIDTH * 0.3,
-          lambda pos: 7 * (pos.y) / MAP_WIDTH + .5,
+          Trajectory(0.3, angle_y=7, phase=.5),
           img_path = "images/icons/tin.png",
           img_offset=Position(-0.02538, -0.02625)),
      PlayerPositionDependentIcon("door",
           Position(0.45581, 0.60595),
-          lambda pos: MAP_WIDTH * 0.17,
-          lambda pos: 10 * (pos.x * 4) / MAP_WIDTH + 1.5,
+          Trajectory(0.17, angle_x=40, phase=1.5),
           img_path = "images/icons/tin.png",
           img_offset=Position(-0.02538, -0.02625)),
      PlayerPositionDependentIcon("door",
           Position(0.43366, 0.57175),
-          lambda pos: MAP_WIDTH * 0.2,
-          lambda pos: 5 * (pos.y) / MAP_WIDTH + 5.5,
+          Trajectory(0.2, angle_y=5, phase=5.5),
           img_path = "images/icons/tin.png",
           img_offset=Position(-0.02538, -0.02625)),
 )
\ No newline at end of file
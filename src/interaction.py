@@ -0,0 +1,306 @@
+import json
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from PyQt6.QtCore import QEvent, QEventLoop, QObject, QPoint, QPointF, Qt, QTimer
+from PyQt6.QtGui import QMouseEvent, QWheelEvent
+from PyQt6.QtWidgets import QApplication, QMainWindow, QWidget
+
+from .position import Position
+
+# version of the format of recorded sessions
+TRACE_VERSION = 1
+
+# mouse events on the map widget that are recorded and replayed, by their name in the trace
+EVENT_TYPES = {"press": QEvent.Type.MouseButtonPress,
+               "move": QEvent.Type.MouseMove,
+               "release": QEvent.Type.MouseButtonRelease,
+               "wheel": QEvent.Type.Wheel}
+EVENT_NAMES = {event_type: name for name, event_type in EVENT_TYPES.items()}
+
+class Trace(object):
+    """Recorded interaction with the map widget: the mouse events with the time since the start of the recording, their
+    position on the widget and the state of the left button, or the angle of the mouse wheel for wheel events
+
+    Args:
+        size (Tuple[int, int]): (width, height) of the map widget during the recording
+        player_position (Tuple[int, int]): absolute (x, y) position of the players on the map at the start
+        events (List[dict], optional): events as {"t": seconds, "type": "press", "move", "release" or "wheel", "x": x,
+            "y": y, "buttons": 0 or 1, "delta": angle}. Defaults to None, which starts an empty trace.
+    """
+    def __init__(self, 
+                 size: Tuple[int, int], 
+                 player_position: Tuple[int, int], 
+                 events: Optional[List[dict]] = None) -> None:
+        super().__init__()
+
+        self.size = tuple(size)
+        self.player_position = tuple(player_position)
+        self.events = [] if events is None else list(events)
+
+    @property
+    def duration(self) -> float:
+        return self.events[-1]["t"] if self.events else 0.
+
+    def save(self, path: str) -> None:
+        """write the trace to a JSON file
+
+        Args:
+            path (str): path of the JSON file
+        """
+        with open(path, "w") as f:
+            json.dump({"version": TRACE_VERSION, "size": list(self.size), "player_position": list(self.player_position), 
+                       "events": self.events}, f)
+
+    @staticmethod
+    def load(path: str) -> "Trace":
+        """read a trace from a JSON file written by Trace.save
+
+        Args:
+            path (str): path of the JSON file
+
+        Returns:
+            Trace: the trace
+        """
+        with open(path) as f:
+            trace = json.load(f)
+        if trace.get("version") != TRACE_VERSION:
+            raise ValueError(f"{path} is not a version {TRACE_VERSION} trace")
+        return Trace(trace["size"], trace["player_position"], trace["events"])
+
+
+class InteractionRecorder(QObject):
+    """Records the mouse events that reach the map widget of a window into a Trace, also after the window switched to
+    another map. Start it before the window is shown, and save the trace when the window closes
+
+    Args:
+        window (QMainWindow): main window of which the map widget is recorded
+    """
+    def __init__(self, window: QMainWindow) -> None:
+        super().__init__()
+
+        self.window = window
+        map_widget = window.map_widget
+        self.trace = Trace((map_widget.width(), map_widget.height()), 
+                           (map_widget.player_position.x, map_widget.player_position.y))
+        self._start = time.perf_counter()
+        QApplication.instance().installEventFilter(self)
+
+    def eventFilter(self, obj: QObject, ev: QEvent) -> bool:
+        name = EVENT_NAMES.get(ev.type())
+        if name is not None and obj is self.window.map_widget:
+            event = {"t": round(time.perf_counter() - self._start, 6), "type": name,
+                     "x": ev.position().x(), "y": ev.position().y()}
+            if name == "wheel":
+                event["delta"] = ev.angleDelta().y()
+            else:
+                event["buttons"] = int(bool(ev.buttons() & Qt.MouseButton.LeftButton))
+            self.trace.events.append(event)
+        return False
+
+
+class LatencyMonitor(QObject):
+    """Measures the latency from mouse events reaching a map widget to the first painted frame that shows their effect.
+    Every event after which the widget requests a frame is served by the first painted frame of that request or a newer
+    one. Requests that are never painted themselves were coalesced by the render thread, or replaced before they were
+    painted.
+
+    Args:
+        map_widget (QWidget): MapWidget of which the events and frames are measured
+    """
+    def __init__(self, map_widget: QWidget) -> None:
+        super().__init__()
+
+        self.map_widget = map_widget
+        self.events = 0
+
+        # time of the last event, and the requests of which no frame was painted yet with the time of their event
+        self._event_time: Optional[float] = None
+        self._pending: List[Tuple[int, float]] = []
+        self._painted = 0
+
+        self.latencies: List[float] = []
+        self.requested_frames = 0
+        self.painted_frames = 0
+        self.coalesced_frames = 0
+
+        map_widget.installEventFilter(self)
+        map_widget.frame_requested.connect(self.on_frame_requested)
+        map_widget.frame_painted.connect(self.on_frame_painted)
+
+    def eventFilter(self, obj: QObject, ev: QEvent) -> bool:
+        # the filter runs right before the event handler of the widget, which requests the frame
+        if ev.type() in EVENT_NAMES:
+            self.events += 1
+            self._event_time = time.perf_counter()
+        return False
+
+    def on_frame_requested(self, request: int) -> None:
+        # only the first request after an event is caused by it
+        if self._event_time is not None:
+            self._pending.append((request, self._event_time))
+            self.requested_frames += 1
+            self._event_time = None
+
+    def on_frame_painted(self, request: int) -> None:
+        # a frame is usually painted more than once, only the first paint of a newer request counts
+        if request <= self._painted:
+            return
+        self._painted = request
+        now = time.perf_counter()
+
+        served = bisect_left(self._pending, (request + 1,))
+        if served == 0:
+            return
+        self.painted_frames += 1
+        self.coalesced_frames += served - 1 if self._pending[served - 1][0] == request else served
+        self.latencies += [now - event_time for _, event_time in self._pending[:served]]
+        del self._pending[:served]
+
+    @property
+    def unserved(self) -> int:
+        """int: number of requested frames of which no newer frame was painted yet"""
+        return len(self._pending)
+
+    def get_report(self, duration: float) -> Dict[str, object]:
+        """summarize the measurements
+
+        Args:
+            duration (float): duration of the measurement in seconds
+
+        Returns:
+            Dict[str, object]: event-to-frame latency percentiles in milliseconds, the number of events, requested,
+                painted and coalesced frames, and the event and frame rates
+        """
+        latencies = np.array(self.latencies) * 1e3
+        if len(latencies):
+            p50, p95, p99 = np.percentile(latencies, (50, 95, 99))
+            latency = {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": float(latencies.max()),
+                       "mean": float(latencies.mean())}
+        else:
+            latency = {}
+
+        return {"latency_ms": latency,
+                "events": self.events,
+                "requested_frames": self.requested_frames,
+                "painted_frames": self.painted_frames,
+                "coalesced_frames": self.coalesced_frames,
+                "unserved_frames": self.unserved,
+                "duration_s": duration,
+                "events_per_s": self.events / duration if duration > 0 else 0.,
+                "fps": self.painted_frames / duration if duration > 0 else 0.}
+
+
+def create_event(event: dict, widget: QWidget, scale: Tuple[float, float]) -> QEvent:
+    """create the Qt event of an event of a trace
+
+    Args:
+        event (dict): event of a Trace
+        widget (QWidget): widget that receives the event
+        scale (Tuple[float, float]): scale of the positions, from the size of the recorded widget to the widget
+
+    Returns:
+        QEvent: the mouse or wheel event
+    """
+    position = QPointF(event["x"] * scale[0], event["y"] * scale[1])
+    global_position = QPointF(widget.mapToGlobal(position))
+    buttons = Qt.MouseButton.LeftButton if event.get("buttons") else Qt.MouseButton.NoButton
+
+    if event["type"] == "wheel":
+        return QWheelEvent(position, global_position, QPoint(), QPoint(0, event["delta"]), buttons,
+                           Qt.KeyboardModifier.NoModifier, Qt.ScrollPhase.NoScrollPhase, False)
+
+    button = Qt.MouseButton.NoButton if event["type"] == "move" else Qt.MouseButton.LeftButton
+    return QMouseEvent(EVENT_TYPES[event["type"]], position, global_position, button, buttons,
+                       Qt.KeyboardModifier.NoModifier)
+
+
+def replay(window: QMainWindow, trace: Trace, speed: float = 1., settle_time: float = 1.) -> Dict[str, object]:
+    """replay a trace against the map widget of a window with its original timing, e.g. on the offscreen platform, and
+    measure the latency from every event to the frame that shows it. The players are moved to their position at the
+    start of the recording first. Events are posted to the event queue of the application when they are due, like the
+    events of a real mouse. Blocks until the trace is replayed and the last requested frame is painted, or settle_time
+    has passed
+
+    Args:
+        window (QMainWindow): main window of which the map widget receives the events
+        trace (Trace): recorded session
+        speed (float, optional): playback speed. Defaults to 1.
+        settle_time (float, optional): maximum time in seconds to wait for the last frame. Defaults to 1.
+
+    Returns:
+        Dict[str, object]: report of the LatencyMonitor, with the number of events of the trace that were not
+            delivered to the widget as "dropped_events"
+    """
+    map_widget = window.map_widget
+    scale = (map_widget.width() / trace.size[0], map_widget.height() / trace.size[1])
+
+    map_widget.player_position = Position(round(trace.player_position[0] * scale[0]), 
+                                          round(trace.player_position[1] * scale[1]), mode="absolute")
+    map_widget.update_map()
+    QApplication.processEvents()
+
+    monitor = LatencyMonitor(map_widget)
+
+    loop = QEventLoop()
+    timer = QTimer()
+    timer.setTimerType(Qt.TimerType.PreciseTimer)
+    state = {"next": 0, "end": None}
+    start = time.perf_counter()
+
+    def post_due_events() -> None:
+        now = time.perf_counter()
+        elapsed = (now - start) * speed
+        while state["next"] < len(trace.events) and trace.events[state["next"]]["t"] <= elapsed:
+            QApplication.postEvent(map_widget, create_event(trace.events[state["next"]], map_widget, scale))
+            state["next"] += 1
+
+        if state["next"] == len(trace.events):
+            if state["end"] is None:
+                state["end"] = now
+            delivered = monitor.events == len(trace.events) and monitor.unserved == 0
+            if delivered or now - state["end"] > settle_time:
+                timer.stop()
+                loop.quit()
+
+    timer.timeout.connect(post_due_events)
+    timer.start(1)
+    loop.exec()
+
+    report = monitor.get_report(state["end"] - start)
+    report["dropped_events"] = len(trace.events) - monitor.events
+    map_widget.removeEventFilter(monitor)
+    map_widget.frame_requested.disconnect(monitor.on_frame_requested)
+    map_widget.frame_painted.disconnect(monitor.on_frame_painted)
+
+    return report
+
+
+def synthetic_drag(size: Tuple[int, int], start: Tuple[float, float], duration: float = 2., rate: float = 120.,
+                   seed: int = 0) -> Trace:
+    """generate a trace of dragging the player icon along a random path, e.g. to measure the latency without a recording
+
+    Args:
+        size (Tuple[int, int]): (width, height) of the map widget
+        start (Tuple[float, float]): position of the player icon on the widget, where the drag starts
+        duration (float, optional): duration of the drag in seconds. Defaults to 2.
+        rate (float, optional): number of mouse move events per second. Defaults to 120.
+        seed (int, optional): seed of the path. Defaults to 0.
+
+    Returns:
+        Trace: the trace
+    """
+    rng = np.random.default_rng(seed)
+    steps = int(duration * rate)
+    xy = np.cumsum(rng.normal(0, 3, (steps, 2)), axis=0) + start
+    xy = np.clip(xy, 0, np.array(size) - 1)
+
+    events = [{"t": 0., "type": "press", "x": float(start[0]), "y": float(start[1]), "buttons": 1}]
+    events += [{"t": (i + 1) / rate, "type": "move", "x": float(x), "y": float(y), "buttons": 1}
+               for i, (x, y) in enumerate(xy.tolist())]
+    events.append({"t": (steps + 1) / rate, "type": "release", "x": events[-1]["x"], "y": events[-1]["y"],
+                   "buttons": 0})
+
+    return Trace(size, (round(start[0]), round(start[1])), events)
@@ -1,28 +1,40 @@
+from typing import TYPE_CHECKING, Iterable, Tuple, Union
+import numpy as np
+
 from constants import MAP_HEIGHT, MAP_WIDTH
 
-from PyQt6.QtCore import QPointF
+# Qt is only needed for type hints, so positions can be used without a GUI
+if TYPE_CHECKING:
+    from PyQt6.QtCore import QPointF
 
 class Position(object):
-    """Position object to easily compare and manipulate the positions of map elements
+    """Immutable position object to easily compare and manipulate the positions of map elements
 
     Args:
         x (int): x coordinate
         y (int): y coordinate
-        mode (str): can either be "relative" or "absolute". (NEVER change this after initialization)
-            In "relative" mode the coordinates are internally defined on the interval [0,1]
-            In "absolute" mode the coordinates are internally defined on the interval [0, MAP_SIZE]
+        mode (str): can either be "relative" or "absolute".
+            In "relative" mode the coordinates are given on the interval [0,1]
+            In "absolute" mode the coordinates are given on the interval [0, MAP_SIZE]
+            Relative coordinates are converted to absolute coordinates on construction, so the mode is not stored.
     """
+    __slots__ = ("_x", "_y")
+
     def __init__(self, x: int, y: int, mode: str="relative") -> None:
-        super().__init__()
-        
-        assert mode in ["relative", "absolute"]
-        self.mode = mode
+        if mode == "relative":
+            x = round(MAP_WIDTH * x)
+            y = round(MAP_HEIGHT * y)
+        elif mode != "absolute":
+            raise ValueError(f"mode should be 'relative' or 'absolute', not '{mode}'")
 
-        self.x = x
-        self.y = y
+        object.__setattr__(self, "_x", x)
+        object.__setattr__(self, "_y", y)
+
+    def __setattr__(self, name: str, value) -> None:
+        raise AttributeError("Position objects are immutable")
 
     @staticmethod
-    def from_QPointF(qpos: QPointF):
+    def from_QPointF(qpos: "QPointF"):
         """generate a Position object with the coordinates of the given QPointF object
 
         Args:
@@ -46,6 +58,28 @@ class Position(object):
         """
         return Position(tuple[0], tuple[1], mode=mode)
 
+    def to_relative(self) -> Tuple[float, float]:
+        """get the coordinates of this position relative to the map size
+
+        Returns:
+            Tuple[float, float]: (x, y) on the interval [0, 1]
+        """
+        return self._x / MAP_WIDTH, self._y / MAP_HEIGHT
+
+    def clamp(self, left: int, right: int, top: int, bottom: int) -> "Position":
+        """get the closest position within a given bounding box
+
+        Args:
+            left (int)  : left bound
+            right (int) : right bound
+            top (int)   : top bound
+            bottom (int): bottom bound
+
+        Returns:
+            Position: absolute position within the bounds
+        """
+        return Position(min(max(self._x, left), right), min(max(self._y, top), bottom), mode="absolute")
+
     def is_in_bbox(self, left: int, right: int, top: int, bottom: int) -> bool:
         """Checks whether this position is contained in a given bounding box
 
@@ -58,35 +92,128 @@ class Position(object):
         Returns:
             bool: True if this position is within the bounds
         """
-        if self.x >= left and self.y >= top and self.x <=right and self.y <= bottom:
-            return True
-        else:
-            return False
+        return left <= self._x <= right and top <= self._y <= bottom
 
     @property
     def x(self) -> int:
-        if self.mode  == "absolute":
-            return self._x
-        elif self.mode == "relative":
-            return round(MAP_WIDTH * self._x)
-
-    @x.setter
-    def x(self, val: int) -> None:
-        self._x = val
+        return self._x
 
     @property
     def y(self) -> int:
-        if self.mode  == "absolute":
-            return self._y
-        elif self.mode == "relative":
-            return round(MAP_HEIGHT * self._y)
-    
-    @y.setter
-    def y(self, val: int) -> None:
-        self._y = val
+        return self._y
 
     def __add__(self, other):
-        return Position(self.x + other.x, self.y + other.y, mode="absolute")
-    
+        return Position(self._x + other._x, self._y + other._y, mode="absolute")
+
     def __sub__(self, other):
-        return Position(self.x - other.x, self.y - other.y, mode="absolute")
\ No newline at end of file
+        return Position(self._x - other._x, self._y - other._y, mode="absolute")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Position):
+            return NotImplemented
+        return self._x == other._x and self._y == other._y
+
+    def __hash__(self) -> int:
+        return hash((self._x, self._y))
+
+    def __repr__(self) -> str:
+        return f"Position({self._x}, {self._y}, mode=\"absolute\")"
+
+
+class PositionArray(object):
+    """NumPy backed array of N absolute positions, for operations on large sets of positions at once
+
+    Args:
+        xy (np.array): coordinates with shape (N, 2)
+        mode (str): can either be "relative" or "absolute", see Position
+    """
+    __slots__ = ("xy",)
+
+    def __init__(self, xy: np.array, mode: str = "relative") -> None:
+        xy = np.asarray(xy)
+        if xy.ndim != 2 or xy.shape[1] != 2:
+            raise ValueError(f"expected coordinates with shape (N, 2), got {xy.shape}")
+
+        if mode == "relative":
+            xy = np.round(xy * (MAP_WIDTH, MAP_HEIGHT)).astype(np.int64)
+        elif mode != "absolute":
+            raise ValueError(f"mode should be 'relative' or 'absolute', not '{mode}'")
+
+        self.xy = xy
+
+    @staticmethod
+    def from_positions(positions: Iterable[Position]) -> "PositionArray":
+        """generate a PositionArray with the coordinates of the given Position objects
+
+        Args:
+            positions (Iterable[Position]): positions
+
+        Returns:
+            PositionArray: Instance of this class with the given coordinates
+        """
+        return PositionArray(np.array([(position.x, position.y) for position in positions]).reshape(-1, 2),
+                             mode="absolute")
+
+    @property
+    def x(self) -> np.array:
+        return self.xy[:, 0]
+
+    @property
+    def y(self) -> np.array:
+        return self.xy[:, 1]
+
+    def to_relative(self) -> np.array:
+        """get the coordinates of the positions relative to the map size
+
+        Returns:
+            np.array: (N, 2) coordinates on the interval [0, 1]
+        """
+        return self.xy / (MAP_WIDTH, MAP_HEIGHT)
+
+    def is_in_bbox(self, left: int, right: int, top: int, bottom: int) -> np.array:
+        """Checks for every position whether it is contained in a given bounding box
+
+        Args:
+            left (int)  : left bound
+            right (int) : right bound
+            top (int)   : top bound
+            bottom (int): bottom bound
+
+        Returns:
+            np.array: boolean array of length N, True for positions within the bounds
+        """
+        x, y = self.xy[:, 0], self.xy[:, 1]
+        return (x >= left) & (x <= right) & (y >= top) & (y <= bottom)
+
+    def __len__(self) -> int:
+        return len(self.xy)
+
+    def __getitem__(self, index) -> Union[Position, "PositionArray"]:
+        if isinstance(index, (int, np.integer)):
+            x, y = self.xy[index].tolist()
+            return Position(x, y, mode="absolute")
+        return PositionArray(self.xy[index], mode="absolute")
+
+    def __iter__(self):
+        for x, y in self.xy.tolist():
+            yield Position(x, y, mode="absolute")
+
+    def __array__(self, dtype=None, copy=None) -> np.array:
+        return self.xy if dtype is None else self.xy.astype(dtype)
+
+    @staticmethod
+    def _coordinates(other: Union[Position, "PositionArray", np.array]) -> np.array:
+        if isinstance(other, Position):
+            return np.array((other.x, other.y))
+        if isinstance(other, PositionArray):
+            return other.xy
+        return np.asarray(other)
+
+    def __add__(self, other: Union[Position, "PositionArray", np.array]) -> "PositionArray":
+        return PositionArray(self.xy + self._coordinates(other), mode="absolute")
+
+    def __sub__(self, other: Union[Position, "PositionArray", np.array]) -> "PositionArray":
+        return PositionArray(self.xy - self._coordinates(other), mode="absolute")
+
+    def __repr__(self) -> str:
+        return f"PositionArray({self.xy.tolist()}, mode=\"absolute\")"
@@ -0,0 +1,141 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Deque, Dict
+import numpy as np
+
+# a single no-op context manager is shared by all stages when profiling is disabled, so it costs a method call
+_DISABLED_STAGE = nullcontext()
+
+class _Stage(object):
+    """Context manager that records the duration of a stage of a frame"""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "FrameProfiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.
+
+    def __enter__(self) -> "_Stage":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter())
+
+
+class FrameProfiler(object):
+    """Opt-in instrumentation of the render pipeline. Records the duration of every stage of every frame, keeps rolling
+    latency percentiles and the frame rate, and exports the recorded stages as a Chrome trace (chrome://tracing or
+    https://ui.perfetto.dev). When disabled, stage() returns a shared no-op context manager.
+
+    Args:
+        enabled (bool, optional): specifies whether timings are recorded. Defaults to False.
+        window (int, optional): number of recent timings per stage used for the percentiles. Defaults to 300.
+        max_events (int, optional): number of recent stages kept for the trace. Defaults to 100000.
+    """
+    def __init__(self, enabled: bool = False, window: int = 300, max_events: int = 100000) -> None:
+        super().__init__()
+
+        self.enabled = enabled
+        self.window = window
+
+        self._origin = time.perf_counter()
+        self._durations: Dict[str, Deque[float]] = {}
+        self._events: Deque[tuple] = deque(maxlen=max_events)
+        self._frame_times: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def stage(self, name: str):
+        """time a stage of the current frame
+
+        Args:
+            name (str): name of the stage
+
+        Returns:
+            context manager that records the duration of the stage
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return _Stage(self, name)
+
+    def record(self, name: str, start: float, end: float) -> None:
+        """record the duration of a stage
+
+        Args:
+            name (str): name of the stage
+            start (float): time.perf_counter() at the start of the stage
+            end (float): time.perf_counter() at the end of the stage
+        """
+        with self._lock:
+            durations = self._durations.get(name)
+            if durations is None:
+                durations = self._durations[name] = deque(maxlen=self.window)
+            durations.append(end - start)
+            self._events.append((name, start, end, threading.get_ident()))
+
+    def mark_frame(self) -> None:
+        """mark that a frame has been shown, used for the frame rate"""
+        if self.enabled:
+            self._frame_times.append(time.perf_counter())
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """get the rolling latency percentiles of every stage and the frame rate
+
+        Returns:
+            Dict[str, Dict[str, float]]: p50, p95 and p99 in milliseconds per stage, and "fps"
+        """
+        with self._lock:
+            durations = {name: np.array(values) * 1e3 for name, values in self._durations.items() if values}
+
+        stats = {}
+        for name, values in durations.items():
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            stats[name] = {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+        frame_times = list(self._frame_times)
+        fps = (len(frame_times) - 1) / (frame_times[-1] - frame_times[0]) if len(frame_times) > 1 else 0.
+        stats["fps"] = {"fps": fps}
+
+        return stats
+
+    def format_stats(self) -> str:
+        """format the statistics for the on-screen overlay
+
+        Returns:
+            str: one line per stage
+        """
+        stats = self.get_stats()
+        lines = [f"{stats.pop('fps')['fps']:.1f} fps", "stage  p50 / p95 / p99 ms"]
+        lines += [f"{name}  {values['p50']:.2f} / {values['p95']:.2f} / {values['p99']:.2f}"
+                  for name, values in sorted(stats.items())]
+        return "\n".join(lines)
+
+    def export_trace(self, path: str) -> None:
+        """write the recorded stages as a Chrome trace JSON file
+
+        Args:
+            path (str): path of the JSON file
+        """
+        with self._lock:
+            events = list(self._events)
+
+        trace = {"traceEvents": [{"name": name,
+                                  "ph": "X",
+                                  "ts": (start - self._origin) * 1e6,
+                                  "dur": (end - start) * 1e6,
+                                  "pid": os.getpid(),
+                                  "tid": thread}
+                                 for name, start, end, thread in events],
+                 "displayTimeUnit": "ms",
+                 "otherData": {"stats": self.get_stats()}}
+
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+
+# profiler of the render pipeline, enabled with the environment variable TREASURE_MAP_PROFILE=1
+PROFILER = FrameProfiler(enabled=os.environ.get("TREASURE_MAP_PROFILE", "") not in ("", "0"))
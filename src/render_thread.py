@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+from PyQt6.QtCore import QThread, pyqtSignal
+from PyQt6.QtGui import QImage
+
+from .frame_cache import FrameCache
+from .frame_pool import FramePool
+from .generate_map import Map, RenderState
+from .profiling import PROFILER
+from .viewport import View, ViewportRenderer
+
+class RenderThread(QThread):
+    """Thread that renders the treasure map off the GUI thread. Render requests are stored in a single slot, so a new
+    request replaces a pending one that has not been rendered yet and only the newest frame is delivered.
+
+    With a frame cache, frames of the whole map are taken from the cache when possible, and while the thread is idle
+    the frames of the positions that a drag is heading towards are rendered into the cache in advance.
+
+    With a frame pool, frames are rendered (or copied from the cache) into the buffers of the pool and delivered
+    without copying them. The receiver of frame_ready gets the QImage, the owner of its pixels and the number of the
+    request it was rendered for, and has to release owners that are a FrameBuffer to the pool once the image is no
+    longer shown. Without a frame pool, frames of the cache are read-only and delivered with the frame itself as owner,
+    and other frames are copied and have None as owner.
+
+    Args:
+        treasure_map (Map): Map object that generates the images
+        max_fps (float, optional): maximum number of frames rendered per second. Defaults to None, which is uncapped.
+        viewport_renderer (ViewportRenderer, optional): renderer for zoomed in views. Defaults to None.
+        frame_cache (FrameCache, optional): cache of frames of the whole map. Defaults to None.
+        prewarm_frames (int, optional): number of frames ahead of a drag that are prewarmed. Defaults to 0.
+        frame_pool (FramePool, optional): buffers that frames are rendered into. Defaults to None.
+    """
+    frame_ready = pyqtSignal(QImage, object, int)
+
+    def __init__(self, 
+                 treasure_map: Map, 
+                 max_fps: Optional[float] = None,
+                 viewport_renderer: Optional[ViewportRenderer] = None,
+                 frame_cache: Optional[FrameCache] = None,
+                 prewarm_frames: int = 0,
+                 frame_pool: Optional[FramePool] = None) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.viewport_renderer = viewport_renderer
+        self.frame_cache = frame_cache
+        self.prewarm_frames = prewarm_frames
+        self.frame_pool = frame_pool
+        self.min_frame_interval = 1 / max_fps if max_fps else 0.
+
+        self._condition = threading.Condition()
+        self._pending: Optional[Tuple[RenderState, Optional[View], int]] = None
+        self._prewarm: "deque[RenderState]" = deque()
+        self._stopped = False
+
+        # statistics on the coalescing of requests
+        self.requested_frames = 0
+        self.rendered_frames = 0
+
+    def request_render(self, state: RenderState, view: Optional[View] = None) -> int:
+        """request a new frame. Never blocks, and drops the previous request if it has not been picked up yet
+
+        Args:
+            state (RenderState): current position of the players and visibility of the icons
+            view (View, optional): zoomed in view that is rendered by the viewport renderer. Defaults to None, which
+                renders the whole map.
+
+        Returns:
+            int: number of the request, which frame_ready passes along with the frame that was rendered for it
+        """
+        with self._condition:
+            self.requested_frames += 1
+            self._pending = (state, view, self.requested_frames)
+            self._condition.notify()
+            return self.requested_frames
+
+    def stop(self) -> None:
+        """stop the thread after the frame that is being rendered and wait for it to finish
+        """
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self.frame_pool is not None:
+            self.frame_pool.close()
+        self.wait()
+
+    def run(self) -> None:
+        last_frame_time = 0.
+        last_position = None
+
+        while True:
+            with self._condition:
+                while self._pending is None and not self._prewarm and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                prewarm = self._prewarm.popleft() if self._pending is None else None
+
+            # prewarm a single frame at a time, so a new request is picked up quickly
+            if prewarm is not None:
+                self.frame_cache.prewarm(prewarm)
+                continue
+
+            # cap the frame rate, requests that come in while waiting replace the pending one
+            delay = last_frame_time + self.min_frame_interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+            # wait for a free buffer before taking the request, so the newest request is rendered
+            buffer = None
+            if self.frame_pool is not None:
+                with PROFILER.stage("acquire"):
+                    buffer = self.frame_pool.acquire()
+                if buffer is None:
+                    return
+
+            with self._condition:
+                if self._stopped:
+                    return
+                state, view, request = self._pending
+                self._pending = None
+
+            last_frame_time = time.perf_counter()
+            with PROFILER.stage("render"):
+                if view is not None:
+                    map_img = self.viewport_renderer.render(view, state, buffer)
+                elif self.frame_cache is not None:
+                    map_img = self.frame_cache.render(state, buffer)
+                else:
+                    map_img = self.treasure_map.render(state, incremental=True, out=buffer)
+
+            # frames returned by the cache are never rewritten, so without a pool they are delivered as they are
+            owner = buffer
+            if buffer is None and view is None and self.frame_cache is not None:
+                owner = map_img
+
+            # the image refers to the pixels of its owner, without a pool the incremental frame is rewritten by the
+            # next render, so the image gets its own copy
+            with PROFILER.stage("qimage"):
+                image = QImage(map_img.data,
+                               map_img.shape[1],
+                               map_img.shape[0],
+                               map_img.strides[0],
+                               QImage.Format.Format_RGB888)
+                if owner is None:
+                    image = image.copy()
+
+            self.rendered_frames += 1
+            self.frame_ready.emit(image, owner, request)
+
+            # frames ahead of the drag replace those of the previous frame
+            if self.frame_cache is not None and view is None and self.prewarm_frames:
+                positions = self.frame_cache.predict_positions(last_position or state.player_position, 
+                                                               state.player_position, self.prewarm_frames)
+                with self._condition:
+                    self._prewarm = deque(state.replace(player_position=position) for position in positions)
+            last_position = state.player_position if view is None else None
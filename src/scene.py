@@ -0,0 +1,171 @@
+from typing import Dict, Optional
+import numpy as np
+
+from PyQt6.QtCore import QRectF, Qt, pyqtSignal
+from PyQt6.QtGui import QImage, QPainter, QPaintEvent, QPixmap
+from PyQt6.QtWidgets import QFrame, QGraphicsPixmapItem, QGraphicsScene, QGraphicsView, QWidget
+
+from .generate_map import Map, RenderState
+from .icons import Icon
+from .position import Position
+from .profiling import PROFILER
+from .sprites import Sprite
+from .viewport import Viewport
+
+def to_pixmap(image: np.array) -> QPixmap:
+    """convert an RGB or RGBA image to a pixmap, which holds its own copy of the pixels
+
+    Args:
+        image (np.array): RGB or RGBA image
+
+    Returns:
+        QPixmap: the pixmap
+    """
+    image = np.ascontiguousarray(image)
+    image_format = QImage.Format.Format_RGBA8888 if image.shape[2] == 4 else QImage.Format.Format_RGB888
+    return QPixmap.fromImage(QImage(image.data, image.shape[1], image.shape[0], image.strides[0], image_format))
+
+
+class MapScene(QGraphicsScene):
+    """Retained-mode treasure map. The background is a static pixmap and every icon is a pixmap item of which only the
+    position, stacking order and visibility are updated when the players move, so Qt only repaints the regions of the
+    icons that moved. Icons that share a sprite share a pixmap. NumPy compositing is not used, Map.render is only
+    needed for exports.
+
+    Args:
+        treasure_map (Map): Map object that determines which icons are drawn where
+    """
+    def __init__(self, treasure_map: Map) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.setSceneRect(QRectF(0, 0, treasure_map.width, treasure_map.height))
+
+        self._background = None
+        self._background_item = self.addPixmap(QPixmap())
+        self._background_item.setZValue(-1)
+        self._check_background()
+
+        self._pixmaps: Dict[int, QPixmap] = {}
+        self._items: Dict[Icon, QGraphicsPixmapItem] = {}
+        self._positions: Dict[Icon, Position] = {}
+        self._sprites: Dict[Icon, Sprite] = {}
+
+        # statistics
+        self.moved_items = 0
+
+    def _check_background(self) -> None:
+        if self.treasure_map.background is not self._background:
+            self._background = self.treasure_map.background
+            self._background_item.setPixmap(to_pixmap(self._background))
+
+    def get_pixmap(self, sprite: Sprite) -> QPixmap:
+        """get the (cached) pixmap of a sprite
+
+        Args:
+            sprite (Sprite): sprite of an icon
+
+        Returns:
+            QPixmap: pixmap with the RGBA image of the sprite
+        """
+        pixmap = self._pixmaps.get(id(sprite))
+        if pixmap is None:
+            pixmap = self._pixmaps[id(sprite)] = to_pixmap(sprite.rgba)
+        return pixmap
+
+    def get_item(self, icon: Icon) -> QGraphicsPixmapItem:
+        """get the item of an icon, which is added to the scene the first time it is requested
+
+        Args:
+            icon (Icon): icon on the map
+
+        Returns:
+            QGraphicsPixmapItem: item that shows the icon
+        """
+        item = self._items.get(icon)
+        if item is None:
+            item = self._items[icon] = self.addPixmap(self.get_pixmap(icon.sprite))
+            self._sprites[icon] = icon.sprite
+            item.setVisible(False)
+        return item
+
+    def update_icons(self, state: RenderState) -> int:
+        """move the items of the icons to their positions in a render state and show only the visible icons
+
+        Args:
+            state (RenderState): current position of the players and visibility of the icons, the scale is that of the
+                view
+
+        Returns:
+            int: number of items that moved, appeared or disappeared
+        """
+        with PROFILER.stage("positioning"):
+            self._check_background()
+            draw_list = self.treasure_map.get_draw_list(state)
+
+        with PROFILER.stage("scene"):
+            moved = 0
+            positions = {}
+            for order, (icon, position) in enumerate(draw_list):
+                positions[icon] = position
+                item = self.get_item(icon)
+                if self._positions.get(icon) != position:
+                    # at a sub-pixel position the item shows the variant of the icon for that position
+                    variant, position_on_pixel = icon.snap(position)
+                    if self._sprites.get(icon) is not variant.sprite:
+                        item.setPixmap(self.get_pixmap(variant.sprite))
+                        self._sprites[icon] = variant.sprite
+                    item.setPos(position_on_pixel.x, position_on_pixel.y)
+                    moved += 1
+                if item.zValue() != order:
+                    item.setZValue(order)
+                if not item.isVisible():
+                    item.setVisible(True)
+
+            for icon in self._positions.keys() - positions.keys():
+                self._items[icon].setVisible(False)
+                moved += 1
+            self._positions = positions
+
+        self.moved_items += moved
+        return moved
+
+
+class MapView(QGraphicsView):
+    """View on a MapScene with the size of the map. Zooming and panning follow a Viewport by transforming the view,
+    the scene itself is not changed. The view ignores the mouse, so the events reach the widget below it.
+
+    Args:
+        scene (MapScene): scene of the treasure map
+        parent (QWidget, optional): parent widget. Defaults to None.
+    """
+    painted = pyqtSignal()
+
+    def __init__(self, scene: MapScene, parent: Optional[QWidget] = None) -> None:
+        super().__init__(scene, parent)
+
+        self.setFrameShape(QFrame.Shape.NoFrame)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop)
+        self.setViewportUpdateMode(QGraphicsView.ViewportUpdateMode.MinimalViewportUpdate)
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.setFixedSize(int(scene.width()), int(scene.height()))
+
+    def set_view(self, viewport: Viewport) -> None:
+        """transform the view to show the part of the map that is in view of a viewport
+
+        Args:
+            viewport (Viewport): zoom and pan state of the map widget
+        """
+        scale = viewport.zoom / viewport.min_zoom
+        self.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform, not viewport.is_fit)
+
+        self.resetTransform()
+        self.scale(scale, scale)
+        self.horizontalScrollBar().setValue(round(viewport.x * viewport.zoom))
+        self.verticalScrollBar().setValue(round(viewport.y * viewport.zoom))
+
+    def paintEvent(self, ev: QPaintEvent) -> None:
+        super().paintEvent(ev)
+        self.painted.emit()
@@ -0,0 +1,397 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from http import HTTPStatus
+from multiprocessing import Pool
+from typing import Dict, Hashable, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from constants import MAP_HEIGHT, MAP_WIDTH
+from . import batch
+from .batch import SharedBackground, get_visibility_mask
+from .export_queue import QUALITY_RANGES, encode_image
+from .generate_map import Map, RenderState
+from .position import Position
+from .profiling import FrameProfiler
+
+# key of a rendered response: x, y, visibility of the true positions, whether the player icon is shown, format, quality
+RenderKey = Tuple[int, int, Tuple[bool], bool, str, Optional[int]]
+
+CONTENT_TYPES = {"png": "image/png", "jpg": "image/jpeg", "jpeg": "image/jpeg", "webp": "image/webp"}
+
+# largest request head that is accepted, the server only handles small GET requests
+MAX_HEADER_BYTES = 16384
+
+
+class HTTPError(Exception):
+    """Error that is sent to the client as a response with a status code
+
+    Args:
+        status (HTTPStatus): status of the response
+        message (str): explanation that is sent as the body
+    """
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+
+        self.status = status
+
+
+def render_encoded(key: RenderKey) -> bytes:
+    """render and encode the treasure map in a worker process initialized by batch.init_worker
+
+    Args:
+        key (RenderKey): what to render
+
+    Returns:
+        bytes: the encoded image
+    """
+    x, y, visibility, show_player_icon, format, quality = key
+    map_img = batch._worker_map.render(RenderState(Position(x, y, mode="absolute"), show_player_icon, visibility))
+    return encode_image(map_img, format, quality)
+
+
+class ResponseCache(object):
+    """Memory bounded least-recently-used cache of encoded images
+
+    Args:
+        max_bytes (int): maximum total size of the cached images in bytes
+    """
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__()
+
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._responses: "OrderedDict[Hashable, bytes]" = OrderedDict()
+
+        # statistics
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """get a cached image
+
+        Args:
+            key (Hashable): key of the image
+
+        Returns:
+            Optional[bytes]: the image, or None if it is not cached
+        """
+        data = self._responses.get(key)
+        if data is None:
+            self.misses += 1
+        else:
+            self._responses.move_to_end(key)
+            self.hits += 1
+        return data
+
+    def put(self, key: Hashable, data: bytes) -> None:
+        """cache an image, evicting the least recently used images when the cache is full
+
+        Args:
+            key (Hashable): key of the image
+            data (bytes): the encoded image
+        """
+        if len(data) > self.max_bytes or key in self._responses:
+            return
+
+        while self.bytes + len(data) > self.max_bytes:
+            _, evicted = self._responses.popitem(last=False)
+            self.bytes -= len(evicted)
+
+        self._responses[key] = data
+        self.bytes += len(data)
+
+
+class RenderServer(object):
+    """Asynchronous HTTP server that renders the treasure map for the devices of the players.
+
+    `GET /map.png?x=0.3&y=0.6` returns the map for a position of the players, relative to the map size (add
+    `absolute=1` for pixels). `show=brass,iron` (or `all`) shows true positions, `player=0` hides the player icon, the
+    extension selects PNG, JPEG or WebP and `quality` sets the compression level or quality. `GET /metrics` returns the
+    latency percentiles and cache statistics as JSON.
+
+    Maps are rendered and encoded by a bounded pool of worker processes, so clients never wait on each other's renders
+    and the event loop only handles sockets. Encoded maps are kept in an LRU cache, concurrent requests for the same
+    map share a single render, and every map has an ETag so clients that poll get `304 Not Modified`.
+
+    Args:
+        treasure_map (Map): Map object of which the background is shared with the workers
+        processes (int, optional): number of worker processes. Defaults to None, which uses all cores.
+        cache_bytes (int, optional): maximum size of the cached responses. Defaults to 64 MiB.
+        max_pending (int, optional): maximum number of renders that are queued or running, further requests get
+            `503 Service Unavailable`. Defaults to None, which is four per worker.
+    """
+    def __init__(self,
+                 treasure_map: Map,
+                 processes: Optional[int] = None,
+                 cache_bytes: int = 64 * 2**20,
+                 max_pending: Optional[int] = None) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.icons = treasure_map.player_position_dependent_icons
+        self.processes = processes
+        self.max_pending = max_pending
+        self.cache = ResponseCache(cache_bytes)
+        self.metrics = FrameProfiler(enabled=True)
+
+        self._shared: Optional[SharedBackground] = None
+        self._pool: Optional[Pool] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._pending: Dict[RenderKey, asyncio.Future] = {}
+
+        # ETags are only valid while the server runs, because the map of a key changes when the icons are edited
+        self._etag_salt = os.urandom(8).hex()
+
+        # statistics
+        self.requests = 0
+        self.renders = 0
+        self.not_modified = 0
+        self.rejected = 0
+        self.status_counts: Dict[int, int] = {}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8000) -> Tuple[str, int]:
+        """start the worker pool and listen for connections. The workers are started first, so they do not inherit the
+        sockets of connections
+
+        Args:
+            host (str, optional): address to listen on, use "0.0.0.0" to serve the local network. Defaults to
+                "127.0.0.1", which only serves this computer.
+            port (int, optional): port to listen on, 0 picks a free port. Defaults to 8000.
+
+        Returns:
+            Tuple[str, int]: address and port that the server listens on
+        """
+        self._shared = SharedBackground(self.treasure_map).__enter__()
+        self._pool = Pool(self.processes, initializer=batch.init_worker,
+                          initargs=self._shared.initargs + ((False,) * len(self.icons),))
+        if self.max_pending is None:
+            self.max_pending = 4 * (self.processes or os.cpu_count())
+
+        self._server = await asyncio.start_server(self.handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self) -> None:
+        """stop listening, and shut down the worker pool and free the shared background"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        if self._shared is not None:
+            self._shared.__exit__()
+
+    def parse_query(self, path: str) -> RenderKey:
+        """determine what to render from the path and query of a request
+
+        Args:
+            path (str): path of the request, e.g. "/map.png?x=0.3&y=0.6"
+
+        Raises:
+            HTTPError: when the path or a parameter is invalid
+
+        Returns:
+            RenderKey: what to render
+        """
+        url = urlsplit(path)
+        name, _, format = url.path.rpartition(".")
+        if name != "/map" or format not in CONTENT_TYPES:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"unknown path '{url.path}', use /map.png, /map.jpg or /map.webp")
+        format = "jpg" if format == "jpeg" else format
+
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            x, y = float(query["x"]), float(query["y"])
+            if not (math.isfinite(x) and math.isfinite(y)):
+                raise ValueError("x and y should be finite numbers")
+            quality = int(query["quality"]) if "quality" in query else None
+            low, high = QUALITY_RANGES[format]
+            if quality is not None and not low <= quality <= high:
+                raise ValueError(f"quality of {format} should be from {low} to {high}")
+            visibility = get_visibility_mask(self.icons, query.get("show", "").split(","))
+        except KeyError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"missing parameter {e}")
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+
+        # coordinates are clamped to the map before they are converted to pixels like Position does, so huge
+        # coordinates do not overflow
+        relative = query.get("absolute", "0") in ("", "0")
+        x = min(max(x * MAP_WIDTH if relative else x, 0.), self.treasure_map.width)
+        y = min(max(y * MAP_HEIGHT if relative else y, 0.), self.treasure_map.height)
+        x, y = (round(x), round(y)) if relative else (int(x), int(y))
+        show_player_icon = query.get("player", "1") not in ("", "0")
+
+        return x, y, visibility, show_player_icon, format, quality
+
+    def get_etag(self, key: RenderKey) -> str:
+        return '"' + hashlib.sha1((self._etag_salt + repr(key)).encode()).hexdigest()[:20] + '"'
+
+    async def render(self, key: RenderKey) -> bytes:
+        """get an encoded map from the cache, or render it in the worker pool. Concurrent requests for the same map
+        wait for the same render
+
+        Args:
+            key (RenderKey): what to render
+
+        Raises:
+            HTTPError: when too many renders are pending
+
+        Returns:
+            bytes: the encoded map
+        """
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        future = self._pending.get(key)
+        if future is None:
+            if len(self._pending) >= self.max_pending:
+                self.rejected += 1
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "too many pending renders, try again later")
+
+            start = time.perf_counter()
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._pool.apply_async(render_encoded, (key,),
+                                   callback=lambda data: loop.call_soon_threadsafe(future.set_result, data),
+                                   error_callback=lambda e: loop.call_soon_threadsafe(future.set_exception, e))
+            future.add_done_callback(lambda future: self._finish_render(key, start, future))
+            self._pending[key] = future
+
+        # the render is shielded, so a client that disconnects does not cancel it for the others
+        return await asyncio.shield(future)
+
+    def _finish_render(self, key: RenderKey, start: float, future: asyncio.Future) -> None:
+        del self._pending[key]
+        if not future.cancelled() and future.exception() is None:
+            self.metrics.record("render", start, time.perf_counter())
+            self.renders += 1
+            self.cache.put(key, future.result())
+
+    def get_metrics(self) -> Dict:
+        """get the latency percentiles and the statistics of the server
+
+        Returns:
+            Dict: latency percentiles in milliseconds per stage, and counters
+        """
+        stats = self.metrics.get_stats()
+        stats.pop("fps")
+        lookups = self.cache.hits + self.cache.misses
+        return {"latency_ms": stats,
+                "requests": self.requests,
+                "status": self.status_counts,
+                "renders": self.renders,
+                "not_modified": self.not_modified,
+                "rejected": self.rejected,
+                "pending": len(self._pending),
+                "cache": {"responses": len(self.cache),
+                          "bytes": self.cache.bytes,
+                          "hit_rate": self.cache.hits / lookups if lookups else 0.}}
+
+    async def handle_request(self, method: str, path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        """handle a single request
+
+        Args:
+            method (str): HTTP method
+            path (str): path and query of the request
+            headers (Dict[str, str]): headers of the request with lowercase names
+
+        Raises:
+            HTTPError: when the request cannot be handled
+
+        Returns:
+            Tuple[int, Dict[str, str], bytes]: status, headers and body of the response
+        """
+        if method not in ("GET", "HEAD"):
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "only GET and HEAD are supported")
+
+        if urlsplit(path).path == "/metrics":
+            return HTTPStatus.OK, {"Content-Type": "application/json"}, json.dumps(self.get_metrics()).encode()
+
+        key = self.parse_query(path)
+        etag = self.get_etag(key)
+        response_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+        # the map of a key never changes while the server runs, so the client's copy is still valid
+        if etag in (tag.strip() for tag in headers.get("if-none-match", "").split(",")):
+            self.not_modified += 1
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+
+        data = await self.render(key)
+        response_headers["Content-Type"] = CONTENT_TYPES[key[4]]
+        return HTTPStatus.OK, response_headers, data
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """handle the requests of a connection until the client closes it
+
+        Args:
+            reader (asyncio.StreamReader): stream of the request
+            writer (asyncio.StreamWriter): stream of the response
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    return
+                except asyncio.LimitOverrunError:
+                    head = None
+
+                start = time.perf_counter()
+                keep_alive = False
+                method = "GET"
+                try:
+                    if head is None or len(head) > MAX_HEADER_BYTES:
+                        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "request head is too large")
+
+                    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                    try:
+                        method, path, version = request_line.split(" ")
+                    except ValueError:
+                        raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line")
+
+                    headers = {}
+                    for line in header_lines:
+                        name, _, value = line.partition(":")
+                        if name:
+                            headers[name.strip().lower()] = value.strip()
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection == "keep-alive" or (version == "HTTP/1.1" and connection != "close")
+
+                    status, response_headers, body = await self.handle_request(method, path, headers)
+                except HTTPError as e:
+                    status, response_headers, body = e.status, {"Content-Type": "text/plain"}, str(e).encode()
+                except Exception as e:
+                    status, response_headers = HTTPStatus.INTERNAL_SERVER_ERROR, {"Content-Type": "text/plain"}
+                    body = f"{type(e).__name__}: {e}".encode()
+
+                self.requests += 1
+                self.status_counts[int(status)] = self.status_counts.get(int(status), 0) + 1
+
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Date"] = formatdate(usegmt=True)
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                lines = [f"HTTP/1.1 {int(status)} {HTTPStatus(status).phrase}"]
+                lines += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+                if method != "HEAD":
+                    writer.write(body)
+                await writer.drain()
+                self.metrics.record("request", start, time.perf_counter())
+
+                if not keep_alive:
+                    return
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
@@ -0,0 +1,299 @@
+import os
+from multiprocessing import Pool
+from typing import List, Optional, Sequence, Tuple
+import cv2
+import numpy as np
+
+from constants import MAP_SIZE, MAP_WIDTH, MAP_HEIGHT
+from .cache import load_cached_array
+from .position import Position
+from .icons import PlayerPositionDependentIcon
+from .trajectory import TrajectoryTable
+
+# number of player positions evaluated at once, which bounds the memory used per chunk
+CHUNK_SIZE = 1 << 16
+
+# grids with fewer positions are evaluated in the calling process, as starting workers would take longer
+MIN_PARALLEL_SIZE = 1 << 21
+
+# state of a worker process, set by init_worker
+_worker_table: Optional[TrajectoryTable] = None
+_worker_x: Optional[np.array] = None
+
+
+def init_worker(table: TrajectoryTable, x: np.array) -> None:
+    """initialize a worker process with the trajectories and the horizontal coordinates of the grid
+
+    Args:
+        table (TrajectoryTable): trajectories of the icons
+        x (np.array): horizontal coordinates of the columns of the grid
+    """
+    global _worker_table, _worker_x
+    _worker_table = table
+    _worker_x = x
+
+
+def evaluate_rows(y: np.array) -> np.array:
+    """evaluate the distances of the icons to their true positions for some rows of the grid in a worker process
+
+    Args:
+        y (np.array): vertical coordinates of the rows
+
+    Returns:
+        np.array: distances in pixels with shape (rows, columns, n_icons)
+    """
+    return evaluate_grid(_worker_table, _worker_x, y)
+
+
+def evaluate_grid(table: TrajectoryTable, x: np.array, y: np.array) -> np.array:
+    """evaluate the distances of the icons to their true positions for every position of the players on a grid, in
+    chunks of at most CHUNK_SIZE positions.
+
+    The angle along a path is the sum of a term of the column and a term of the row, so the sine and cosine over the grid
+    follow from those of the columns and rows with the angle addition formulas, and no trigonometric functions have to 
+    be evaluated per position.
+
+    Args:
+        table (TrajectoryTable): trajectories of the icons
+        x (np.array): horizontal coordinates of the columns of the grid
+        y (np.array): vertical coordinates of the rows of the grid
+
+    Returns:
+        np.array: float32 distances in pixels with shape (rows, columns, n_icons)
+    """
+    column_angle = np.outer(x, table.angle_x) / MAP_WIDTH
+    row_angle = np.outer(y, table.angle_y) / MAP_WIDTH + table.phase
+    cos_x, sin_x = np.cos(column_angle), np.sin(column_angle)
+    cos_y, sin_y = np.cos(row_angle), np.sin(row_angle)
+
+    # offset of the center of each path from the true position
+    center_x = table.center_x - table.target_x
+    center_y = table.center_y - table.target_y
+
+    distances = np.empty((len(y), len(x), len(table)), dtype=np.float32)
+    rows_per_chunk = max(1, CHUNK_SIZE // len(x))
+
+    for start in range(0, len(y), rows_per_chunk):
+        stop = min(start + rows_per_chunk, len(y))
+        cos_row, sin_row = cos_y[start:stop, None], sin_y[start:stop, None]
+
+        dx = (cos_row * cos_x - sin_row * sin_x) * table.radius + center_x
+        dy = (sin_row * cos_x + cos_row * sin_x) * table.radius + center_y
+        distances[start:stop] = np.hypot(dx, dy)
+
+    return distances
+
+
+def get_icon_key(icons: Sequence[PlayerPositionDependentIcon]) -> Tuple:
+    """describe the icons by everything that determines their distances to their true positions, used as cache key
+
+    Args:
+        icons (Sequence[PlayerPositionDependentIcon]): icons on the map
+
+    Returns:
+        Tuple: hashable description of the icons
+    """
+    return tuple((icon.name,
+                  icon.trajectory.radius, icon.trajectory.angle_x, icon.trajectory.angle_y, icon.trajectory.phase,
+                  icon.true_position.x, icon.true_position.y, icon.img_offset.x, icon.img_offset.y)
+                 for icon in icons)
+
+
+class SolutionSpace(object):
+    """Distances of the icons to their true positions for every position of the players on a grid covering the map
+
+    Args:
+        icons (Sequence[PlayerPositionDependentIcon]): icons on the map
+        x (np.array): horizontal coordinates of the columns of the grid
+        y (np.array): vertical coordinates of the rows of the grid
+        distances (np.array): distances in pixels with shape (rows, columns, n_icons)
+    """
+    def __init__(self,
+                 icons: Sequence[PlayerPositionDependentIcon],
+                 x: np.array,
+                 y: np.array,
+                 distances: np.array) -> None:
+        super().__init__()
+
+        self.icons = tuple(icons)
+        self.x = x
+        self.y = y
+        self.distances = distances
+
+    def heatmap(self, icon: PlayerPositionDependentIcon) -> np.array:
+        """get the distances of a single icon to its true position
+
+        Args:
+            icon (PlayerPositionDependentIcon): one of the icons of the solution space
+
+        Returns:
+            np.array: distances in pixels with shape (rows, columns)
+        """
+        return self.distances[..., self.icons.index(icon)]
+
+    def combined(self, selection: Optional[Sequence[bool]] = None) -> np.array:
+        """get the root mean square distance of the selected icons to their true positions
+
+        Args:
+            selection (Sequence[bool], optional): specifies for every icon whether it is included. Defaults to None,
+                which includes all icons.
+
+        Returns:
+            np.array: distances in pixels with shape (rows, columns)
+        """
+        distances = self.distances if selection is None else self.distances[..., np.asarray(selection, dtype=bool)]
+        return np.sqrt(np.mean(np.square(distances, dtype=np.float32), axis=-1))
+
+    def sensitivity(self, heatmap: np.array) -> np.array:
+        """get how fast a distance changes with the position of the players
+
+        Args:
+            heatmap (np.array): distances with shape (rows, columns), such as the combined distances
+
+        Returns:
+            np.array: pixels of change in distance per pixel that the players move, with shape (rows, columns)
+        """
+        step_x = self.x[1] - self.x[0] if len(self.x) > 1 else 1.
+        step_y = self.y[1] - self.y[0] if len(self.y) > 1 else 1.
+        gradient_y, gradient_x = np.gradient(heatmap, step_y, step_x)
+        return np.hypot(gradient_x, gradient_y)
+
+    def best_positions(self, heatmap: np.array, count: int = 5, separation: float = 0.02) -> List[Tuple[Position, float]]:
+        """find the positions of the players with the smallest distances, of which no two are in the same basin
+
+        Args:
+            heatmap (np.array): distances with shape (rows, columns), such as the combined distances
+            count (int, optional): maximum number of positions. Defaults to 5.
+            separation (float, optional): minimum distance between two positions relative to the width of the map.
+                Defaults to 0.02.
+
+        Returns:
+            List[Tuple[Position, float]]: absolute positions of the players and their distances, best first
+        """
+        # local minima are the cells that equal the minimum of their neighbourhood
+        step = self.x[1] - self.x[0] if len(self.x) > 1 else 1.
+        radius = max(1, int(round(separation * MAP_WIDTH / step)))
+        kernel = np.ones((2 * radius + 1, 2 * radius + 1), dtype=np.uint8)
+        heatmap = np.ascontiguousarray(heatmap, dtype=np.float32)
+        is_minimum = heatmap <= cv2.erode(heatmap, kernel, borderType=cv2.BORDER_REPLICATE)
+
+        rows, columns = np.nonzero(is_minimum)
+        order = np.argsort(heatmap[rows, columns], kind="stable")
+
+        best = []
+        for i in order.tolist():
+            position = Position(int(round(self.x[columns[i]])), int(round(self.y[rows[i]])), mode="absolute")
+
+            # plateaus produce several adjacent minima
+            if any(abs(position.x - other.x) <= radius * step and abs(position.y - other.y) <= radius * step
+                   for other, _ in best):
+                continue
+
+            best.append((position, float(heatmap[rows[i], columns[i]])))
+            if len(best) == count:
+                break
+
+        return best
+
+    def sample(self, heatmap: np.array, position: Position) -> float:
+        """get the value of a heatmap at the grid cell closest to a position of the players
+
+        Args:
+            heatmap (np.array): array with shape (rows, columns)
+            position (Position): absolute position of the players
+
+        Returns:
+            float: value of the heatmap
+        """
+        column = int(np.abs(self.x - position.x).argmin())
+        row = int(np.abs(self.y - position.y).argmin())
+        return float(heatmap[row, column])
+
+
+def solve(icons: Sequence[PlayerPositionDependentIcon],
+          columns: int = MAP_WIDTH,
+          rows: int = MAP_HEIGHT,
+          processes: Optional[int] = None,
+          use_cache: bool = True) -> SolutionSpace:
+    """evaluate the distances of all icons to their true positions for every position of the players on a regular grid
+    covering the map. Grids are evaluated in parallel when they are large, and the result is cached on disk.
+
+    Args:
+        icons (Sequence[PlayerPositionDependentIcon]): icons on the map
+        columns (int, optional): number of positions in the horizontal direction. Defaults to MAP_WIDTH.
+        rows (int, optional): number of positions in the vertical direction. Defaults to MAP_HEIGHT.
+        processes (int, optional): number of worker processes. Defaults to None, which uses all cores for large grids.
+        use_cache (bool, optional): specifies whether the on-disk cache is used. Defaults to True.
+
+    Returns:
+        SolutionSpace: the distances for every position on the grid
+    """
+    x = np.linspace(0, MAP_WIDTH, columns)
+    y = np.linspace(0, MAP_HEIGHT, rows)
+    table = TrajectoryTable(icons)
+
+    if processes is None:
+        processes = os.cpu_count() if columns * rows >= MIN_PARALLEL_SIZE else 1
+
+    def build() -> np.array:
+        if processes <= 1:
+            return evaluate_grid(table, x, y)
+
+        rows_per_chunk = max(1, CHUNK_SIZE // columns)
+        chunks = [y[start:start + rows_per_chunk] for start in range(0, rows, rows_per_chunk)]
+        with Pool(processes, initializer=init_worker, initargs=(table, x)) as pool:
+            return np.concatenate(pool.map(evaluate_rows, chunks), axis=0)
+
+    if use_cache:
+        distances = load_cached_array(None, ("solution", MAP_SIZE, columns, rows, get_icon_key(icons)), build)
+    else:
+        distances = build()
+
+    return SolutionSpace(icons, x, y, distances)
+
+
+def colorize(heatmap: np.array, max_distance: float) -> np.array:
+    """colour a distance heatmap, small distances are bright and distances of max_distance and more are dark
+
+    Args:
+        heatmap (np.array): distances with shape (rows, columns)
+        max_distance (float): distance at which the colour scale saturates
+
+    Returns:
+        np.array: RGB image with shape (rows, columns, 3)
+    """
+    levels = (255 * (1 - np.clip(heatmap / max_distance, 0, 1))).astype(np.uint8)
+    return cv2.cvtColor(cv2.applyColorMap(levels, cv2.COLORMAP_VIRIDIS), cv2.COLOR_BGR2RGB)
+
+
+def overlay(background: np.array,
+            heatmap: np.array,
+            max_distance: float,
+            best: Sequence[Tuple[Position, float]] = (),
+            opacity: float = 0.6) -> np.array:
+    """blend a coloured heatmap over the map and mark the best positions of the players
+
+    Args:
+        background (np.array): RGB image of the map
+        heatmap (np.array): distances with shape (rows, columns), resized to the size of the background
+        max_distance (float): distance at which the colour scale saturates
+        best (Sequence[Tuple[Position, float]], optional): positions to mark, best first. Defaults to ().
+        opacity (float, optional): opacity of the heatmap. Defaults to 0.6.
+
+    Returns:
+        np.array: RGB image of the same size as the background
+    """
+    height, width = background.shape[:2]
+    colors = colorize(cv2.resize(heatmap, (width, height), interpolation=cv2.INTER_LINEAR), max_distance)
+    image = cv2.addWeighted(colors, opacity, np.ascontiguousarray(background), 1 - opacity, 0)
+
+    # positions are in map coordinates, the background may have another size
+    scale_x = width / MAP_WIDTH
+    scale_y = height / MAP_HEIGHT
+    for rank, (position, _) in enumerate(best, 1):
+        center = (int(round(position.x * scale_x)), int(round(position.y * scale_y)))
+        cv2.drawMarker(image, center, (255, 0, 0), cv2.MARKER_CROSS, 12, 2)
+        cv2.putText(image, str(rank), (center[0] + 6, center[1] - 6), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 0), 1,
+                    cv2.LINE_AA)
+
+    return image
@@ -0,0 +1,188 @@
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from .generate_map import Map, BBox, RenderState
+from .icons import Icon, PlayerPositionDependentIcon
+from .position import Position
+
+class GridIndex(object):
+    """Uniform grid spatial index of bounding boxes. Every cell of the grid holds the keys of the boxes that overlap it,
+    so finding the boxes at a point only checks the boxes in a single cell. Moving a box only touches the cells it
+    enters or leaves.
+
+    Args:
+        cell_size (int): size of the cells of the grid in pixels, about twice the size of a typical box works well
+    """
+    def __init__(self, cell_size: int) -> None:
+        super().__init__()
+
+        self.cell_size = cell_size
+
+        self._cells: Dict[Tuple[int, int], Set[Hashable]] = {}
+        self._boxes: Dict[Hashable, Tuple[BBox, int]] = {}
+        self._ranges: Dict[Hashable, Tuple[int, int, int, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._boxes)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._boxes
+
+    def _cell_range(self, box: BBox) -> Tuple[int, int, int, int]:
+        left, top, right, bottom = box
+        return (left // self.cell_size, top // self.cell_size,
+                (right - 1) // self.cell_size, (bottom - 1) // self.cell_size)
+
+    def _add_to_cells(self, key: Hashable, cell_range: Tuple[int, int, int, int]) -> None:
+        first_column, first_row, last_column, last_row = cell_range
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                self._cells.setdefault((column, row), set()).add(key)
+
+    def _remove_from_cells(self, key: Hashable, cell_range: Tuple[int, int, int, int]) -> None:
+        first_column, first_row, last_column, last_row = cell_range
+        for row in range(first_row, last_row + 1):
+            for column in range(first_column, last_column + 1):
+                cell = self._cells[(column, row)]
+                cell.discard(key)
+                if not cell:
+                    del self._cells[(column, row)]
+
+    def update(self, key: Hashable, box: BBox, order: int = 0) -> None:
+        """insert a box or move it to a new location
+
+        Args:
+            key (Hashable): key of the box
+            box (BBox): (left, top, right, bottom) of the box
+            order (int, optional): stacking order, boxes with a higher order are on top. Defaults to 0.
+        """
+        cell_range = self._cell_range(box)
+        old_range = self._ranges.get(key)
+
+        if old_range != cell_range:
+            if old_range is not None:
+                self._remove_from_cells(key, old_range)
+            self._add_to_cells(key, cell_range)
+            self._ranges[key] = cell_range
+
+        self._boxes[key] = (box, order)
+
+    def remove(self, key: Hashable) -> None:
+        """remove a box from the index
+
+        Args:
+            key (Hashable): key of the box
+        """
+        self._remove_from_cells(key, self._ranges.pop(key))
+        del self._boxes[key]
+
+    def get_box(self, key: Hashable) -> BBox:
+        """get the box of a key
+
+        Args:
+            key (Hashable): key of the box
+
+        Returns:
+            BBox: (left, top, right, bottom) of the box
+        """
+        return self._boxes[key][0]
+
+    def query_point(self, x: int, y: int) -> List[Hashable]:
+        """find the boxes that contain a point
+
+        Args:
+            x (int): horizontal coordinate of the point
+            y (int): vertical coordinate of the point
+
+        Returns:
+            List[Hashable]: keys of the boxes that contain the point, top-most first
+        """
+        cell = self._cells.get((x // self.cell_size, y // self.cell_size), ())
+
+        hits = []
+        for key in cell:
+            (left, top, right, bottom), order = self._boxes[key]
+            if left <= x < right and top <= y < bottom:
+                hits.append((order, key))
+
+        hits.sort(key=lambda hit: hit[0], reverse=True)
+        return [key for _, key in hits]
+
+
+class IconIndex(object):
+    """Spatial index of the icons that are drawn on a treasure map, for finding the icon under the cursor. The index is
+    refreshed with the positions of the icons for a position of the players, which only moves the icons that moved.
+
+    Args:
+        treasure_map (Map): Map object that determines which icons are drawn where
+        cell_size (int): size of the cells of the grid in pixels
+    """
+    def __init__(self, treasure_map: Map, cell_size: int) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.grid = GridIndex(cell_size)
+
+        self._positions: Dict[Icon, Position] = {}
+        self._state = None
+
+        # hidden location of every icon that is drawn for one
+        self._owners: Dict[Icon, PlayerPositionDependentIcon] = {}
+        for icon in treasure_map.player_position_dependent_icons:
+            self._owners[icon] = icon
+            self._owners[icon.true_position_icon] = icon
+
+    def refresh(self, state: RenderState) -> None:
+        """update the index with the positions of the icons in a render state. Does nothing if neither the position of
+        the players nor the visible icons changed since the previous refresh
+
+        Args:
+            state (RenderState): position of the players and visibility of the icons
+        """
+        if state == self._state:
+            return
+        self._state = state
+
+        positions = {}
+        for order, (icon, position) in enumerate(self.treasure_map.get_draw_list(state)):
+            positions[icon] = position
+            box = self.treasure_map.icon_bbox(icon, position)
+            if box is None:
+                if icon in self.grid:
+                    self.grid.remove(icon)
+            else:
+                self.grid.update(icon, box, order)
+
+        # icons that are no longer drawn
+        for icon in self._positions.keys() - positions.keys():
+            if icon in self.grid:
+                self.grid.remove(icon)
+        self._positions = positions
+
+    def icon_at(self, position: Position) -> Optional[Icon]:
+        """find the top-most icon of a hidden location at a position on the map. Transparent parts of icons are ignored,
+        and so is the player icon, which is drawn on top of the runes but does not belong to a hidden location
+
+        Args:
+            position (Position): absolute position on the map
+
+        Returns:
+            Optional[Icon]: the icon, or None if there is no icon of a hidden location at the position
+        """
+        for icon in self.grid.query_point(position.x, position.y):
+            if icon not in self._owners:
+                continue
+            variant, icon_position = icon.snap(self._positions[icon])
+            if variant.alpha[position.y - icon_position.y, position.x - icon_position.x, 0] > 0.5:
+                return icon
+        return None
+
+    def owner(self, icon: Icon) -> Optional[PlayerPositionDependentIcon]:
+        """find the hidden location that an icon belongs to
+
+        Args:
+            icon (Icon): icon on the map, either a position dependent icon or the icon of its true position
+
+        Returns:
+            Optional[PlayerPositionDependentIcon]: the position dependent icon, or None for the player icon
+        """
+        return self._owners.get(icon)
@@ -0,0 +1,245 @@
+import threading
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+
+from .cache import load_cached_array
+
+SpriteKey = Tuple[str, Tuple[int, int], bool, bool, Tuple[float, float]]
+
+def shift_pixels(image: np.array, alpha: np.array, shift: Tuple[float, float]) -> Tuple[np.array, np.array]:
+    """shift an RGBA image by a fraction of a pixel with bilinear interpolation of the premultiplied colours. The image
+    grows by a pixel in the directions in which it is shifted
+
+    Args:
+        image (np.array): RGB image
+        alpha (np.array): alpha channel with shape (height, width, 1)
+        shift (Tuple[float, float]): (x, y) shift on the interval [0, 1)
+
+    Returns:
+        Tuple[np.array, np.array]: the shifted RGB image and alpha channel
+    """
+    dx, dy = shift
+    height, width = alpha.shape[:2]
+    rgba = np.concatenate((image * (alpha / 255), alpha), axis=2)
+
+    shifted = np.zeros((height + 1, width + 1, 4))
+    shifted[:height, :width] += (1 - dx) * (1 - dy) * rgba
+    shifted[:height, 1:] += dx * (1 - dy) * rgba
+    shifted[1:, :width] += (1 - dx) * dy * rgba
+    shifted[1:, 1:] += dx * dy * rgba
+    shifted = shifted[:height + (dy > 0), :width + (dx > 0)]
+
+    alpha = np.round(shifted[:, :, 3:4]).astype(np.uint8)
+    image = np.divide(shifted[:, :, 0:3] * 255, alpha, out=np.zeros(shifted[:, :, 0:3].shape), where=alpha > 0)
+    return np.clip(np.round(image), 0, 255).astype(np.uint8), alpha
+
+
+class Sprite(object):
+    """Decoded and resized image of an icon together with the arrays used to composite it. All arrays are read-only, so
+    a sprite is shared by every icon that uses the same image, size and variant. Use SpriteRegistry.get to obtain one.
+
+    Args:
+        path (str): path to the image
+        size (Tuple[int, int]): (width, height) of the sprite in pixels
+        negative (bool): specifies whether the colours are inverted
+        binarize_alpha (bool): specifies whether partially transparent pixels are made fully transparent
+        shift (Tuple[float, float], optional): (x, y) fraction of a pixel by which the image is shifted to the right and
+            down, see shift_pixels. Defaults to (0., 0.).
+        unshifted (Sprite, optional): the same sprite without a shift, of which the pixels are shifted instead of
+            loading the image again. Defaults to None.
+    """
+    def __init__(self, 
+                 path: str, 
+                 size: Tuple[int, int], 
+                 negative: bool, 
+                 binarize_alpha: bool, 
+                 shift: Tuple[float, float] = (0., 0.),
+                 unshifted: Optional["Sprite"] = None) -> None:
+        super().__init__()
+
+        self.path = path
+        self.size = size
+        self.shift = shift
+
+        if unshifted is None:
+            img = load_cached_array(path, ("icon", size), lambda:
+                cv2.resize(cv2.imread(path, cv2.IMREAD_UNCHANGED), size, interpolation=cv2.INTER_AREA))
+            alpha = img[:, :, 3:4]
+            if binarize_alpha:
+                alpha = (alpha // 255) * 255
+            image = img[:, :, 0:3]
+
+            if negative:
+                image = (255 - image)
+        else:
+            image, alpha = unshifted.image, unshifted.rgba[:, :, 3:4]
+
+        if shift != (0., 0.):
+            image, alpha = shift_pixels(image, alpha, shift)
+
+        self.alpha = alpha / 255
+        self.image = image
+
+        # choose the compositing strategy once, based on the alpha channel of the sprite
+        self.mask = None
+        self.premultiplied = None
+        self.inverse_weight = None
+        if np.isin(alpha, (0, 255)).all():
+            self.compositing = "mask"
+            self.mask = alpha == 255
+        else:
+            # fixed point weights on the interval [0, 256], so blending only needs a shift instead of a division
+            self.compositing = "blend"
+            weight = alpha.astype(np.uint16) + (alpha >> 7)
+            self.inverse_weight = 256 - weight
+            self.premultiplied = self.image * weight
+
+        self.rgba = np.concatenate((self.image, alpha), axis=2)
+        for array in (self.alpha, self.image, self.mask, self.premultiplied, self.inverse_weight, self.rgba):
+            if array is not None:
+                array.flags.writeable = False
+
+
+class ScratchBuffer(threading.local):
+    """Buffer for the intermediate results of blending, of which every thread has its own, so icons that share a sprite
+    can be drawn by several threads at once. It grows to the largest region drawn by the thread
+    """
+    def __init__(self) -> None:
+        super().__init__()
+
+        self.array = np.empty((0, 0, 3), dtype=np.uint16)
+
+    def get(self, shape: Tuple[int, int, int]) -> np.array:
+        """get a view on the buffer of this thread
+
+        Args:
+            shape (Tuple[int, int, int]): shape of the view
+
+        Returns:
+            np.array: uninitialized uint16 view with the shape
+        """
+        if any(size > available for size, available in zip(shape, self.array.shape)):
+            self.array = np.empty(np.maximum(shape, self.array.shape), dtype=np.uint16)
+        return self.array[:shape[0], :shape[1], :shape[2]]
+
+
+class Atlas(object):
+    """Single array holding the RGBA images of many sprites side by side
+
+    Args:
+        image (np.array): RGBA atlas with shape (height, width, 4)
+        rects (Dict[SpriteKey, Tuple[int, int, int, int]]): (left, top, width, height) of every sprite in the atlas
+    """
+    def __init__(self, image: np.array, rects: Dict[SpriteKey, Tuple[int, int, int, int]]) -> None:
+        super().__init__()
+
+        self.image = image
+        self.rects = rects
+
+    def get(self, key: SpriteKey) -> np.array:
+        """get the part of the atlas that holds a sprite
+
+        Args:
+            key (SpriteKey): key of the sprite, see SpriteRegistry.get_key
+
+        Returns:
+            np.array: RGBA view on the atlas
+        """
+        left, top, width, height = self.rects[key]
+        return self.image[top:top + height, left:left + width]
+
+
+class SpriteRegistry(object):
+    """Registry that decodes and resizes every distinct sprite once and shares it between all icons that use it, so the
+    memory and time used to load icons scale with the number of distinct images instead of the number of icons
+    """
+    def __init__(self) -> None:
+        super().__init__()
+
+        self._sprites: Dict[SpriteKey, Sprite] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sprites)
+
+    @staticmethod
+    def get_key(path: str, 
+                size: Tuple[int, int], 
+                negative: bool = False, 
+                binarize_alpha: bool = True, 
+                shift: Tuple[float, float] = (0., 0.)) -> SpriteKey:
+        return path, tuple(size), negative, binarize_alpha, tuple(shift)
+
+    def get(self, 
+            path: str, 
+            size: Tuple[int, int], 
+            negative: bool = False, 
+            binarize_alpha: bool = True, 
+            shift: Tuple[float, float] = (0., 0.)) -> Sprite:
+        """get the sprite of an image, which is loaded the first time it is requested
+
+        Args:
+            path (str): path to the image
+            size (Tuple[int, int]): (width, height) of the sprite in pixels
+            negative (bool, optional): specifies whether the colours are inverted. Defaults to False.
+            binarize_alpha (bool, optional): specifies whether partially transparent pixels are made fully transparent.
+                Defaults to True.
+            shift (Tuple[float, float], optional): (x, y) fraction of a pixel by which the image is shifted. Defaults
+                to (0., 0.).
+
+        Returns:
+            Sprite: the shared sprite
+        """
+        key = self.get_key(path, size, negative, binarize_alpha, shift)
+        sprite = self._sprites.get(key)
+        if sprite is None:
+            # shifted variants are derived from the unshifted sprite
+            unshifted = None if tuple(shift) == (0., 0.) else self.get(path, size, negative, binarize_alpha)
+            with self._lock:
+                sprite = self._sprites.get(key)
+                if sprite is None:
+                    sprite = self._sprites[key] = Sprite(path, tuple(size), negative, binarize_alpha, tuple(shift), 
+                                                         unshifted)
+        return sprite
+
+    def build_atlas(self, max_width: int = 1024) -> Atlas:
+        """pack the RGBA images of all sprites into a single atlas, in rows of sprites sorted by height
+
+        Args:
+            max_width (int, optional): maximum width of the atlas, wider sprites get a row of their own. Defaults to
+                1024.
+
+        Returns:
+            Atlas: the atlas
+        """
+        with self._lock:
+            sprites = sorted(self._sprites.items(), key=lambda item: item[1].rgba.shape[0], reverse=True)
+
+        # shelf packing: fill rows from left to right, a row is as high as its first (highest) sprite
+        rects = {}
+        left = top = row_height = width = 0
+        for key, sprite in sprites:
+            height, sprite_width = sprite.rgba.shape[:2]
+            if left > 0 and left + sprite_width > max_width:
+                top += row_height
+                left = row_height = 0
+            rects[key] = (left, top, sprite_width, height)
+            left += sprite_width
+            row_height = max(row_height, height)
+            width = max(width, left)
+
+        image = np.zeros((top + row_height, width, 4), dtype=np.uint8)
+        atlas = Atlas(image, rects)
+        for key, sprite in sprites:
+            atlas.get(key)[:] = sprite.rgba
+        image.flags.writeable = False
+
+        return atlas
+
+
+# registry used by all icons
+SPRITES = SpriteRegistry()
+
+# scratch buffers used by all icons and compositing backends
+SCRATCH = ScratchBuffer()
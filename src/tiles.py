@@ -0,0 +1,155 @@
+from math import ceil
+from typing import Iterator, List, Tuple
+import cv2
+import numpy as np
+
+from constants import get_map_size
+from .cache import load_cached_chunks
+
+TILE_SIZE = 256
+
+class TilePyramid(object):
+    """Multi-resolution pyramid of a map image, split into square tiles. Level 0 is the full resolution image and every
+    next level halves the resolution. The levels are built once and stored in the on-disk cache, from which they are
+    memory-mapped, so only the tiles that are actually viewed are loaded into memory. The levels are built and written
+    to the cache a row of tiles at a time. Only the map image itself is decoded as a whole, because a JPEG image can
+    not be decoded in parts.
+
+    Args:
+        map_path (str): path to the full resolution map image
+        min_scale (float): smallest scale, relative to the full resolution, at which the map is viewed. Levels are
+            built until this scale is covered.
+    """
+    def __init__(self, map_path: str, min_scale: float) -> None:
+        super().__init__()
+
+        self.map_path = map_path
+        self.width, self.height = get_map_size(map_path, 1)
+
+        # size of every level, halving until the coarsest level is at or below the smallest viewed scale
+        self.sizes = [(self.width, self.height)]
+        while 0.5 ** len(self.sizes) > min_scale / 2 and min(self.sizes[-1]) > 1:
+            w, h = self.sizes[-1]
+            self.sizes.append((max(1, w // 2), max(1, h // 2)))
+
+        self.levels: List[np.array] = []
+        for level in range(len(self.sizes)):
+            self.levels.append(load_cached_chunks(map_path, ("tiles", TILE_SIZE, level), self.get_shape(level),
+                                                  np.uint8, lambda: self._build_level(level)))
+
+    def get_shape(self, level: int) -> Tuple[int, int, int, int, int]:
+        """get the shape of the tiles of a level
+
+        Args:
+            level (int): level of the pyramid
+
+        Returns:
+            Tuple[int, int, int, int, int]: (tile rows, tile columns, TILE_SIZE, TILE_SIZE, 3)
+        """
+        width, height = self.sizes[level]
+        return ceil(height / TILE_SIZE), ceil(width / TILE_SIZE), TILE_SIZE, TILE_SIZE, 3
+
+    def _build_level(self, level: int) -> Iterator[np.array]:
+        """build the tiles of a level a row of tiles at a time. Level 0 is cut from the map image, every next level is
+        downsampled from the level before, of which two rows of tiles are read at a time
+
+        Args:
+            level (int): level of the pyramid
+
+        Returns:
+            Iterator[np.array]: rows of tiles with shape (1, tile columns, TILE_SIZE, TILE_SIZE, 3)
+        """
+        width, height = self.sizes[level]
+        if level == 0:
+            image = cv2.imread(self.map_path)
+            for top in range(0, height, TILE_SIZE):
+                yield tile(cv2.cvtColor(image[top:top + TILE_SIZE], cv2.COLOR_BGR2RGB))
+            return
+
+        # every pixel is the mean of a block of 2x2 pixels of the level before, so rows of tiles are built independently
+        parent = self.levels[level - 1]
+        parent_width = self.sizes[level - 1][0]
+        for row in range(ceil(height / TILE_SIZE)):
+            rows = min(TILE_SIZE, height - row * TILE_SIZE)
+            strip = untile(parent[2 * row:2 * row + 2], parent_width, 2 * rows)[:, :2 * width]
+            yield tile(cv2.resize(strip, (width, rows), interpolation=cv2.INTER_AREA))
+
+    def get_level(self, scale: float) -> int:
+        """get the coarsest level that still has at least the requested resolution
+
+        Args:
+            scale (float): scale relative to the full resolution
+
+        Returns:
+            int: level of the pyramid
+        """
+        level = 0
+        while level + 1 < len(self.levels) and 0.5 ** (level + 1) >= scale:
+            level += 1
+        return level
+
+    def get_region(self, level: int, left: int, top: int, right: int, bottom: int) -> np.array:
+        """assemble a region of a level from its tiles. Parts of the region outside of the map are black
+
+        Args:
+            level (int): level of the pyramid
+            left (int): left bound in pixels on the level
+            top (int): top bound in pixels on the level
+            right (int): right bound in pixels on the level
+            bottom (int): bottom bound in pixels on the level
+
+        Returns:
+            np.array: RGB image of the region with shape (bottom - top, right - left, 3)
+        """
+        tiles = self.levels[level]
+        width, height = self.sizes[level]
+        region = np.zeros((bottom - top, right - left, 3), dtype=np.uint8)
+
+        for row in range(max(0, top // TILE_SIZE), min(ceil(bottom / TILE_SIZE), tiles.shape[0])):
+            for column in range(max(0, left // TILE_SIZE), min(ceil(right / TILE_SIZE), tiles.shape[1])):
+                # intersection of the tile with the region, in pixels on the level
+                tile_left, tile_top = column * TILE_SIZE, row * TILE_SIZE
+                x0, x1 = max(left, tile_left), min(right, tile_left + TILE_SIZE, width)
+                y0, y1 = max(top, tile_top), min(bottom, tile_top + TILE_SIZE, height)
+                if x0 >= x1 or y0 >= y1:
+                    continue
+
+                region[y0 - top:y1 - top, x0 - left:x1 - left] = \
+                    tiles[row, column, y0 - tile_top:y1 - tile_top, x0 - tile_left:x1 - tile_left]
+
+        return region
+
+
+def tile(image: np.array) -> np.array:
+    """split an image into square tiles, padding the last row and column of tiles with black
+
+    Args:
+        image (np.array): image with shape (H, W, C)
+
+    Returns:
+        np.array: tiles with shape (tile rows, tile columns, TILE_SIZE, TILE_SIZE, C)
+    """
+    h, w, c = image.shape
+    rows, columns = ceil(h / TILE_SIZE), ceil(w / TILE_SIZE)
+
+    padded = np.zeros((rows * TILE_SIZE, columns * TILE_SIZE, c), dtype=image.dtype)
+    padded[:h, :w] = image
+
+    return np.ascontiguousarray(padded.reshape(rows, TILE_SIZE, columns, TILE_SIZE, c).swapaxes(1, 2))
+
+
+def untile(tiles: np.array, width: int, height: int) -> np.array:
+    """reassemble an image from its tiles
+
+    Args:
+        tiles (np.array): tiles with shape (tile rows, tile columns, TILE_SIZE, TILE_SIZE, C)
+        width (int): width of the image
+        height (int): height of the image
+
+    Returns:
+        np.array: image with shape (height, width, C)
+    """
+    rows, columns, _, _, c = tiles.shape
+    image = np.asarray(tiles).swapaxes(1, 2).reshape(rows * TILE_SIZE, columns * TILE_SIZE, c)
+
+    return np.ascontiguousarray(image[:height, :width])
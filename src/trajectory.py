@@ -0,0 +1,160 @@
+from typing import Sequence
+from math import sin, cos
+import numpy as np
+
+from constants import MAP_WIDTH
+from .position import Position
+
+class Trajectory(object):
+    """Declarative description of the circular path along which an icon moves with the position of the players.
+
+    The angle along the circle is a linear function of the position of the players:
+        angle = (angle_x * x + angle_y * y) / MAP_WIDTH + phase
+
+    Args:
+        radius (float): radius of the circle, relative to the width of the map
+        angle_x (float, optional): coefficient of the horizontal position of the players in the angle. Defaults to 0.
+        angle_y (float, optional): coefficient of the vertical position of the players in the angle. Defaults to 0.
+        phase (float, optional): constant term of the angle. Defaults to 0.
+    """
+    def __init__(self, radius: float, angle_x: float = 0., angle_y: float = 0., phase: float = 0.) -> None:
+        super().__init__()
+
+        self.radius = radius
+        self.angle_x = angle_x
+        self.angle_y = angle_y
+        self.phase = phase
+
+    def get_radius(self, position: Position) -> float:
+        """radius of the displacement circle in pixels
+
+        Args:
+            position (Position): position of the players
+
+        Returns:
+            float: radius of the circle
+        """
+        return MAP_WIDTH * self.radius
+
+    def get_angle(self, position: Position) -> float:
+        """angle along the displacement circle
+
+        Args:
+            position (Position): position of the players
+
+        Returns:
+            float: angle in radians
+        """
+        return (self.angle_x * position.x + self.angle_y * position.y) / MAP_WIDTH + self.phase
+
+    def get_center(self, true_position: Position, treasure_position: Position) -> Position:
+        """calculate the center of the circle, such that the path passes the true position when the players are at the
+        treasure position
+
+        Args:
+            true_position (Position): true position of the hidden location
+            treasure_position (Position): position of the treasure
+
+        Returns:
+            Position: center of the displacement circle
+        """
+        radius = self.get_radius(treasure_position)
+        angle  = self.get_angle(treasure_position)
+
+        return Position(true_position.x - radius * cos(angle), true_position.y - radius * sin(angle), mode="absolute")
+
+
+class TrajectoryTable(object):
+    """Struct-of-arrays representation of the trajectories of a set of PlayerPositionDependentIcons, which evaluates the
+    positions of all icons for one or many positions of the players in a single vectorized pass.
+
+    The icons themselves are not pickled, so a table can be sent to worker processes cheaply.
+
+    Args:
+        icons (Sequence[PlayerPositionDependentIcon]): icons of which the trajectories are evaluated
+    """
+    def __init__(self, icons: Sequence["PlayerPositionDependentIcon"]) -> None:
+        super().__init__()
+
+        self.icons = tuple(icons)
+
+        self.radius   = np.array([MAP_WIDTH * icon.trajectory.radius for icon in self.icons], dtype=np.float64)
+        self.angle_x  = np.array([icon.trajectory.angle_x for icon in self.icons], dtype=np.float64)
+        self.angle_y  = np.array([icon.trajectory.angle_y for icon in self.icons], dtype=np.float64)
+        self.phase    = np.array([icon.trajectory.phase for icon in self.icons], dtype=np.float64)
+        self.center_x = np.array([icon.center_position.x for icon in self.icons], dtype=np.float64)
+        self.center_y = np.array([icon.center_position.y for icon in self.icons], dtype=np.float64)
+        self.offset_x = np.array([icon.img_offset.x for icon in self.icons], dtype=np.int64)
+        self.offset_y = np.array([icon.img_offset.y for icon in self.icons], dtype=np.int64)
+
+        # points on the paths that the icons pass when the players are at the treasure position
+        self.target_x = np.array([icon.true_position.x - icon.img_offset.x for icon in self.icons], dtype=np.float64)
+        self.target_y = np.array([icon.true_position.y - icon.img_offset.y for icon in self.icons], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.radius)
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["icons"] = ()
+        return state
+
+    def positions_on_path(self, player_positions: np.array) -> np.array:
+        """calculate the exact positions of the icons on their paths, before rounding and the image offset
+
+        Args:
+            player_positions (np.array): absolute (x, y) position of the players with shape (2,), or N positions with
+                shape (N, 2)
+
+        Returns:
+            np.array: float positions with shape (n_icons, 2) for a single position of the players, or (N, n_icons, 2) 
+                for N positions
+        """
+        player_positions = np.asarray(player_positions, dtype=np.float64)
+        x = player_positions[..., 0:1]
+        y = player_positions[..., 1:2]
+
+        angle = (self.angle_x * x + self.angle_y * y) / MAP_WIDTH + self.phase
+
+        positions = np.empty(angle.shape + (2,), dtype=np.float64)
+        positions[..., 0] = self.radius * np.cos(angle) + self.center_x
+        positions[..., 1] = self.radius * np.sin(angle) + self.center_y
+
+        return positions
+
+    def distances_to_true_positions(self, player_positions: np.array) -> np.array:
+        """calculate how far the icons are from their true positions
+
+        Args:
+            player_positions (np.array): absolute (x, y) position of the players with shape (2,), or N positions with
+                shape (N, 2)
+
+        Returns:
+            np.array: distances in pixels with shape (n_icons,) for a single position of the players, or (N, n_icons)
+                for N positions
+        """
+        positions = self.positions_on_path(player_positions)
+        return np.hypot(positions[..., 0] - self.target_x, positions[..., 1] - self.target_y)
+
+    def positions_on_map(self, player_positions: np.array, phases: int = 1) -> np.array:
+        """calculate the positions on the map where the icons should be drawn
+
+        Args:
+            player_positions (np.array): absolute (x, y) position of the players with shape (2,), or N positions with
+                shape (N, 2) such as a PositionArray
+            phases (int, optional): number of positions per pixel at which the icons can be drawn. Defaults to 1.
+
+        Returns:
+            np.array: positions of the top-left corners of the icons with shape (n_icons, 2) for a single position of
+                the players, or (N, n_icons, 2) for N positions. Integers for a single phase, multiples of 1 / phases
+                otherwise
+        """
+        positions = self.positions_on_path(player_positions)
+        if phases == 1:
+            positions = np.floor(positions).astype(np.int64)
+        else:
+            positions = np.floor(positions * phases) / phases
+        positions[..., 0] += self.offset_x
+        positions[..., 1] += self.offset_y
+
+        return positions
@@ -1,21 +1,89 @@
+import os
+import threading
 from os import path
+from typing import Dict
 
-def generate_filename(fn: str, suffix: str) -> str:
-    """recursively generate a unique filename
+# next free suffix of every file name that has been reserved before, so repeated exports do not probe again
+_next_suffix: Dict[str, int] = {}
+_suffix_lock = threading.Lock()
+
+
+def _suffixed(fn: str, suffix: int) -> str:
+    name, ext = path.splitext(fn)
+    return name + " (" + str(suffix) + ")" + ext
+
+
+def _find_free_suffix(fn: str, suffix: int) -> int:
+    """find a suffix for which the suffixed file name does not exist, assuming the existing suffixes are consecutive.
+    Uses a galloping search, so it takes a logarithmic number of probes in the number of existing files
+
+    Args:
+        fn (str): file name
+        suffix (int): first suffix that is tried
+
+    Returns:
+        int: the first free suffix
+    """
+    if not path.exists(_suffixed(fn, suffix)):
+        return suffix
+
+    # double the step until a free suffix is found, then bisect between the last taken and the free suffix
+    taken, step = suffix, 1
+    while path.exists(_suffixed(fn, taken + step)):
+        taken += step
+        step *= 2
+    free = taken + step
+
+    while free - taken > 1:
+        middle = (taken + free) // 2
+        if path.exists(_suffixed(fn, middle)):
+            taken = middle
+        else:
+            free = middle
+
+    return free
+
+
+def generate_filename(fn: str, suffix: int) -> str:
+    """generate a unique filename, by adding the first free suffix of the form " (suffix)" if the file name exists
 
     Args:
         fn (str): file name
-        suffix (str): suffix that will increment to generate a unique file name
+        suffix (int): suffix that will increment to generate a unique file name
 
     Returns:
         str: file name that is unique
     """
-    if path.exists(fn):
-        fn, ext = path.splitext(fn)
-        unique_fn = fn + " (" + str(suffix) + ")" + ext
-        if path.exists(unique_fn):
-            unique_fn = generate_filename(fn + ext, suffix + 1)
-    else:
+    if not path.exists(fn):
         return fn
-    
-    return unique_fn
\ No newline at end of file
+
+    return _suffixed(fn, _find_free_suffix(fn, suffix))
+
+
+def reserve_filename(fn: str) -> str:
+    """generate a unique filename like generate_filename and atomically create the (empty) file, so concurrent exports
+    never get the same name. The next free suffix is remembered, so reserving a name usually takes a single probe
+
+    Args:
+        fn (str): file name
+
+    Returns:
+        str: name of the created file
+    """
+    with _suffix_lock:
+        suffix = _next_suffix.get(fn)
+        while True:
+            if suffix is None:
+                candidate = fn
+            else:
+                candidate = _suffixed(fn, suffix)
+
+            try:
+                os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            except FileExistsError:
+                # taken by another program, or the names have gaps
+                suffix = 0 if suffix is None else _find_free_suffix(fn, suffix + 1)
+                continue
+
+            _next_suffix[fn] = 0 if suffix is None else suffix + 1
+            return candidate
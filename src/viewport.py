@@ -0,0 +1,191 @@
+from math import floor, ceil
+from typing import Dict, Optional, Tuple
+import cv2
+import numpy as np
+
+from constants import get_map_size
+from .generate_map import FrameBuffer, Map, RenderState
+from .icons import Icon
+from .position import Position
+from .tiles import TilePyramid
+
+View = Tuple[float, float, float]
+
+class Viewport(object):
+    """Zoom and pan state of the map widget. The zoom is the number of pixels on the screen per pixel of the full
+    resolution map and the origin is the pixel of the full resolution map in the top-left corner of the view.
+    At the minimal zoom the whole map fits the view, which is exactly the map that Map renders.
+
+    Args:
+        map_path (str): path to the full resolution map image
+        view_size (Tuple[int, int]): (width, height) of the view in pixels, equal to the size of the rendered map
+        max_zoom (float): maximal number of pixels on the screen per pixel of the full resolution map
+    """
+    def __init__(self, map_path: str, view_size: Tuple[int, int], max_zoom: float) -> None:
+        super().__init__()
+
+        self.source_size = get_map_size(map_path, 1)
+        self.view_size = view_size
+
+        self.min_zoom = view_size[0] / self.source_size[0]
+        self.max_zoom = max(max_zoom, self.min_zoom)
+
+        self.zoom = self.min_zoom
+        self.x = 0.
+        self.y = 0.
+
+    @property
+    def is_fit(self) -> bool:
+        """bool: True if the whole map is in view"""
+        return self.zoom <= self.min_zoom
+
+    def get_view(self) -> View:
+        """get an immutable copy of the zoom and origin of the view
+
+        Returns:
+            View: (zoom, x, y)
+        """
+        return self.zoom, self.x, self.y
+
+    def zoom_at(self, screen_x: float, screen_y: float, factor: float) -> None:
+        """zoom in or out, keeping the point under the cursor in place
+
+        Args:
+            screen_x (float): x coordinate of the cursor in the view
+            screen_y (float): y coordinate of the cursor in the view
+            factor (float): factor by which the zoom is multiplied
+        """
+        # point on the full resolution map under the cursor
+        source_x = self.x + screen_x / self.zoom
+        source_y = self.y + screen_y / self.zoom
+
+        self.zoom = min(max(self.zoom * factor, self.min_zoom), self.max_zoom)
+        self.x = source_x - screen_x / self.zoom
+        self.y = source_y - screen_y / self.zoom
+        self._clamp()
+
+    def pan(self, dx: float, dy: float) -> None:
+        """move the view along with a drag of the cursor
+
+        Args:
+            dx (float): horizontal movement of the cursor in pixels on the screen
+            dy (float): vertical movement of the cursor in pixels on the screen
+        """
+        self.x -= dx / self.zoom
+        self.y -= dy / self.zoom
+        self._clamp()
+
+    def _clamp(self) -> None:
+        """keep the view on the map"""
+        self.x = min(max(self.x, 0.), max(0., self.source_size[0] - self.view_size[0] / self.zoom))
+        self.y = min(max(self.y, 0.), max(0., self.source_size[1] - self.view_size[1] / self.zoom))
+
+    def to_map(self, screen_x: float, screen_y: float) -> Position:
+        """convert a point in the view to a position on the map that Map renders
+
+        Args:
+            screen_x (float): x coordinate in the view
+            screen_y (float): y coordinate in the view
+
+        Returns:
+            Position: absolute position on the map
+        """
+        return Position(int((self.x + screen_x / self.zoom) * self.min_zoom),
+                        int((self.y + screen_y / self.zoom) * self.min_zoom),
+                        mode="absolute")
+
+
+class ViewportRenderer(object):
+    """Renders the part of the treasure map that is in view from a tile pyramid of the full resolution map, with the
+    icons drawn at the level of detail of the zoom. The pyramid is built the first time a view is rendered.
+
+    Args:
+        treasure_map (Map): Map object that determines which icons are drawn where
+        view_size (Tuple[int, int]): (width, height) of the view in pixels
+    """
+    def __init__(self, treasure_map: Map, view_size: Tuple[int, int]) -> None:
+        super().__init__()
+
+        self.treasure_map = treasure_map
+        self.view_size = view_size
+        self.source_size = get_map_size(treasure_map.map_path, 1)
+
+        # scale of the map that Map renders relative to the full resolution map
+        self.map_scale = treasure_map.background.shape[1] / self.source_size[0]
+
+        self._pyramid: Optional[TilePyramid] = None
+        self._icons: Dict[Tuple[int, int], Icon] = {}
+
+    @property
+    def pyramid(self) -> TilePyramid:
+        """TilePyramid: tile pyramid of the full resolution map"""
+        if self._pyramid is None:
+            self._pyramid = TilePyramid(self.treasure_map.map_path, self.map_scale)
+        return self._pyramid
+
+    def get_icon(self, icon: Icon, scale: float) -> Icon:
+        """get a (cached) copy of an icon, scaled relative to its size on the map that Map renders
+
+        Args:
+            icon (Icon): icon as drawn by Map
+            scale (float): scale of the view relative to the map that Map renders
+
+        Returns:
+            Icon: scaled icon
+        """
+        size = max(1, round(icon.size[0] * scale))
+        if size == icon.size[0]:
+            return icon
+
+        key = (id(icon), size)
+        scaled_icon = self._icons.get(key)
+        if scaled_icon is None:
+            scaled_icon = Icon(icon.name, icon.image_path, icon.img_offset, icon.use_negative_image, icon.binarize_alpha, size)
+            self._icons[key] = scaled_icon
+
+        return scaled_icon
+
+    def render(self, view: View, state: RenderState, out: Optional[FrameBuffer] = None) -> np.array:
+        """render the part of the treasure map that is in view
+
+        Args:
+            view (View): (zoom, x, y) of the view, see Viewport
+            state (RenderState): position of the players on the map that Map renders and visibility of the icons, of
+                which the scale is replaced by the zoom of the view
+            out (FrameBuffer, optional): buffer that the view is drawn into. Defaults to None, which uses a new array.
+
+        Returns:
+            np.array: RGB image of the view
+        """
+        zoom, x, y = view
+        view_width, view_height = self.view_size
+
+        # region of the pyramid level that covers the view, with a margin for the interpolation
+        level = self.pyramid.get_level(zoom)
+        level_scale = self.pyramid.sizes[level][0] / self.pyramid.width
+        scale = zoom / level_scale
+        left, top = x * level_scale, y * level_scale
+        region_left, region_top = floor(left) - 1, floor(top) - 1
+        region_right = ceil(left + view_width / scale) + 1
+        region_bottom = ceil(top + view_height / scale) + 1
+        region = self.pyramid.get_region(level, region_left, region_top, region_right, region_bottom)
+
+        transform = np.array([[scale, 0, (region_left - left) * scale],
+                              [0, scale, (region_top - top) * scale]])
+        dst = None
+        if out is not None:
+            # the buffer no longer holds a frame of Map, so the next incremental render into it redraws it fully
+            out.reserve((view_height, view_width, region.shape[2]), region.dtype)
+            out.invalidate()
+            dst = out.image
+        frame = cv2.warpAffine(region, transform, self.view_size, dst=dst, flags=cv2.INTER_LINEAR)
+
+        # draw the icons at the level of detail of the view
+        icon_scale = zoom / self.map_scale
+        for icon, position in self.treasure_map.get_draw_list(state):
+            view_position = Position(round(position.x * icon_scale - x * zoom),
+                                     round(position.y * icon_scale - y * zoom),
+                                     mode="absolute")
+            self.treasure_map.draw_icon_on_map(frame, self.get_icon(icon, icon_scale), view_position)
+
+        return frame
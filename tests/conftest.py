@@ -0,0 +1,16 @@
+import os
+import tempfile
+import numpy as np
+from PIL import Image
+
+# the icons of the program are loaded from paths relative to the root of the repository
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# constants reads the size of the source map when it is imported, so the tests point it at a small synthetic map and an
+# empty cache before any module of the program is imported
+WORK_DIR = tempfile.mkdtemp(prefix="treasure_map_tests_")
+MAP_PATH = os.path.join(WORK_DIR, "synthetic_map.png")
+Image.fromarray(np.random.default_rng(0).integers(0, 256, (600, 800, 3), dtype=np.uint8)).save(MAP_PATH)
+
+os.environ["TREASURE_MAP_PATH"] = MAP_PATH
+os.environ["TREASURE_MAP_CACHE_DIR"] = os.path.join(WORK_DIR, "cache")
@@ -0,0 +1,46 @@
+import os
+from typing import List
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.compositing import COMPOSITORS, render_golden
+from src.icons import Icon
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "compositing_golden.png")
+
+# set to rewrite the golden image with the NumPy reference after an intended change of the rendering
+UPDATE_GOLDEN = os.environ.get("TREASURE_MAP_UPDATE_GOLDEN") == "1"
+
+
+def get_background() -> np.array:
+    return np.random.default_rng(1).integers(0, 256, (120, 160, 3), dtype=np.uint8)
+
+
+def get_icons() -> List[Icon]:
+    # blended icons at whole and sub-pixel positions, and icons with a binary alpha channel, of runes and their negative
+    icons = []
+    for name in ("brass", "gold", "tin"):
+        path = os.path.join(REPO_DIR, "images", "icons", f"{name}.png")
+        icons.append(Icon(name, path, binarize_alpha=False, size=24))
+        icons.append(Icon(name, path, binarize_alpha=False, size=24, shift=(0.25, 0.75)))
+        icons.append(Icon(name, path, use_negative_image=True, binarize_alpha=True, size=24))
+    return icons
+
+
+def test_icons_use_both_strategies():
+    assert {icon.compositing for icon in get_icons()} == {"mask", "blend"}
+
+
+@pytest.mark.parametrize("name", sorted(COMPOSITORS))
+def test_compositor_matches_golden_image(name):
+    image = render_golden(COMPOSITORS[name](), get_background(), get_icons())
+
+    if UPDATE_GOLDEN and name == "numpy":
+        Image.fromarray(image).save(GOLDEN_PATH)
+
+    golden = np.asarray(Image.open(GOLDEN_PATH).convert("RGB"))
+    assert image.shape == golden.shape
+    mismatches = np.any(image != golden, axis=2)
+    assert not mismatches.any(), f"{mismatches.sum()} pixels differ from the golden image"